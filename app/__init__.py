@@ -1,6 +1,7 @@
-from flask import Flask, session
+from flask import Flask, request, session
 from app.config.config import config
 from app.utils.i18n import i18n, t, get_current_language, get_language_name
+from app.utils.assets import init_assets
 import os
 from datetime import datetime, timedelta
 
@@ -16,6 +17,13 @@ def create_app(config_name='default'):
     # 添加会话安全头
     @app.after_request
     def add_session_headers(response):
+        if request.endpoint == 'static':
+            # 静态资源的缓存策略由 init_assets 决定
+            return response
+        if response.get_etag()[0]:
+            # 带 ETag 的响应允许私有缓存保存，但每次使用前都要用 If-None-Match 重新验证
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
         # 确保cookies不会持久化存储
         response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
         response.headers['Pragma'] = 'no-cache'
@@ -25,6 +33,9 @@ def create_app(config_name='default'):
     # 确保必要的目录存在
     os.makedirs(app.config['BACKUP_DIR'], exist_ok=True)
     
+    # 带内容哈希的静态资源
+    init_assets(app, app.config['ASSET_DIR'], app.config['ASSET_MAX_AGE'])
+    
     # 注册蓝图
     from app.views import main as main_blueprint
     app.register_blueprint(main_blueprint)
@@ -60,6 +71,9 @@ def create_app(config_name='default'):
     @app.before_request
     def init_i18n():
         """初始化国际化"""
+        if request.endpoint == 'static':
+            # 静态资源不需要会话，避免带上 Set-Cookie 使其无法被公共缓存
+            return
         # 确保会话在浏览器关闭时过期
         session.permanent = False
         # 加载当前语言
@@ -17,14 +17,80 @@ class Config:
     DATA_FILE = os.path.join(BASE_DIR, 'data.json')
     BACKUP_DIR = os.path.join(BASE_DIR, 'backups')
     
+    # 存储后端：'json' 内存字典 + JSON 数据文件；'sqlite' SQLite 数据库（WAL 模式）
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'json'
+    SQLITE_FILE = os.path.join(BASE_DIR, 'data.db')
+    SQLITE_SYNCHRONOUS = 'NORMAL'   # WAL 模式下 NORMAL 已能保证崩溃一致性
+    
+    # json 后端的存储模式：'journal' 修改追加写入日志并在后台压缩为快照；'snapshot' 每次修改重写整个数据文件
+    STORAGE_MODE = os.environ.get('STORAGE_MODE') or 'journal'
+    JOURNAL_FILE = os.path.join(BASE_DIR, 'data.journal')
+    JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024  # 日志超过该大小时压缩
+    JOURNAL_COMPACT_RECORDS = 5000           # 日志超过该记录数时压缩
+    JOURNAL_FSYNC = True                     # 每次追加后 fsync
+    
+    # json 后端的快照格式：'json' 完整 JSON（data.json）；'record' 值存放在内存映射的数据区按需读取（data.rec）
+    # 切换格式后首次写出快照时，另一种格式的旧数据文件移入 BACKUP_DIR（data_migrated_*）
+    SNAPSHOT_FORMAT = os.environ.get('SNAPSHOT_FORMAT') or 'json'
+    RECORD_FILE = os.path.join(BASE_DIR, 'data.rec')
+    
+    # 值的透明压缩（record 快照格式）：None 不压缩，或 'zlib' / 'lzma'
+    COMPRESSION = os.environ.get('COMPRESSION') or None
+    COMPRESSION_THRESHOLD = 1024   # 值的 UTF-8 字节数达到该大小才压缩
+    COMPRESSION_LEVEL = 6          # zlib 压缩级别 / lzma 预设（0-9），越高越省空间、越耗 CPU
+    COMPRESS_IN_MEMORY = False     # 常驻内存的值（日志中尚未压缩进快照的修改）也压缩保存
+    
+    # 暖启动快照：干净退出和日志压缩后写出，启动时校验和与数据文件一致则直接加载
+    WARM_START = True
+    WARM_START_FILE = os.path.join(BASE_DIR, 'data.warm')
+    
+    # 多进程部署（如 gunicorn 多 worker）时的进程间文件锁与共享代数计数器
+    LOCK_FILE = os.path.join(BASE_DIR, 'data.lock')
+    GENERATION_FILE = os.path.join(BASE_DIR, 'data.gen')
+    
+    # 持久化方式：'sync' 每次修改同步写盘；'batched' 修改立即生效，由后台线程合并写盘
+    DURABILITY_MODE = os.environ.get('DURABILITY_MODE') or 'sync'
+    FLUSH_INTERVAL = 0.05     # 合并写盘的时间窗口（秒）
+    FLUSH_MAX_PENDING = 256   # 待写修改达到该数量时立即写盘
+    
+    # 修订历史保留策略（存放在 BACKUP_DIR）
+    REVISION_KEEP_ALL = 3600          # 该时长（秒）内的每次修订都保留
+    REVISION_KEEP_HOURLY = 48         # 48 小时内每个键每小时保留一个版本
+    REVISION_KEEP_DAILY = 30          # 30 天内每天保留一个版本
+    REVISION_KEEP_WEEKLY = 52         # 52 周内每周保留一个版本，更早的并入基线
+    REVISION_PRUNE_INTERVAL = 3600    # 清理间隔（秒）
+    
     # SSL配置
     SSL_CERT = os.path.join(BASE_DIR, 'ssl', 'cert.pem')
     SSL_KEY = os.path.join(BASE_DIR, 'ssl', 'key.pem')
     
+    # 静态资源构建（flask --app run build-assets）
+    ASSET_DIR = os.path.join(BASE_DIR, 'app', 'static', 'dist')  # 带内容哈希的文件与 gzip 版本的输出目录
+    ASSET_MAX_AGE = 365 * 24 * 3600   # 带内容哈希的文件的缓存时间（秒）
+    
     # 应用配置
     MAX_STRING_LENGTH = 10000  # 最大字符串长度
     MAX_KEY_LENGTH = 100      # 最大键名长度
     ITEMS_PER_PAGE = 12       # 每页显示的项目数
+    PREVIEW_LENGTH = 200      # 列表中值的预览长度（字符），展开时再获取完整的值
+    FUZZY_MAX_DISTANCE = 2    # 键的近似匹配容许的最大编辑距离（短查询更少）
+    BATCH_MAX_OPERATIONS = 10000  # 批量修改单次最多包含的操作数
+    TRANSFER_CHUNK_SIZE = 1000  # 导出与导入时每批读取或写入的条目数
+    IMPORT_MAX_ERRORS = 100   # 导入结果中最多列出的错误行数
+    CHANGES_MAX_LIMIT = 1000  # 增量同步单次最多返回的修订数
+    COMPLETE_MAX_LIMIT = 20   # 键与标签的前缀补全单次返回的最大条数
+    SEARCH_INDEX_VALUE_BYTES = 1024  # 全文索引只收录不超过该大小（UTF-8 字节）的值，更长的值搜索时逐条检查；0 表示只索引键和标签
+    RESULT_CACHE_ENTRIES = 256               # 查询结果缓存的最大条目数，0 表示关闭缓存
+    RESULT_CACHE_BYTES = 32 * 1024 * 1024    # 查询结果缓存估算占用内存的上限（字节）
+    
+    # 变更推送（/api/events）：每个连接在整个生命周期内占用一个 worker，只在 gevent / 多线程 worker 下开启（见部署指南）
+    EVENTS_ENABLED = (os.environ.get('EVENTS_ENABLED') or '').lower() in ('1', 'true', 'yes')
+    EVENTS_MAX_DURATION = 300     # 单个连接的最长时间（秒），到时结束连接，客户端按 retry 重连并补发期间的事件
+    CHANGEFEED_SIZE = 1000        # 进程内保留的最近变更数，断线重连时在此范围内补发
+    EVENTS_BUFFER = 256           # 每个订阅者待发事件的上限，超过时断开该订阅者，由客户端重连补发
+    EVENTS_HEARTBEAT = 15         # 没有事件时发送心跳的间隔（秒）
+    EVENTS_POLL_INTERVAL = 1.0    # 订阅者空闲时检查其他进程修改的间隔（秒）
+    EVENTS_RETRY = 3000           # 客户端断线后重连的等待时间（毫秒）
     
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -1,56 +1,657 @@
+import atexit
+import gc
+import heapq
 import json
 import os
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
 from datetime import datetime
-from typing import Dict, Optional, List, Set
+from typing import Any, Dict, Iterable, Iterator, Optional, List, Set, Tuple
 import logging
 from app.config.config import Config
+from app.utils.batch import apply_operation, parse_operations
+from app.utils.changefeed import DELETE, PUT, ChangeFeed, Subscription
+from app.utils.coherence import FileMutex, GenerationCounter, ProcessLock, file_inode
+from app.utils.etag import Precondition, check_precondition
+from app.utils.journal import Journal
+from app.utils.fuzzy import FuzzyKeyIndex
+from app.utils.ndjson import POLICIES, parse_entry
+from app.utils.ngram import NgramIndex
+from app.utils.query import And, Not, Or, QueryError, Tag, Text, TimeRange, parse_query, text_terms
+from app.utils.compression import Compressor
+from app.utils.records import (Record, RecordFile, RecordFileError, ValueRef, compression_usage, intern_tags,
+                                memory_usage, pack_value, to_micros)
+from app.utils.resultcache import ResultCache, cached, lower_query, strip_query
+from app.utils.revisions import RevisionLog
+from app.utils.sortedindex import SortedIndex
+from app.utils.trie import PrefixTrie
+from app.utils.warmstart import WarmStart, file_checksum
+
+@contextmanager
+def _gc_paused():
+    """批量创建大量对象期间暂停循环垃圾回收，避免反复扫描刚加载的数据"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
 
 class StringStore:
     ITEMS_PER_PAGE = Config.ITEMS_PER_PAGE
+    # 派生索引的结构版本，修改 _build_indexes 的结果时递增，使旧的暖启动快照失效
+    INDEX_SCHEMA = 5
+    # 第一次使用时才建立的派生索引
+    LAZY_INDEXES = ('ngrams', 'fuzzy', 'key_trie', 'tag_trie')
+    # 搜索结果的相关度等级（越小越靠前）：键完全相同、键前缀、键包含、标签包含、值包含
+    RANK_KEY, RANK_PREFIX, RANK_KEY_CONTAINS, RANK_TAG, RANK_VALUE = range(5)
     
     def __init__(self):
-        self.data_file = Config.DATA_FILE
+        # 快照格式：'record' 时值存放在内存映射的数据区，只有元数据常驻内存
+        self._records = Config.SNAPSHOT_FORMAT == 'record'
+        self.data_file = Config.RECORD_FILE if self._records else Config.DATA_FILE
+        self._other_file = Config.DATA_FILE if self._records else Config.RECORD_FILE
+        # 超过阈值的值在记录文件中压缩保存，可选在内存中也压缩保存
+        self._compressor = Compressor(Config.COMPRESSION, Config.COMPRESSION_THRESHOLD, Config.COMPRESSION_LEVEL)
+        self._compress_in_memory = Config.COMPRESS_IN_MEMORY and self._compressor.enabled
+        # 暖启动快照：与数据文件一同写出，校验和一致时跳过解析与索引重建
+        self._warm = WarmStart(Config.WARM_START_FILE, self.INDEX_SCHEMA) if Config.WARM_START else None
+        self._indexes: Dict[str, Any] = {}
         self.backup_dir = Config.BACKUP_DIR
         os.makedirs(self.backup_dir, exist_ok=True)
-        self._data: Dict[str, dict] = self._load_data()
+        # 条目字典只整体替换、不原地修改，压缩时浅拷贝即可得到一致快照
+        self._lock = threading.RLock()
+        # 多进程协调：落盘持有排他文件锁并推进共享代数，读取前比较代数，有变化时增量加载
+        self._plock = ProcessLock(Config.LOCK_FILE)
+        self._compact_mutex = FileMutex(Config.LOCK_FILE + '.compact')
+        self._generation = GenerationCounter(Config.GENERATION_FILE)
+        self._version = 0
+        # 进程标识：本进程有未落盘的修改时区分不同进程的数据版本
+        self._instance = os.urandom(4).hex()
+        # 查询结果缓存：内存数据每次变化（本地修改或加载其他进程的修改）都使 _mutations 加一，旧结果随之失效
+        self._result_cache = ResultCache(Config.RESULT_CACHE_ENTRIES, Config.RESULT_CACHE_BYTES) \
+            if Config.RESULT_CACHE_ENTRIES > 0 else None
+        self._mutations = 0
+        # 变更日志：本地修改与加载到的其他进程的修改，推送给 /api/events 的订阅者
+        self._changes = ChangeFeed(Config.CHANGEFEED_SIZE, Config.EVENTS_BUFFER)
+        # 批量写盘：修改先进入待写队列，由后台线程按时间窗口合并写盘
+        self._pending: List[dict] = []
+        # 条目以紧凑的 Record 常驻内存，接口返回的字典只为实际取出的条目构造
+        self._data: Dict[str, Record] = {}
+        self._journal: Optional[Journal] = None
+        self._journal_ino: Optional[int] = None
+        self._data_ino: Optional[int] = None
+        self._journal_offset = 0
+        if Config.STORAGE_MODE == 'journal':
+            self._journal = Journal(Config.JOURNAL_FILE,
+                                    max_bytes=Config.JOURNAL_COMPACT_BYTES,
+                                    max_records=Config.JOURNAL_COMPACT_RECORDS,
+                                    fsync=Config.JOURNAL_FSYNC)
+        # 启动时的初始化（加载、完成上次中断的压缩、建立修订基线）整体持有排他文件锁：
+        # 多个 worker 同时启动时依次进行，后启动的进程看到的是前一个进程初始化完成后的文件
+        with self._plock.exclusive():
+            with self._lock:
+                self._reload()
+            if self._journal is not None and os.path.exists(self._journal.rotated_path):
+                # 上次压缩没有完成：立即把日志并入新快照
+                self.compact(background=False)
+            # 修订历史：每次修改只记录变化的字段，替代整文件备份
+            self._revisions = RevisionLog(self.backup_dir,
+                                          keep_all=Config.REVISION_KEEP_ALL,
+                                          keep_hourly=Config.REVISION_KEEP_HOURLY,
+                                          keep_daily=Config.REVISION_KEEP_DAILY,
+                                          keep_weekly=Config.REVISION_KEEP_WEEKLY,
+                                          prune_interval=Config.REVISION_PRUNE_INTERVAL,
+                                          file_lock=self._plock,
+                                          prune_mutex=FileMutex(Config.LOCK_FILE + '.prune'))
+            self._revisions.ensure_base(lambda: {k: v.to_entry() for k, v in self._data.items()})
+        self._write_seq = 0
+        self._durable_seq = 0
+        self._durable_cond = threading.Condition()
+        self._flush_wake = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        if Config.DURABILITY_MODE == 'batched':
+            self._flusher = threading.Thread(target=self._flush_loop, name='stringstore-flusher', daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
         
-    def _load_data(self) -> dict:
-        """加载数据文件"""
-        if os.path.exists(self.data_file):
+    def _load_data(self) -> Dict[str, Record]:
+        """加载数据文件，配置的格式不存在时读取另一种格式（切换格式后的迁移）"""
+        path = self.data_file if os.path.exists(self.data_file) else self._other_file
+        if not os.path.exists(path):
+            return {}
+        if path == Config.RECORD_FILE:
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # 转换旧数据格式
-                    if not all(isinstance(v, dict) for v in data.values()):
-                        data = {k: {'value': v, 'created_at': datetime.now().isoformat(), 
-                                  'updated_at': datetime.now().isoformat()} 
-                                for k, v in data.items()}
-                    # 为没有标签的数据添加 'tags' 字段
-                    for k, v in data.items():
-                        if 'tags' not in v:
-                            v['tags'] = []
-                    return data
-            except json.JSONDecodeError:
-                logging.error("数据文件损坏，创建备份并返回空数据")
-                self._backup_data()
+                return RecordFile.load(path)
+            except RecordFileError as e:
+                logging.error(f"记录文件损坏，创建备份并返回空数据: {str(e)}")
+                self._backup_data(path)
                 return {}
-        return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = self._normalize_data(json.load(f))
+            return {k: Record.from_entry(v) for k, v in data.items()}
+        except json.JSONDecodeError:
+            logging.error("数据文件损坏，创建备份并返回空数据")
+            self._backup_data(path)
+            return {}
     
+    @staticmethod
+    def _normalize_data(data: dict) -> dict:
+        """把数据文件内容规范为当前条目格式"""
+        # 转换旧数据格式
+        if not all(isinstance(v, dict) for v in data.values()):
+            data = {k: {'value': v, 'created_at': datetime.now().isoformat(), 
+                      'updated_at': datetime.now().isoformat()} 
+                    for k, v in data.items()}
+        # 为没有标签的数据添加 'tags' 字段
+        for k, v in data.items():
+            if 'tags' not in v:
+                v['tags'] = []
+        return data
+
+    def _reload(self) -> None:
+        """从快照和日志完整加载数据，调用方需持有锁与文件锁"""
+        self._version = self._generation.read()
+        self._data_ino = file_inode(self.data_file)
+        with _gc_paused():
+            warm = self._load_warm()
+            if warm is not None:
+                self._reset_data(*warm)
+            else:
+                self._reset_data(self._load_data())
+        if self._journal is not None:
+            for record in Journal.replay(self._journal.rotated_path):
+                self._apply_record(record)
+            self._journal_ino = self._journal.inode()
+            records, self._journal_offset = Journal.read_from(self._journal.path, 0)
+            for record in records:
+                self._apply_record(record)
+            self._journal.records = len(records)
+        self._reapply_pending()
+
+    def _sync(self) -> None:
+        """读取前检查其他进程是否有新的落盘修改，无变化时只是一次内存读取"""
+        if self._generation.read() == self._version:
+            return
+        with self._lock, self._plock.shared():
+            self._sync_locked()
+
+    def _sync_locked(self) -> None:
+        """增量加载其他进程的修改，调用方需持有锁与文件锁"""
+        current = self._generation.read()
+        if current == self._version:
+            return
+        if (self._journal is None or self._journal.inode() != self._journal_ino
+                or file_inode(self.data_file) != self._data_ino):
+            # 快照模式，或快照/日志已被压缩替换：整体重新加载，按修改时间比较出变化的键
+            old = self._data
+            self._reload()
+            self._changes.publish(self._diff_keys(old, self._data))
+            return
+        records, self._journal_offset = Journal.read_from(self._journal.path, self._journal_offset)
+        for record in records:
+            self._apply_record(record)
+        self._version = current
+        self._reapply_pending()
+        self._changes.publish((PUT if record.get('op') == 'put' else DELETE, record['key']) for record in records)
+
+    @staticmethod
+    def _diff_keys(old: Dict[str, Record], new: Dict[str, Record]) -> List[Tuple[str, str]]:
+        """两份数据之间被删除或修改过的键（每次修改都会更新 updated_at）"""
+        changes = [(DELETE, key) for key in old if key not in new]
+        changes.extend((PUT, key) for key, record in new.items()
+                       if key not in old or old[key].updated != record.updated)
+        return changes
+
+    def _reapply_pending(self) -> None:
+        """加载磁盘数据后重新应用本进程尚未落盘的修改"""
+        for record in self._pending:
+            self._apply_record(record)
+
+    @contextmanager
+    def _writing(self):
+        """写操作：持有进程内锁与排他文件锁，并先同步其他进程的修改"""
+        with self._lock, self._plock.exclusive():
+            self._sync_locked()
+            yield
+
+    def _apply_record(self, record: dict) -> None:
+        """回放一条日志记录"""
+        if record.get('op') == 'put':
+            self._set_entry(record['key'], record['entry'])
+        elif record.get('op') == 'del':
+            self._drop_entry(record['key'])
+
+    def _load_warm(self) -> Optional[Tuple[Dict[str, Record], Dict[str, Any]]]:
+        """从暖启动快照加载 (条目, 派生索引)，快照不可用时返回 None"""
+        if self._warm is None or not os.path.exists(self.data_file):
+            return None
+        try:
+            loaded = self._warm.load(self._layout(), self._snapshot_checksum(self.data_file))
+            if loaded is None:
+                return None
+            data, indexes = loaded
+            ngrams = indexes.get('ngrams')
+            if ngrams is not None and ngrams.value_limit != Config.SEARCH_INDEX_VALUE_BYTES:
+                # 收录值的大小上限已改变，全文索引在第一次搜索时按新配置重建
+                del indexes['ngrams']
+            if self._records:
+                return RecordFile.load_with_index(self.data_file, data), indexes
+            return {k: Record(value, created, updated, intern_tags(tags))
+                    for k, (value, created, updated, tags) in data.items()}, indexes
+        except Exception as e:
+            logging.warning(f"暖启动失败，回退到冷启动: {str(e)}")
+            return None
+
+    def _layout(self) -> str:
+        """快照格式名称"""
+        return 'record' if self._records else 'json'
+
+    def _snapshot_checksum(self, path: str) -> Tuple[int, int]:
+        """数据文件的校验和；记录文件只校验索引部分，不读取数据区"""
+        return file_checksum(path, RecordFile.index_offset(path) if self._records else 0)
+
+    def _build_indexes(self, data: Dict[str, Record], lazy: Iterable[str] = ()) -> Dict[str, Any]:
+        """由完整数据构建派生索引 {名称: 索引}，lazy 为需要一并重建的按需索引，暖启动快照会一并保存"""
+        indexes = {
+            # (时间, 键) 有序索引，分页与时间范围查询不再整体排序
+            'updated': SortedIndex((record.updated, key) for key, record in data.items()),
+            'created': SortedIndex((record.created, key) for key, record in data.items()),
+            # 倒排标签索引：标签 -> 键集合
+            'tags': self._build_tag_index(data)
+        }
+        for name in lazy:
+            indexes[name] = self._build_lazy_index(name, data)
+        return indexes
+
+    def _build_lazy_index(self, name: str, data: Dict[str, Record]) -> Any:
+        """
+        构建按需索引，这些索引在第一次使用后才建立和维护：
+        'ngrams' 全文索引（需要读取全部值），'fuzzy' 键的近似匹配索引，
+        'key_trie' 按修改时间排序的键前缀补全，'tag_trie' 按条目数排序的标签前缀补全
+        """
+        if name == 'ngrams':
+            return NgramIndex.build(((key, *self._search_texts(key, record)) for key, record in data.items()),
+                                    Config.SEARCH_INDEX_VALUE_BYTES)
+        if name == 'key_trie':
+            return PrefixTrie.build(((key, record.updated) for key, record in data.items()), Config.COMPLETE_MAX_LIMIT)
+        if name == 'tag_trie':
+            counts = Counter(tag for record in data.values() for tag in record.tags)
+            return PrefixTrie.build(counts.items(), Config.COMPLETE_MAX_LIMIT)
+        return FuzzyKeyIndex(data)
+
+    def _built_lazy_indexes(self) -> List[str]:
+        """已经建立过的按需索引"""
+        return [name for name in self.LAZY_INDEXES if name in self._indexes]
+
+    def _lazy_index(self, name: str) -> Any:
+        """取出按需索引，尚未建立时由当前数据构建，调用方需持有锁"""
+        index = self._indexes.get(name)
+        if index is None:
+            with _gc_paused():
+                index = self._build_lazy_index(name, self._data)
+            self._indexes[name] = index
+        return index
+
+    @staticmethod
+    def _search_texts(key: str, record: Record) -> Tuple[List[str], bool]:
+        """
+        全文索引收录的文本：键、各个标签与不超过 SEARCH_INDEX_VALUE_BYTES 的值
+        第二项表示值是否收录，未收录的条目搜索时总是作为候选逐条检查
+        """
+        if record.value_size() > Config.SEARCH_INDEX_VALUE_BYTES:
+            return [key, *record.tags], False
+        return [key, record.read_value(), *record.tags], True
+
+    @staticmethod
+    def _build_tag_index(data: Dict[str, Record]) -> Dict[str, Set[str]]:
+        """构建标签到键集合的倒排索引"""
+        tag_index: Dict[str, Set[str]] = {}
+        for key, record in data.items():
+            for tag in record.tags:
+                tag_index.setdefault(tag, set()).add(key)
+        return tag_index
+
+    def _index_entry(self, key: str, old: Optional[Record], new: Optional[Record]) -> None:
+        """按条目的新旧状态增量维护派生索引"""
+        self._mutations += 1
+        by_updated, by_created = self._indexes['updated'], self._indexes['created']
+        if old is not None:
+            by_updated.remove((old.updated, key))
+            if new is None or new.created != old.created:
+                by_created.remove((old.created, key))
+        if new is not None:
+            by_updated.add((new.updated, key))
+            if old is None or new.created != old.created:
+                by_created.add((new.created, key))
+        old_tags = old.tags if old is not None else ()
+        new_tags = new.tags if new is not None else ()
+        if old_tags != new_tags:
+            tag_index = self._indexes['tags']
+            for tag in old_tags:
+                if tag not in new_tags:
+                    keys = tag_index[tag]
+                    keys.discard(key)
+                    if not keys:
+                        del tag_index[tag]
+            for tag in new_tags:
+                if tag not in old_tags:
+                    tag_index.setdefault(tag, set()).add(key)
+            tag_trie = self._indexes.get('tag_trie')
+            if tag_trie is not None:
+                for tag in set(old_tags).symmetric_difference(new_tags):
+                    if tag in tag_index:
+                        tag_trie.set(tag, len(tag_index[tag]))
+                    else:
+                        tag_trie.remove(tag)
+        ngrams = self._indexes.get('ngrams')
+        if ngrams is not None:
+            new_texts, complete = self._search_texts(key, new) if new is not None else (None, True)
+            ngrams.update(key, self._search_texts(key, old)[0] if old is not None else None, new_texts, complete)
+        fuzzy = self._indexes.get('fuzzy')
+        if fuzzy is not None:
+            if old is None and new is not None:
+                fuzzy.add(key)
+            elif new is None and old is not None:
+                fuzzy.remove(key)
+        key_trie = self._indexes.get('key_trie')
+        if key_trie is not None:
+            if new is None:
+                key_trie.remove(key)
+            elif old is None or new.updated != old.updated:
+                key_trie.set(key, new.updated)
+
+    def _reset_data(self, data: Dict[str, Record], indexes: Optional[Dict[str, Any]] = None) -> None:
+        """整体替换内存数据，并重建（或从暖启动快照恢复）派生索引"""
+        if self._compress_in_memory:
+            for record in data.values():
+                if isinstance(record.value, str):
+                    record.value = pack_value(record.value, self._compressor)
+        self._data = data
+        self._mutations += 1
+        if indexes is None:
+            # 已经建立过的按需索引一并重建
+            indexes = self._build_indexes(data, self._built_lazy_indexes())
+        self._indexes = indexes
+
+    def version(self) -> str:
+        """
+        数据版本，用于列表类响应的 ETag：已落盘修改的共享代数，各进程在同一代数下的数据相同；
+        本进程还有未落盘的修改时附加进程标识与本地写入序号
+        """
+        self._sync()
+        with self._lock:
+            if not self._pending:
+                return str(self._version)
+            return f'{self._version}.{self._instance}.{self._write_seq}'
+
+    def _cache_generation(self) -> int:
+        """查询结果缓存的代数：先同步其他进程的修改，再读取内存数据的修改次数"""
+        self._sync()
+        return self._mutations
+
+    def subscribe_changes(self, last_event_id: Optional[str] = None) -> Tuple[Subscription, List[dict]]:
+        """订阅变更日志，返回 (订阅, 需要先补发的事件)，见 ChangeFeed.subscribe"""
+        return self._changes.subscribe(last_event_id)
+
+    def change_event_id(self, seq: int) -> str:
+        """变更事件的 ID（客户端重连时作为 Last-Event-ID 发回）"""
+        return self._changes.event_id(seq)
+
+    def poll_changes(self) -> None:
+        """把其他进程的修改加入变更日志（订阅者空闲时定期调用）"""
+        self._sync()
+
+    def _set_entry(self, key: str, entry: dict) -> None:
+        """写入条目（本地修改与日志回放的统一入口）"""
+        record = Record.from_entry(entry)
+        if self._compress_in_memory:
+            record.value = pack_value(record.value, self._compressor)
+        old = self._data.get(key)
+        self._data[key] = record
+        self._index_entry(key, old, record)
+
+    def _drop_entry(self, key: str) -> None:
+        """移除条目（本地修改与日志回放的统一入口）"""
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._index_entry(key, old, None)
+
+    def _get_entry(self, key: str) -> Optional[dict]:
+        """读取单个条目（存储后端的读取入口），值按需从数据区加载"""
+        record = self._data.get(key)
+        return None if record is None else record.to_entry()
+
+    def _put(self, key: str, entry: dict) -> None:
+        """本地写入条目：更新内存、记录修订并持久化，调用方需处于 _writing()"""
+        self._put_many({key: entry})
+
+    def _remove(self, key: str) -> None:
+        """本地删除条目：更新内存、记录修订并持久化，调用方需处于 _writing()"""
+        self._put_many({key: None})
+
+    def _put_many(self, changes: Dict[str, Optional[dict]]) -> None:
+        """本地写入或删除（None）一批条目，合并为一次持久化，调用方需处于 _writing()"""
+        for key, entry in changes.items():
+            self._revisions.record(key, self._get_entry(key), entry)
+            if entry is None:
+                self._drop_entry(key)
+            else:
+                self._set_entry(key, entry)
+        self._commit(list(changes))
+        self._changes.publish((DELETE if entry is None else PUT, key) for key, entry in changes.items())
+
+    def _commit(self, keys: List[str]) -> None:
+        """持久化对指定键的修改，调用方需处于 _writing()"""
+        records = []
+        for key in keys:
+            entry = self._get_entry(key)
+            if entry is None:
+                records.append({'op': 'del', 'key': key})
+            else:
+                records.append({'op': 'put', 'key': key, 'entry': entry})
+        if self._flusher is not None:
+            self._pending.extend(records)
+            self._write_seq += len(records)
+            if len(self._pending) >= Config.FLUSH_MAX_PENDING:
+                self._flush_wake.set()
+        else:
+            self._persist(records)
+            self._revisions.flush()
+
+    def _persist(self, records: List[dict]) -> None:
+        """把记录写盘并推进共享代数，调用方需处于 _writing()"""
+        first = self._generation.read() + 1
+        for i, record in enumerate(records):
+            record['seq'] = first + i
+        if self._journal is None:
+            self._write_snapshot(self._data)
+        else:
+            self._journal.append(records)
+            self._journal_ino = self._journal.inode()
+            self._journal_offset = self._journal.size
+        self._version = self._generation.advance(len(records))
+        if self._journal is not None and self._journal.needs_compaction():
+            self.compact()
+
+    def _flush_loop(self) -> None:
+        """后台写盘线程"""
+        while not self._closed:
+            self._flush_wake.wait(Config.FLUSH_INTERVAL)
+            self._flush_wake.clear()
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        """把待写队列中的修改合并为一次写盘"""
+        with self._writing():
+            records, self._pending = self._pending, []
+            target = self._write_seq
+            if records:
+                try:
+                    self._persist(records)
+                    self._revisions.flush()
+                except Exception as e:
+                    logging.error(f"批量写盘失败: {str(e)}")
+                    self._pending[:0] = records
+                    return
+        with self._durable_cond:
+            self._durable_seq = max(self._durable_seq, target)
+            self._durable_cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """阻塞直到此前的所有修改都已写盘，超时返回 False"""
+        if self._flusher is None:
+            return True
+        with self._lock:
+            target = self._write_seq
+        with self._durable_cond:
+            self._flush_wake.set()
+            return self._durable_cond.wait_for(lambda: self._durable_seq >= target, timeout)
+
+    def close(self) -> None:
+        """停止后台写盘线程并写出所有待写修改"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flusher is not None:
+            self._flush_wake.set()
+            self._flusher.join()
+            self._flush_pending()
+        if self._warm is not None and not self._warm_is_current():
+            # 干净退出时把日志并入快照并写出暖启动快照，下次启动无需解析与重放
+            if self._journal is not None:
+                self.compact(background=False)
+            else:
+                with self._writing():
+                    self._write_snapshot(self._data, warm=True)
+        if self._journal is not None:
+            with self._plock.exclusive():
+                self._journal.close()
+
+    def _warm_is_current(self) -> bool:
+        """日志为空且暖启动快照与数据文件一致"""
+        with self._plock.shared():
+            if self._journal is not None:
+                for path in (self._journal.path, self._journal.rotated_path):
+                    if os.path.exists(path) and os.path.getsize(path) > 0:
+                        return False
+            if not os.path.exists(self.data_file):
+                return False
+            try:
+                return self._warm.matches(self._layout(), self._snapshot_checksum(self.data_file))
+            except Exception:
+                return False
+
+    def compact(self, background: bool = True) -> None:
+        """把日志合并为新的数据快照（同一时间只有一个进程在压缩）"""
+        if self._journal is None or not self._compact_mutex.acquire_nowait():
+            return
+        try:
+            with self._writing():
+                snapshot = dict(self._data)
+                # 全文索引需要读取全部值才能重建，随快照保存的是增量维护的索引在此刻的副本
+                ngrams = self._indexes.get('ngrams')
+                ngrams = ngrams.copy() if ngrams is not None and self._warm is not None else None
+                self._journal.rotate()
+                self._journal_ino = None
+                self._journal_offset = 0
+        except Exception:
+            self._compact_mutex.release()
+            raise
+        if background:
+            threading.Thread(target=self._write_compaction, args=(snapshot, ngrams), daemon=True).start()
+        else:
+            self._write_compaction(snapshot, ngrams)
+
+    def _write_compaction(self, snapshot: Dict[str, Record], ngrams: Optional[NgramIndex]) -> None:
+        """写出压缩后的快照并删除已并入的日志"""
+        try:
+            tmp_file, warm_data = self._dump_snapshot(snapshot)
+            self._write_warm(tmp_file, warm_data, snapshot, ngrams)
+            # 快照替换与旧日志删除需要对持有共享锁加载数据的进程表现为原子操作
+            with self._plock.exclusive():
+                os.replace(tmp_file, self.data_file)
+                self._journal.discard_rotated()
+                self._discard_other_format()
+            if self._records and not self._closed:
+                # 重新加载，让刚并入快照的值也改为按需读取
+                with self._lock, self._plock.shared():
+                    self._reload()
+        except Exception as e:
+            logging.error(f"日志压缩失败: {str(e)}")
+        finally:
+            self._compact_mutex.release()
+
     def _save_data(self) -> None:
         """保存数据到文件"""
-        self._backup_data()
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        self._write_snapshot(self._data)
+
+    def _write_snapshot(self, data: Dict[str, Record], warm: bool = False) -> None:
+        """原子地写出完整数据文件，可同时写出暖启动快照"""
+        tmp_file, warm_data = self._dump_snapshot(data)
+        if warm:
+            self._write_warm(tmp_file, warm_data, data, self._indexes.get('ngrams') if data is self._data else None)
+        os.replace(tmp_file, self.data_file)
+        self._discard_other_format()
+
+    def _dump_snapshot(self, data: Dict[str, Record]) -> Tuple[str, Any]:
+        """把完整数据写入临时文件，返回 (临时文件路径, 暖启动快照中保存的条目数据)"""
+        tmp_file = self.data_file + '.tmp'
+        if self._records:
+            return tmp_file, RecordFile.write(tmp_file, data, self._compressor)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({k: v.to_entry() for k, v in data.items()}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if self._warm is None:
+            return tmp_file, None
+        return tmp_file, {k: (v.read_value() if isinstance(v.value, ValueRef) else v.value,
+                              v.created, v.updated, v.tags)
+                          for k, v in data.items()}
+
+    def _write_warm(self, data_file: str, warm_data: Any, data: Dict[str, Record],
+                    ngrams: Optional[NgramIndex] = None) -> None:
+        """
+        写出与数据文件对应的暖启动快照，失败只影响下次启动速度
+        ngrams 为与 data 一致的全文索引，直接保存而不重建；其余派生索引只涉及键、时间与标签，由 data 重建
+        """
+        if self._warm is None:
+            return
+        try:
+            indexes = self._build_indexes(data, [name for name in self._built_lazy_indexes() if name != 'ngrams'])
+            if ngrams is not None:
+                indexes['ngrams'] = ngrams
+            self._warm.write(self._layout(), self._snapshot_checksum(data_file), warm_data, indexes)
+        except Exception as e:
+            logging.error(f"暖启动快照写入失败: {str(e)}")
+
+    def _discard_other_format(self) -> None:
+        """新格式的快照写出后，把已被取代的另一种格式的数据文件移入备份目录（不参与备份轮换）"""
+        if os.path.exists(self._other_file):
+            extension = os.path.splitext(self._other_file)[1]
+            backup_name = f"data_migrated_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+            backup_path = os.path.join(self.backup_dir, backup_name)
+            os.makedirs(self.backup_dir, exist_ok=True)
+            shutil.move(self._other_file, backup_path)
+            logging.info(f"数据已迁移到 {self.data_file}，旧数据文件 {self._other_file} 已移至 {backup_path}")
             
-    def _backup_data(self) -> None:
-        """备份数据文件"""
-        if os.path.exists(self.data_file):
-            backup_name = f"data_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    def _backup_data(self, path: Optional[str] = None) -> None:
+        """备份数据文件（数据文件损坏时保留现场）"""
+        path = path or self.data_file
+        if os.path.exists(path):
+            extension = os.path.splitext(path)[1]
+            backup_name = f"data_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
             backup_path = os.path.join(self.backup_dir, backup_name)
             os.makedirs(self.backup_dir, exist_ok=True)
             try:
-                import shutil
-                shutil.copy2(self.data_file, backup_path)
+                shutil.copy2(path, backup_path)
                 # 保留最近10个备份
                 backups = sorted([f for f in os.listdir(self.backup_dir) if f.startswith('data_backup_')])
                 if len(backups) > 10:
@@ -58,119 +659,613 @@ class StringStore:
             except Exception as e:
                 logging.error(f"备份失败: {str(e)}")
     
-    def add_string(self, key: str, value: str, tags: Optional[List[str]] = None) -> bool:
-        """添加或更新字符串，支持在创建时添加标签"""
+    def add_string(self, key: str, value: str, tags: Optional[List[str]] = None,
+                   if_match: Optional[Precondition] = None) -> bool:
+        """添加或更新字符串，支持在创建时添加标签；if_match 不满足时抛出 PreconditionFailed"""
         if not self._validate_key(key) or not self._validate_value(value):
             return False
             
-        now = datetime.now().isoformat()
-        if key in self._data:
-            # 更新现有字符串时，不处理标签，标签操作由 add_tag/delete_tag 负责
-            self._data[key].update({
-                'value': value,
-                'updated_at': now
-            })
-        else:
-            # 创建新字符串
-            new_tags = []
-            if tags:
-                # 清理、去重并排序
-                new_tags = sorted(list(set([tag.strip() for tag in tags if tag.strip()])))
-
-            self._data[key] = {
-                'value': value,
-                'created_at': now,
-                'updated_at': now,
-                'tags': new_tags
-            }
-        self._save_data()
+        with self._writing():
+            now = datetime.now().isoformat()
+            current = self._get_entry(key)
+            check_precondition(current, if_match)
+            if current is not None:
+                # 更新现有字符串时，不处理标签，标签操作由 add_tag/delete_tag 负责
+                entry = dict(current, value=value, updated_at=now)
+            else:
+                # 创建新字符串
+                new_tags = []
+                if tags:
+                    # 清理、去重并排序
+                    new_tags = sorted(list(set([tag.strip() for tag in tags if tag.strip()])))
+
+                entry = {
+                    'value': value,
+                    'created_at': now,
+                    'updated_at': now,
+                    'tags': new_tags
+                }
+            self._put(key, entry)
         return True
     
+    def apply_batch(self, operations: List[dict]) -> List[dict]:
+        """
+        原子地执行一批修改（格式见 app/utils/batch.py），返回每个操作的结果
+        任何一个操作格式不正确时抛出 BatchError 且不做任何修改；键或标签不存在等只使该操作失败，其余照常执行
+        同一个键的多次修改合并为最终状态，整批只写盘一次
+        """
+        operations = parse_operations(operations, Config.BATCH_MAX_OPERATIONS,
+                                      self._validate_key, self._validate_value)
+        with self._writing():
+            now = datetime.now().isoformat()
+            original: Dict[str, Optional[dict]] = {}
+            state: Dict[str, Optional[dict]] = {}
+            results = []
+            for operation in operations:
+                key = operation['key']
+                if key not in state:
+                    original[key] = state[key] = self._get_entry(key)
+                result, state[key] = apply_operation(state[key], operation, now)
+                results.append(result)
+            changes = {key: entry for key, entry in state.items() if entry != original[key]}
+            if changes:
+                self._put_many(changes)
+        return results
+
+    def export_entries(self, tag: Optional[str] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> Iterator[dict]:
+        """
+        按 updated_at 升序逐批读取条目，可按标签与修改时间 [since, until) 筛选，不一次性构造全部结果
+        每批用键集分页从上一批的最后一条之后继续；导出期间被修改的条目会移到末尾，可能以新状态再出现一次
+        """
+        after = None if since is None else (since.isoformat(), '')
+        end = None if until is None else to_micros(until.isoformat())
+        while True:
+            items, has_more = self.get_strings_after(after, Config.TRANSFER_CHUNK_SIZE, tag, 'updated_at', 'asc')
+            for item in items:
+                if end is not None and to_micros(item['updated_at']) >= end:
+                    return
+                yield item
+            if not has_more:
+                return
+            after = (items[-1]['updated_at'], items[-1]['key'])
+
+    def import_entries(self, lines: Iterable, policy: str = 'skip') -> dict:
+        """
+        逐行导入 NDJSON（格式见 app/utils/ndjson.py），每 Config.TRANSFER_CHUNK_SIZE 条合并为一次写入，
+        内存占用与总行数无关。格式不正确的行跳过并记录行号，返回各类条目数与前若干个错误
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"未知的导入策略: {policy}")
+        counts = {'created': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+        errors: List[dict] = []
+        chunk: List[dict] = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = parse_entry(line)
+                if not self._validate_key(entry['key']) or not self._validate_value(entry['value']):
+                    raise ValueError("键名或值不合法")
+            except ValueError as e:
+                counts['failed'] += 1
+                if len(errors) < Config.IMPORT_MAX_ERRORS:
+                    errors.append({'line': number, 'error': str(e)})
+                continue
+            chunk.append(entry)
+            if len(chunk) >= Config.TRANSFER_CHUNK_SIZE:
+                self._import_chunk(chunk, policy, counts)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, policy, counts)
+        return dict(counts, errors=errors)
+
+    def _import_chunk(self, entries: List[dict], policy: str, counts: Dict[str, int]) -> None:
+        """按合并策略写入一批导入的条目，同一批中重复的键以后出现的为准"""
+        with self._writing():
+            changes: Dict[str, dict] = {}
+            for entry in entries:
+                key = entry.pop('key')
+                current = changes.get(key) or self._get_entry(key)
+                if current is not None and (policy == 'skip' or (
+                        policy == 'newest' and to_micros(entry['updated_at']) <= to_micros(current['updated_at']))):
+                    counts['skipped'] += 1
+                    continue
+                counts['created' if current is None else 'updated'] += 1
+                changes[key] = entry
+            if changes:
+                self._put_many(changes)
+
     def get_string(self, key: str) -> Optional[dict]:
         """获取字符串及其元数据"""
-        return self._data.get(key)
+        self._sync()
+        return self._get_entry(key)
+
+    def suggest_keys(self, key: str, limit: Optional[int] = 5, max_distance: Optional[int] = None) -> List[str]:
+        """编辑距离最近的已有键（不区分大小写），用于键不存在时的拼写建议"""
+        matches = self._fuzzy_matches(key, self._fuzzy_budget(key, max_distance))
+        return [k for _, k in matches[:limit]]
+
+    @cached()
+    def fuzzy_page(self, query: str, page: int = 1, per_page: int = None,
+                   max_distance: Optional[int] = None) -> tuple:
+        """按键的编辑距离近似搜索，距离小的在前，返回 (当前页条目, 总数)"""
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        matches = self._fuzzy_matches(query, self._fuzzy_budget(query, max_distance))
+        start = max(page - 1, 0) * per_page
+        return self._items_for_keys([k for _, k in matches[start:start + per_page]]), len(matches)
+
+    @staticmethod
+    def _fuzzy_budget(query: str, max_distance: Optional[int]) -> int:
+        """默认的编辑距离上限：短查询只容许一处错误"""
+        if max_distance is not None:
+            return max_distance
+        return min(Config.FUZZY_MAX_DISTANCE, 1 + len(query) // 5)
+
+    def _fuzzy_matches(self, query: str, max_distance: int) -> List[Tuple[int, str]]:
+        """距离不超过 max_distance 的 (距离, 键)，按距离与键排序"""
+        self._sync()
+        with self._lock:
+            return self._lazy_index('fuzzy').search(query, max_distance)
+
+    def _items_for_keys(self, keys: List[str]) -> List[dict]:
+        """按给定顺序取出条目，已不存在的键跳过"""
+        with self._lock:
+            records = [(k, self._data[k]) for k in keys if k in self._data]
+        return [{'key': k, **v.to_entry()} for k, v in records]
     
-    def delete_string(self, key: str) -> bool:
-        """删除字符串"""
-        if key in self._data:
-            del self._data[key]
-            self._save_data()
-            return True
+    def delete_string(self, key: str, if_match: Optional[Precondition] = None) -> bool:
+        """删除字符串；if_match 不满足时抛出 PreconditionFailed"""
+        with self._writing():
+            current = self._get_entry(key)
+            check_precondition(current, if_match)
+            if current is not None:
+                self._remove(key)
+                return True
         return False
     
+    @cached()
     def get_all_strings(self, page: int = 1, per_page: int = None, tag: Optional[str] = None, sort_by: str = 'updated_at', sort_order: str = 'desc') -> tuple:
         """获取所有字符串，支持分页、按标签筛选和排序"""
         if per_page is None:
             per_page = self.ITEMS_PER_PAGE
         
-        if tag:
-            filtered_items = [
-                {'key': k, **v} for k, v in self._data.items() if tag in v.get('tags', [])
-            ]
-        else:
-            filtered_items = [{'key': k, **v} for k, v in self._data.items()]
-            
-        # 根据排序参数进行排序
+        self._sync()
+        # 按有序索引取出当前页（值在取出当前页后才加载）
+        index_name = 'created' if sort_by == 'created_at' else 'updated'
         reverse = sort_order == 'desc'
-        if sort_by == 'created_at':
-            items = sorted(
-                filtered_items,
-                key=lambda x: x['created_at'],
-                reverse=reverse
-            )
-        else:  # 默认按 updated_at 排序
-            items = sorted(
-                filtered_items,
-                key=lambda x: x['updated_at'],
-                reverse=reverse
-            )
-        
-        total = len(items)
         start = (page - 1) * per_page
         end = start + per_page
-        return items[start:end], total
+        with self._lock:
+            index = self._indexes[index_name]
+            if tag:
+                tagged = self._indexes['tags'].get(tag, ())
+                total = len(tagged)
+                # 沿有序索引扫描约需 end * n / total 步，对带标签的条目排序约需 total * log(total) 步
+                if end * len(index) <= total * total * total.bit_length():
+                    # 带该标签的条目较多：沿有序索引扫描，凑满当前页即停止
+                    ordered = reversed(index) if reverse else iter(index)
+                    keys = list(islice((k for _, k in ordered if k in tagged), start, end))
+                else:
+                    # 带该标签的条目较少：只对这些条目排序
+                    pairs = sorted(((getattr(self._data[k], index_name), k) for k in tagged), reverse=reverse)
+                    keys = [k for _, k in pairs[start:end]]
+            else:
+                total = len(index)
+                keys = [k for _, k in index.slice(start, end, reverse)]
+            records = [(k, self._data[k]) for k in keys]
+        return [{'key': k, **v.to_entry()} for k, v in records], total
+
+    def get_strings_after(self, after: Optional[Tuple[str, str]] = None, per_page: int = None,
+                          tag: Optional[str] = None, sort_by: str = 'updated_at', sort_order: str = 'desc') -> tuple:
+        """
+        键集分页：返回排在 after (排序时间, 键) 之后的一页条目，以及之后是否还有条目
+        从有序索引中的位置继续读取，不跳过前面的页；翻页期间的修改不会让未修改的条目重复或遗漏
+        """
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        self._sync()
+        index_name = 'created' if sort_by == 'created_at' else 'updated'
+        reverse = sort_order == 'desc'
+        position = None if after is None else (to_micros(after[0]), after[1])
+        with self._lock:
+            index = self._indexes[index_name]
+            tagged = self._indexes['tags'].get(tag, ()) if tag else None
+            if tagged is not None and per_page * len(index) > len(tagged) ** 2 * len(tagged).bit_length():
+                # 带该标签的条目较少：只对这些条目排序
+                pairs = sorted(((getattr(self._data[k], index_name), k) for k in tagged), reverse=reverse)
+                ordered = iter(pairs) if position is None else \
+                    (p for p in pairs if (p < position if reverse else p > position))
+            else:
+                if position is None:
+                    ordered = reversed(index) if reverse else iter(index)
+                else:
+                    ordered = (p for p in index.iter_from(position, reverse) if p != position)
+                if tagged is not None:
+                    ordered = (p for p in ordered if p[1] in tagged)
+            keys = [k for _, k in islice(ordered, per_page + 1)]
+            records = [(k, self._data[k]) for k in keys[:per_page]]
+        return [{'key': k, **v.to_entry()} for k, v in records], len(keys) > per_page
+
+    def changed_since(self, moment: datetime, page: int = 1, per_page: int = None) -> tuple:
+        """按 updated_at 升序列出在指定时间之后修改过的字符串"""
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        self._sync()
+        with self._lock:
+            index = self._indexes['updated']
+            first = index.position((to_micros(moment.isoformat()) + 1, ''))
+            total = len(index) - first
+            start = first + (page - 1) * per_page
+            records = [(k, self._data[k]) for _, k in index.slice(start, start + per_page)]
+        return [{'key': k, **v.to_entry()} for k, v in records], total
     
-    def search_strings(self, query: str) -> List[dict]:
-        """搜索字符串，包括在标签中搜索"""
+    @cached(lower_query)
+    def search_strings(self, query: str, limit: Optional[int] = None, offset: int = 0,
+                       sort_by: str = 'relevance', sort_order: str = 'desc') -> List[dict]:
+        """搜索字符串，包括在标签中搜索，默认按相关度排序"""
+        return self._search(query, offset, limit, sort_by, sort_order, True)[0]
+
+    @cached(lower_query)
+    def search_page(self, query: str, page: int = 1, per_page: int = None, sort_by: str = 'relevance',
+                    sort_order: str = 'desc', exact_total: bool = True) -> tuple:
+        """
+        分页搜索，返回 (当前页条目, 总数)
+        exact_total 为 False 时，键和标签的匹配已足够填满当前页就不再读取值，总数为上限估计
+        """
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        return self._search(query, max(page - 1, 0) * per_page, per_page, sort_by, sort_order, exact_total)
+
+    def _search(self, query: str, offset: int, limit: Optional[int], sort_by: str, sort_order: str,
+                exact_total: bool) -> tuple:
+        """用有界堆取出排序后 [offset, offset + limit) 的匹配条目，返回 (条目, 总数)"""
         query = query.lower()
-        return [
-            {'key': k, **v} 
-            for k, v in self._data.items() 
-            if query in k.lower() or \
-               query in v['value'].lower() or \
-               any(query in tag.lower() for tag in v.get('tags', []))
-        ]
+        self._sync()
+        with self._lock:
+            matched, pending = self._search_matches(query, verify=False)
+            end = None if limit is None else offset + limit
+            if sort_by == 'relevance':
+                # 相关度相同的按修改时间从新到旧
+                order = lambda item: (item[0], -self._data[item[1]].updated, item[1])
+                if not exact_total and end is not None and len(matched) >= end:
+                    # 值匹配的等级最低，不会进入当前页，跳过读取值，总数按全部候选估计
+                    top = heapq.nsmallest(end, matched, key=order)
+                    total = len(matched) + len(pending)
+                else:
+                    matched += self._verify_values(query, pending)
+                    top = heapq.nsmallest(len(matched) if end is None else end, matched, key=order)
+                    total = len(matched)
+            else:
+                matched += self._verify_values(query, pending)
+                field = 'created' if sort_by == 'created_at' else 'updated'
+                pick = heapq.nlargest if sort_order == 'desc' else heapq.nsmallest
+                top = pick(len(matched) if end is None else end, matched,
+                           key=lambda item: (getattr(self._data[item[1]], field), item[1]))
+                total = len(matched)
+            records = [(k, self._data[k]) for _, k in top[offset:]]
+        return [{'key': k, **v.to_entry()} for k, v in records], total
+
+    def _search_matches(self, query: str, verify: bool = True) -> Tuple[List[Tuple[int, str]], List[str]]:
+        """
+        返回 ([(相关度等级, 键)], 键和标签都不匹配、尚待检查值的候选键)，调用方需持有锁
+        全文索引只给出候选，先比较键和标签，verify 时再读取其余候选的值
+        """
+        candidates = self._lazy_index('ngrams').candidates(query)
+        matched: List[Tuple[int, str]] = []
+        pending: List[str] = []
+        for key in (self._data if candidates is None else candidates):
+            rank = self._key_rank(key, self._data[key], query)
+            if rank is None:
+                pending.append(key)
+            else:
+                matched.append((rank, key))
+        if verify:
+            matched += self._verify_values(query, pending)
+            pending = []
+        return matched, pending
+
+    def _key_rank(self, key: str, record: Record, query: str) -> Optional[int]:
+        """不读取值即可确定的相关度等级，键和标签都不匹配时返回 None"""
+        lowered = key.lower()
+        if lowered == query:
+            return self.RANK_KEY
+        if lowered.startswith(query):
+            return self.RANK_PREFIX
+        if query in lowered:
+            return self.RANK_KEY_CONTAINS
+        if any(query in tag.lower() for tag in record.tags):
+            return self.RANK_TAG
+        return None
+
+    def _verify_values(self, query: str, keys: List[str]) -> List[Tuple[int, str]]:
+        """读取值确认候选是否匹配"""
+        return [(self.RANK_VALUE, key) for key in keys if query in self._data[key].read_value().lower()]
+
+    @cached(strip_query)
+    def query_page(self, query: str, page: int = 1, per_page: int = None, tag: Optional[str] = None,
+                   sort_by: str = 'relevance', sort_order: str = 'desc', exact_total: bool = True,
+                   strict: bool = True) -> tuple:
+        """
+        组合查询（语法见 app/utils/query.py）与标签筛选后排序分页，返回 (当前页条目, 总数)
+        语法错误时 strict 抛出 QueryError，否则把整个输入作为普通文本搜索
+        """
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        node = self._query_node(query, tag, strict)
+        start = max(page - 1, 0) * per_page
+        if isinstance(node, Text):
+            # 只有一个文本条件时就是普通搜索
+            return self._search(node.text, start, per_page, sort_by, sort_order, exact_total)
+        self._sync()
+        with self._lock:
+            keys = self._run_query(node)
+            if sort_by == 'relevance':
+                terms = text_terms(node)
+
+                def order(k: str) -> tuple:
+                    # 相关度取各文本条件中最好的等级，相同时按修改时间从新到旧
+                    ranks = [self._key_rank(k, self._data[k], term) for term in terms]
+                    best = min((rank for rank in ranks if rank is not None), default=self.RANK_VALUE)
+                    return best, -self._data[k].updated, k
+
+                top = heapq.nsmallest(start + per_page, keys, key=order)
+            else:
+                field = 'created' if sort_by == 'created_at' else 'updated'
+                pick = heapq.nlargest if sort_order == 'desc' else heapq.nsmallest
+                top = pick(start + per_page, keys, key=lambda k: (getattr(self._data[k], field), k))
+            records = [(k, self._data[k]) for k in top[start:]]
+        return [{'key': k, **v.to_entry()} for k, v in records], len(keys)
+
+    @staticmethod
+    def _query_node(query: str, tag: Optional[str], strict: bool = True):
+        """解析查询并并入标签筛选，空查询且无标签时返回 None"""
+        try:
+            node = parse_query(query)
+        except QueryError:
+            if strict:
+                raise
+            node = Text(query.strip())
+        if tag:
+            node = Tag(tag) if node is None else And([node, Tag(tag)])
+        return node
+
+    def _run_query(self, node) -> List[str]:
+        """
+        按查询计划执行，调用方需持有锁：
+        由估计匹配数最少的可索引条件（标签集合、时间有序索引区间、全文索引候选）给出候选键，
+        再按代价从低到高逐条检查其余条件，需要读取值的文本条件最后检查
+        """
+        if node is None:
+            return list(self._data)
+        plan = self._plan(node)
+        candidates = self._candidates(plan)
+        data = self._data
+        return [k for k in (data if candidates is None else candidates) if self._matches(plan, k, data[k])]
+
+    def _plan(self, node):
+        """重排 AND 的子条件：第一个是驱动候选集的最选择性条件，其余按检查代价排序"""
+        if isinstance(node, (And, Or)):
+            items = [self._plan(item) for item in node.items]
+            if isinstance(node, Or):
+                return Or(items)
+            driver = min(items, key=self._estimate)
+            rest = sorted((item for item in items if item is not driver),
+                          key=lambda item: (self._check_cost(item), self._estimate(item)))
+            return And([driver] + rest)
+        if isinstance(node, Not):
+            return Not(self._plan(node.item))
+        return node
+
+    def _estimate(self, node) -> int:
+        """条件匹配条目数的上限估计，无法用索引缩小范围时为总条目数"""
+        total = len(self._data)
+        if isinstance(node, Tag):
+            return len(self._indexes['tags'].get(node.name, ()))
+        if isinstance(node, Text):
+            estimate = self._lazy_index('ngrams').estimate(node.text)
+            return total if estimate is None else estimate
+        if isinstance(node, TimeRange):
+            first, last = self._time_range_positions(node)
+            return last - first
+        if isinstance(node, And):
+            return min(self._estimate(item) for item in node.items)
+        if isinstance(node, Or):
+            return min(total, sum(self._estimate(item) for item in node.items))
+        return total
+
+    def _check_cost(self, node) -> int:
+        """逐条检查条件的相对代价：标签与时间只比较元数据，文本可能需要读取值"""
+        if isinstance(node, Text):
+            return 1
+        if isinstance(node, (And, Or)):
+            return max(self._check_cost(item) for item in node.items)
+        if isinstance(node, Not):
+            return self._check_cost(node.item)
+        return 0
+
+    def _candidates(self, node) -> Optional[Iterable[str]]:
+        """条件的候选键（可能多于实际匹配），无法用索引缩小范围时返回 None"""
+        if isinstance(node, Tag):
+            return self._indexes['tags'].get(node.name, ())
+        if isinstance(node, Text):
+            return self._lazy_index('ngrams').candidates(node.text)
+        if isinstance(node, TimeRange):
+            first, last = self._time_range_positions(node)
+            index = self._indexes['created' if node.field == 'created' else 'updated']
+            return [k for _, k in index.slice(first, last)]
+        if isinstance(node, And):
+            # _plan 已把最选择性的条件放在第一个
+            return self._candidates(node.items[0])
+        if isinstance(node, Or):
+            parts = [self._candidates(item) for item in node.items]
+            if any(part is None for part in parts):
+                return None
+            return set().union(*parts)
+        return None
+
+    def _time_range_positions(self, node: TimeRange) -> Tuple[int, int]:
+        """时间范围在有序索引中的位置区间 [first, last)"""
+        index = self._indexes['created' if node.field == 'created' else 'updated']
+        first = 0 if node.start is None else index.position((node.start, ''))
+        last = len(index) if node.end is None else index.position((node.end, ''))
+        return first, max(first, last)
+
+    def _matches(self, node, key: str, record: Record) -> bool:
+        """检查条目是否满足条件"""
+        if isinstance(node, Tag):
+            return node.name in record.tags
+        if isinstance(node, TimeRange):
+            moment = record.created if node.field == 'created' else record.updated
+            return (node.start is None or moment >= node.start) and (node.end is None or moment < node.end)
+        if isinstance(node, Text):
+            return (self._key_rank(key, record, node.text) is not None
+                    or node.text in record.read_value().lower())
+        if isinstance(node, And):
+            return all(self._matches(item, key, record) for item in node.items)
+        if isinstance(node, Or):
+            return any(self._matches(item, key, record) for item in node.items)
+        return not self._matches(node.item, key, record)
     
     def add_tag(self, key: str, tag: str) -> bool:
         """为指定字符串添加标签"""
-        if key in self._data and tag and tag.strip():
-            tags = self._data[key].get('tags', [])
-            if tag not in tags:
-                tags.append(tag)
-                self._data[key]['tags'] = sorted(tags)
-                self._data[key]['updated_at'] = datetime.now().isoformat()
-                self._save_data()
-                return True
+        with self._writing():
+            current = self._get_entry(key)
+            if current is not None and tag and tag.strip():
+                tags = current.get('tags', [])
+                if tag not in tags:
+                    self._put(key, dict(current,
+                                        tags=sorted(tags + [tag]),
+                                        updated_at=datetime.now().isoformat()))
+                    return True
         return False
 
     def delete_tag(self, key: str, tag: str) -> bool:
         """删除指定字符串的标签"""
-        if key in self._data and tag:
-            tags = self._data[key].get('tags', [])
-            if tag in tags:
-                tags.remove(tag)
-                self._data[key]['tags'] = sorted(tags)
-                self._data[key]['updated_at'] = datetime.now().isoformat()
-                self._save_data()
-                return True
+        with self._writing():
+            current = self._get_entry(key)
+            if current is not None and tag:
+                tags = current.get('tags', [])
+                if tag in tags:
+                    self._put(key, dict(current,
+                                        tags=sorted(t for t in tags if t != tag),
+                                        updated_at=datetime.now().isoformat()))
+                    return True
         return False
 
+    def get_history(self, key: str) -> List[dict]:
+        """获取某个键的修订历史，最新的在前"""
+        self.flush()
+        return self._revisions.history(key)
+
+    def restore_revision(self, key: str, revision: int) -> bool:
+        """把某个键恢复到指定修订时的状态"""
+        self.flush()
+        with self._writing():
+            found, state = self._revisions.state_at(key, revision)
+            if not found:
+                return False
+            if state is None:
+                if self._get_entry(key) is not None:
+                    self._remove(key)
+                return True
+            entry = {
+                'value': state['value'],
+                'created_at': state['created_at'],
+                'updated_at': datetime.now().isoformat(),
+                'tags': list(state.get('tags', []))
+            }
+            self._put(key, entry)
+        return True
+
+    def snapshot_at(self, moment: datetime) -> Optional[Dict[str, dict]]:
+        """重建指定时间点的完整数据，超出保留范围时返回 None"""
+        self.flush()
+        return self._revisions.snapshot_at(moment.timestamp())
+
+    def changes_since(self, since: Optional[int], limit: int) -> dict:
+        """
+        增量同步：序号（修订号）大于 since 的新建、修改与删除，每个键只返回当前状态，已删除的键返回墓碑
+        墓碑与修订历史一同保留（见 REVISION_KEEP_*）；since 为空、早于保留范围或无效时返回 resync，
+        客户端应先记下返回的 seq，再完整导出，之后从该 seq 继续增量同步
+        """
+        self.flush()
+        page = None if since is None else self._revisions.changes_since(since, limit)
+        if page is None:
+            return {'resync': True, 'seq': self._revisions.last_rev()}
+        records, has_more = page
+        # 同一个键只保留最后一次修订，按该修订的顺序返回
+        latest: Dict[str, int] = {}
+        for record in records:
+            latest.pop(record['key'], None)
+            latest[record['key']] = record['rev']
+        self._sync()
+        items = {item['key']: item for item in self._items_for_keys(list(latest))}
+        changes = []
+        for key, rev in latest.items():
+            item = items.get(key)
+            if item is None:
+                changes.append({'seq': rev, 'key': key, 'deleted': True})
+            else:
+                entry = {f: item[f] for f in ('value', 'created_at', 'updated_at', 'tags')}
+                changes.append({'seq': rev, 'key': key, 'deleted': False, 'entry': entry})
+        return {'resync': False, 'changes': changes, 'seq': records[-1]['rev'] if records else since,
+                'has_more': has_more}
+
+    @cached()
     def get_all_tags(self) -> List[str]:
         """获取所有唯一的标签"""
-        all_tags: Set[str] = set()
-        for item in self._data.values():
-            all_tags.update(item.get('tags', []))
-        return sorted(list(all_tags))
+        self._sync()
+        with self._lock:
+            return sorted(self._indexes['tags'])
+
+    def complete(self, prefix: str, kind: str = 'key', limit: int = 10) -> List[str]:
+        """
+        以 prefix 开头（不区分大小写）的键或标签，键按修改时间从新到旧，标签按条目数从多到少，
+        最多返回 Config.COMPLETE_MAX_LIMIT 条
+        """
+        self._sync()
+        with self._lock:
+            return self._lazy_index('tag_trie' if kind == 'tag' else 'key_trie').complete(prefix, limit)
+
+    @cached()
+    def get_tag_counts(self) -> Dict[str, int]:
+        """各标签的条目数，按标签排序"""
+        self._sync()
+        with self._lock:
+            return {tag: len(self._indexes['tags'][tag]) for tag in sorted(self._indexes['tags'])}
+
+    @cached()
+    def tag_facets(self, keys: Optional[List[str]] = None, tag: Optional[str] = None,
+                   query: Optional[str] = None, strict: bool = True) -> Dict[str, int]:
+        """
+        结果集中各标签的条目数：keys 为指定的键，tag 为按标签筛选，query 为组合查询（可与 tag 同时使用），
+        都为空时为全部条目
+        """
+        if keys is None and tag is None and query is None:
+            return self.get_tag_counts()
+        self._sync()
+        with self._lock:
+            if query is not None:
+                node = self._query_node(query, tag, strict)
+                if isinstance(node, Text):
+                    keys = [k for _, k in self._search_matches(node.text)[0]]
+                else:
+                    keys = self._run_query(node)
+            elif keys is None:
+                keys = self._indexes['tags'].get(tag, ())
+            counts = Counter(t for k in keys if k in self._data for t in self._data[k].tags)
+        return {t: counts[t] for t in sorted(counts)}
+
+    def stats(self) -> dict:
+        """存储统计信息（条目数、内存占用估算与压缩率）"""
+        self._sync()
+        with self._lock:
+            data = dict(self._data)
+        return {'backend': 'json', 'memory': memory_usage(data), 'compression': compression_usage(data),
+                'cache': self._result_cache.stats() if self._result_cache is not None else None,
+                'changes': self._changes.stats()}
 
     def _validate_key(self, key: str) -> bool:
         """验证键名"""
@@ -182,3 +1277,11 @@ class StringStore:
         """验证值"""
         return (isinstance(value, str) and 
                 0 < len(value) <= Config.MAX_STRING_LENGTH)
+
+
+def create_store() -> StringStore:
+    """按配置创建存储后端"""
+    if Config.STORAGE_BACKEND == 'sqlite':
+        from app.sqlite_store import SQLiteStringStore
+        return SQLiteStringStore()
+    return StringStore()
@@ -0,0 +1,448 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.config.config import Config
+from app.models import StringStore
+from app.utils.changefeed import DELETE, PUT, ChangeFeed
+from app.utils.coherence import FileMutex, GenerationCounter, ProcessLock
+from app.utils.fuzzy import edit_distance
+from app.utils.journal import Journal
+from app.utils.query import And, Not, Or, Tag, Text, TimeRange, text_terms
+from app.utils.records import from_micros, parse_micros, to_micros
+from app.utils.resultcache import ResultCache, cached, strip_query
+from app.utils.revisions import RevisionLog
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS strings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    key TEXT NOT NULL REFERENCES strings(key) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (key, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_strings_updated_at ON strings(updated_at, key);
+CREATE INDEX IF NOT EXISTS idx_strings_created_at ON strings(created_at, key);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags(tag, key);
+CREATE INDEX IF NOT EXISTS idx_strings_key_nocase ON strings(key COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_tags_tag_nocase ON tags(tag COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+def _time_param(timestamp: str) -> str:
+    """
+    写入或用于比较的时间：规范为本地时间、不带时区的 ISO 字符串（与 JSON 后端的 from_micros 一致），
+    库中的时间都是这种格式，字符串顺序与时间顺序一致，可以直接在 SQL 中比较与排序
+    """
+    return from_micros(to_micros(timestamp))
+
+
+class SQLiteStringStore(StringStore):
+    """SQLite 存储后端：数据不必全部驻留内存，分页、标签筛选与排序下推到 SQL"""
+
+    def __init__(self):
+        self.db_file = Config.SQLITE_FILE
+        self.data_file = Config.DATA_FILE
+        self._other_file = Config.RECORD_FILE
+        self.backup_dir = Config.BACKUP_DIR
+        os.makedirs(self.backup_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        # 多进程间的数据一致性由 SQLite 保证，文件锁用于串行化启动时的初始化与修订日志的写入
+        self._plock = ProcessLock(Config.LOCK_FILE)
+        # 查询结果缓存：每次提交后推进共享代数，其他进程的缓存也随之失效
+        self._generation = GenerationCounter(Config.GENERATION_FILE)
+        self._result_cache = ResultCache(Config.RESULT_CACHE_ENTRIES, Config.RESULT_CACHE_BYTES) \
+            if Config.RESULT_CACHE_ENTRIES > 0 else None
+        # 变更日志：只记录本进程的修改，其他进程提交过（共享代数变化）时通知订阅者整体刷新
+        self._changes = ChangeFeed(Config.CHANGEFEED_SIZE, Config.EVENTS_BUFFER)
+        self._seen_generation = self._generation.read()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._closed = False
+        # 启动时的初始化（切换 WAL 模式、建表、从 data.json 迁移、建立修订基线）整体持有排他文件锁，
+        # 多个 worker 同时启动时依次进行
+        with self._plock.exclusive():
+            self._conn().executescript(SCHEMA)
+            self._migrate_from_json()
+            self._revisions = RevisionLog(self.backup_dir,
+                                          keep_all=Config.REVISION_KEEP_ALL,
+                                          keep_hourly=Config.REVISION_KEEP_HOURLY,
+                                          keep_daily=Config.REVISION_KEEP_DAILY,
+                                          keep_weekly=Config.REVISION_KEEP_WEEKLY,
+                                          prune_interval=Config.REVISION_PRUNE_INTERVAL,
+                                          file_lock=self._plock,
+                                          prune_mutex=FileMutex(Config.LOCK_FILE + '.prune'))
+            self._revisions.ensure_base(self._read_all)
+        atexit.register(self.close)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程使用独立的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}')
+            conn.execute('PRAGMA foreign_keys=ON')
+            # 与 str.lower() 保持一致的大小写折叠（SQLite 内置 lower() 只处理 ASCII）
+            conn.create_function('py_lower', 1, str.lower, deterministic=True)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _sync(self) -> None:
+        """每次查询都直接读取数据库，无需同步"""
+
+    def version(self) -> str:
+        """数据版本：所有进程的提交次数"""
+        return str(self._generation.read())
+
+    def _cache_generation(self) -> int:
+        """查询结果缓存的代数：所有进程的提交次数"""
+        return self._generation.read()
+
+    def poll_changes(self) -> None:
+        """其他进程提交过修改时发布 reset（无法得知具体哪些键变化）"""
+        with self._lock:
+            current = self._generation.read()
+            if current != self._seen_generation:
+                self._seen_generation = current
+                self._changes.reset()
+
+    @contextmanager
+    def _writing(self):
+        """写操作：串行化本进程内的写入与修订记录，持有排他文件锁以推进共享代数"""
+        with self._lock, self._plock.exclusive():
+            yield
+
+    def _migrate_from_json(self) -> None:
+        """一次性从 data.json（含旧的纯字符串格式及未压缩的日志）导入数据"""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE name = 'migrated_from_json'").fetchone():
+            return
+        # 多个进程同时首次启动：BEGIN IMMEDIATE 取得写锁后再检查一次，只有一个进程导入
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute("SELECT 1 FROM meta WHERE name = 'migrated_from_json'").fetchone():
+                return
+            data = {k: v.to_entry() for k, v in self._load_data().items()}
+            for path in (Config.JOURNAL_FILE + '.compacting', Config.JOURNAL_FILE):
+                for record in Journal.replay(path):
+                    if record.get('op') == 'put':
+                        data[record['key']] = record['entry']
+                    elif record.get('op') == 'del':
+                        data.pop(record['key'], None)
+            conn.executemany(
+                'INSERT OR IGNORE INTO strings (key, value, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                ((k, v['value'], from_micros(parse_micros(v.get('created_at'))),
+                  from_micros(parse_micros(v.get('updated_at')))) for k, v in data.items()))
+            conn.executemany(
+                'INSERT OR IGNORE INTO tags (key, tag) VALUES (?, ?)',
+                ((k, tag) for k, v in data.items() for tag in v.get('tags', [])))
+            conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('migrated_from_json', ?)",
+                         (datetime.now().isoformat(),))
+        if data:
+            logging.info(f"已从 {self.data_file} 迁移 {len(data)} 条数据到 {self.db_file}")
+
+    def _rows_to_items(self, rows: List[tuple]) -> List[dict]:
+        """把查询结果与其标签组装为条目字典"""
+        if not rows:
+            return []
+        keys = [row[0] for row in rows]
+        tags: Dict[str, List[str]] = {k: [] for k in keys}
+        placeholders = ','.join('?' * len(keys))
+        for key, tag in self._conn().execute(
+                f'SELECT key, tag FROM tags WHERE key IN ({placeholders}) ORDER BY tag', keys):
+            tags[key].append(tag)
+        return [{'key': key, 'value': value, 'created_at': created_at, 'updated_at': updated_at,
+                 'tags': tags[key]}
+                for key, value, created_at, updated_at in rows]
+
+    def _read_all(self) -> Dict[str, dict]:
+        """读取全部数据（仅用于建立修订基线）"""
+        rows = self._conn().execute(
+            'SELECT key, value, created_at, updated_at FROM strings ORDER BY rowid').fetchall()
+        result = {}
+        for i in range(0, len(rows), 500):
+            for item in self._rows_to_items(rows[i:i + 500]):
+                result[item.pop('key')] = item
+        return result
+
+    def _get_entry(self, key: str) -> Optional[dict]:
+        row = self._conn().execute(
+            'SELECT key, value, created_at, updated_at FROM strings WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        item = self._rows_to_items([row])[0]
+        del item['key']
+        return item
+
+    def _put_many(self, changes: Dict[str, Optional[dict]]) -> None:
+        """一批写入或删除（None）在同一个事务中提交"""
+        for key, entry in changes.items():
+            self._revisions.record(key, self._get_entry(key), entry)
+        puts = [(key, entry) for key, entry in changes.items() if entry is not None]
+        conn = self._conn()
+        with conn:
+            conn.executemany('DELETE FROM strings WHERE key = ?',
+                             ((key,) for key, entry in changes.items() if entry is None))
+            conn.executemany(
+                'INSERT INTO strings (key, value, created_at, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, '
+                'created_at = excluded.created_at, updated_at = excluded.updated_at',
+                ((key, entry['value'], _time_param(entry['created_at']), _time_param(entry['updated_at']))
+                 for key, entry in puts))
+            conn.executemany('DELETE FROM tags WHERE key = ?', ((key,) for key, _ in puts))
+            conn.executemany('INSERT INTO tags (key, tag) VALUES (?, ?)',
+                             ((key, tag) for key, entry in puts for tag in entry.get('tags', [])))
+        self.poll_changes()
+        self._seen_generation = self._generation.advance()
+        self._changes.publish((DELETE if entry is None else PUT, key) for key, entry in changes.items())
+        self._revisions.flush()
+
+    @cached()
+    def get_all_strings(self, page: int = 1, per_page: int = None, tag: Optional[str] = None, sort_by: str = 'updated_at', sort_order: str = 'desc') -> tuple:
+        """获取所有字符串，分页、标签筛选和排序均在 SQL 中完成"""
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        column = 'created_at' if sort_by == 'created_at' else 'updated_at'
+        direction = 'DESC' if sort_order == 'desc' else 'ASC'
+        where, params = '', []
+        if tag:
+            where, params = 'WHERE key IN (SELECT key FROM tags WHERE tag = ?)', [tag]
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM strings {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT key, value, created_at, updated_at FROM strings {where} '
+            f'ORDER BY {column} {direction}, key {direction} LIMIT ? OFFSET ?',
+            params + [per_page, max(page - 1, 0) * per_page]).fetchall()
+        return self._rows_to_items(rows), total
+
+    def _fuzzy_matches(self, query: str, max_distance: int) -> List[Tuple[int, str]]:
+        """按长度在 SQL 中预先筛选，再逐个计算有上限的编辑距离"""
+        word = query.lower()
+        rows = self._conn().execute('SELECT key FROM strings WHERE length(key) BETWEEN ? AND ?',
+                                    (len(word) - max_distance, len(word) + max_distance))
+        matches = []
+        for (key,) in rows:
+            distance = edit_distance(word, key.lower(), max_distance)
+            if distance <= max_distance:
+                matches.append((distance, key))
+        matches.sort()
+        return matches
+
+    def _items_for_keys(self, keys: List[str]) -> List[dict]:
+        """按给定顺序取出条目，已不存在的键跳过"""
+        if not keys:
+            return []
+        placeholders = ','.join('?' * len(keys))
+        rows = self._conn().execute(
+            f'SELECT key, value, created_at, updated_at FROM strings WHERE key IN ({placeholders})', keys).fetchall()
+        items = {item['key']: item for item in self._rows_to_items(rows)}
+        return [items[k] for k in keys if k in items]
+
+    def get_strings_after(self, after: Optional[Tuple[str, str]] = None, per_page: int = None,
+                          tag: Optional[str] = None, sort_by: str = 'updated_at', sort_order: str = 'desc') -> tuple:
+        """键集分页：用 (排序时间, 键) 的行值比较从索引位置继续读取"""
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        column = 'created_at' if sort_by == 'created_at' else 'updated_at'
+        direction = 'DESC' if sort_order == 'desc' else 'ASC'
+        conditions, params = [], []
+        if tag:
+            conditions.append('key IN (SELECT key FROM tags WHERE tag = ?)')
+            params.append(tag)
+        if after is not None:
+            conditions.append(f'({column}, key) {"<" if sort_order == "desc" else ">"} (?, ?)')
+            params += [_time_param(after[0]), after[1]]
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        rows = self._conn().execute(
+            f'SELECT key, value, created_at, updated_at FROM strings {where} '
+            f'ORDER BY {column} {direction}, key {direction} LIMIT ?', params + [per_page + 1]).fetchall()
+        return self._rows_to_items(rows[:per_page]), len(rows) > per_page
+
+    def changed_since(self, moment: datetime, page: int = 1, per_page: int = None) -> tuple:
+        """按 updated_at 升序列出在指定时间之后修改过的字符串"""
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        since = _time_param(moment.isoformat())
+        conn = self._conn()
+        total = conn.execute('SELECT COUNT(*) FROM strings WHERE updated_at > ?', (since,)).fetchone()[0]
+        rows = conn.execute(
+            'SELECT key, value, created_at, updated_at FROM strings WHERE updated_at > ? '
+            'ORDER BY updated_at, key LIMIT ? OFFSET ?',
+            (since, per_page, max(page - 1, 0) * per_page)).fetchall()
+        return self._rows_to_items(rows), total
+
+    # 搜索条件与相关度等级，参数均为小写后的查询串
+    SEARCH_TAG_MATCH = 'EXISTS (SELECT 1 FROM tags t WHERE t.key = s.key AND instr(py_lower(t.tag), ?) > 0)'
+    SEARCH_WHERE = f'instr(py_lower(key), ?) > 0 OR instr(py_lower(value), ?) > 0 OR {SEARCH_TAG_MATCH}'
+    SEARCH_RANK = (f'CASE WHEN py_lower(key) = ? THEN {StringStore.RANK_KEY} '
+                   f'WHEN instr(py_lower(key), ?) = 1 THEN {StringStore.RANK_PREFIX} '
+                   f'WHEN instr(py_lower(key), ?) > 0 THEN {StringStore.RANK_KEY_CONTAINS} '
+                   f'WHEN {SEARCH_TAG_MATCH} THEN {StringStore.RANK_TAG} '
+                   f'ELSE {StringStore.RANK_VALUE} END')
+
+    def _search(self, query: str, offset: int, limit: Optional[int], sort_by: str, sort_order: str,
+                exact_total: bool) -> tuple:
+        """相关度排序、分页与计数均在 SQL 中完成，总数总是精确的"""
+        query = query.lower()
+        if sort_by == 'relevance':
+            order, order_params = f'{self.SEARCH_RANK}, updated_at DESC, key', [query] * 4
+        else:
+            column = 'created_at' if sort_by == 'created_at' else 'updated_at'
+            direction = 'DESC' if sort_order == 'desc' else 'ASC'
+            order, order_params = f'{column} {direction}, rowid', []
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM strings s WHERE {self.SEARCH_WHERE}',
+                             [query] * 3).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT key, value, created_at, updated_at FROM strings s WHERE {self.SEARCH_WHERE} '
+            f'ORDER BY {order} LIMIT ? OFFSET ?',
+            [query] * 3 + order_params + [-1 if limit is None else limit, offset]).fetchall()
+        return self._rows_to_items(rows), total
+
+    @cached()
+    def get_all_tags(self) -> List[str]:
+        """获取所有唯一的标签"""
+        return [row[0] for row in self._conn().execute('SELECT DISTINCT tag FROM tags ORDER BY tag')]
+
+    def stats(self) -> dict:
+        """存储统计信息"""
+        entries = self._conn().execute('SELECT COUNT(*) FROM strings').fetchone()[0]
+        return {'backend': 'sqlite', 'entries': entries,
+                'cache': self._result_cache.stats() if self._result_cache is not None else None,
+                'changes': self._changes.stats()}
+
+    def complete(self, prefix: str, kind: str = 'key', limit: int = 10) -> List[str]:
+        """
+        前缀补全：在不区分大小写的索引上按前缀范围查找，再按修改时间或条目数排序
+        （SQLite 的 NOCASE 只折叠 ASCII 字母的大小写）
+        """
+        bounds = (prefix, prefix + '\U0010ffff', min(limit, Config.COMPLETE_MAX_LIMIT))
+        if kind == 'tag':
+            sql = ('SELECT tag FROM tags WHERE tag >= ? COLLATE NOCASE AND tag < ? COLLATE NOCASE '
+                   'GROUP BY tag ORDER BY COUNT(*) DESC, tag LIMIT ?')
+        else:
+            sql = ('SELECT key FROM strings WHERE key >= ? COLLATE NOCASE AND key < ? COLLATE NOCASE '
+                   'ORDER BY updated_at DESC, key LIMIT ?')
+        return [row[0] for row in self._conn().execute(sql, bounds)]
+
+    @cached()
+    def get_tag_counts(self) -> Dict[str, int]:
+        """各标签的条目数，按标签排序"""
+        return dict(self._conn().execute('SELECT tag, COUNT(*) FROM tags GROUP BY tag ORDER BY tag'))
+
+    @cached(strip_query)
+    def query_page(self, query: str, page: int = 1, per_page: int = None, tag: Optional[str] = None,
+                   sort_by: str = 'relevance', sort_order: str = 'desc', exact_total: bool = True,
+                   strict: bool = True) -> tuple:
+        """组合查询转换为一条 SQL，由 SQLite 的查询规划器选择索引，总数总是精确的"""
+        if per_page is None:
+            per_page = self.ITEMS_PER_PAGE
+        node = self._query_node(query, tag, strict)
+        where, params = self._query_sql(node)
+        terms = text_terms(node)
+        if sort_by == 'relevance' and terms:
+            ranks = ', '.join([self.SEARCH_RANK] * len(terms))
+            order = f'{"min(" + ranks + ")" if len(terms) > 1 else ranks}, updated_at DESC, key'
+            order_params = [param for term in terms for param in [term] * 4]
+        else:
+            column = 'created_at' if sort_by == 'created_at' else 'updated_at'
+            direction = 'ASC' if sort_by != 'relevance' and sort_order == 'asc' else 'DESC'
+            order, order_params = f'{column} {direction}, key {direction}', []
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM strings s WHERE {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT key, value, created_at, updated_at FROM strings s WHERE {where} '
+            f'ORDER BY {order} LIMIT ? OFFSET ?',
+            params + order_params + [per_page, max(page - 1, 0) * per_page]).fetchall()
+        return self._rows_to_items(rows), total
+
+    def _query_sql(self, node) -> Tuple[str, list]:
+        """把查询语法树转换为 WHERE 条件与参数"""
+        if node is None:
+            return '1', []
+        if isinstance(node, Text):
+            return f'({self.SEARCH_WHERE})', [node.text] * 3
+        if isinstance(node, Tag):
+            return 'key IN (SELECT key FROM tags WHERE tag = ?)', [node.name]
+        if isinstance(node, TimeRange):
+            column = 'created_at' if node.field == 'created' else 'updated_at'
+            conditions, params = [], []
+            if node.start is not None:
+                conditions.append(f'{column} >= ?')
+                params.append(from_micros(node.start))
+            if node.end is not None:
+                conditions.append(f'{column} < ?')
+                params.append(from_micros(node.end))
+            return f'({" AND ".join(conditions) or "1"})', params
+        if isinstance(node, Not):
+            where, params = self._query_sql(node.item)
+            return f'NOT {where}', params
+        parts = [self._query_sql(item) for item in node.items]
+        joiner = ' AND ' if isinstance(node, And) else ' OR '
+        return f'({joiner.join(where for where, _ in parts)})', [p for _, params in parts for p in params]
+
+    @cached()
+    def tag_facets(self, keys: Optional[List[str]] = None, tag: Optional[str] = None,
+                   query: Optional[str] = None, strict: bool = True) -> Dict[str, int]:
+        """
+        结果集中各标签的条目数：keys 为指定的键，tag 为按标签筛选，query 为组合查询（可与 tag 同时使用），
+        都为空时为全部条目
+        """
+        if keys is None and tag is None and query is None:
+            return self.get_tag_counts()
+        conn = self._conn()
+        if query is not None:
+            where, params = self._query_sql(self._query_node(query, tag, strict))
+            return dict(conn.execute(
+                f'SELECT tag, COUNT(*) FROM tags WHERE key IN (SELECT key FROM strings s WHERE {where}) '
+                'GROUP BY tag ORDER BY tag', params))
+        if keys is None:
+            return dict(conn.execute(
+                'SELECT t2.tag, COUNT(*) FROM tags t1 JOIN tags t2 ON t1.key = t2.key '
+                'WHERE t1.tag = ? GROUP BY t2.tag ORDER BY t2.tag', (tag,)))
+        counts: Dict[str, int] = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for t, n in conn.execute(
+                    f'SELECT tag, COUNT(*) FROM tags WHERE key IN ({placeholders}) GROUP BY tag', chunk):
+                counts[t] = counts.get(t, 0) + n
+        return {t: counts[t] for t in sorted(counts)}
+
+    def compact(self, background: bool = True) -> None:
+        """把 WAL 内容写回主数据库文件"""
+        self._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """SQLite 事务提交即已写盘"""
+        return True
+
+    def close(self) -> None:
+        """关闭所有数据库连接"""
+        if self._closed:
+            return
+        self._closed = True
+        self._revisions.flush()
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
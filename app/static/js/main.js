@@ -9,6 +9,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const stringListContainer = document.querySelector('.string-list-container');
     if (stringListContainer) {
         setupDelegatedListeners(stringListContainer);
+        initializeChangeFeed(stringListContainer);
     }
 });
 
@@ -21,6 +22,13 @@ function initializeStaticListeners() {
     if (searchInput) {
         searchInput.addEventListener('input', debounce(handleSearch, 300));
     }
+    const fuzzyToggle = document.querySelector('#fuzzy-toggle');
+    if (fuzzyToggle) {
+        fuzzyToggle.addEventListener('change', handleSearch);
+    }
+
+    // 键与标签的前缀补全（包括列表中动态加载的标签输入框）
+    document.addEventListener('input', debounce(handleCompletion, 200));
 
     // 优化标签切换 - 使用事件委托
     const tagFilterContainer = document.querySelector('.tag-filter-container');
@@ -106,21 +114,29 @@ function reinitializeDynamicContent() {
             }, index * 20); // 减少延迟时间
 
             // 2. 初始化预览状态和磨砂效果 - 使用同步操作避免延迟
-            const valueElement = item.querySelector('.string-value');
-            const previewButton = item.querySelector('.preview-btn');
-            if (valueElement && previewButton) {
-                // 立即应用类，不使用延迟
-                valueElement.classList.add('truncate', 'frosted-glass', 'frosted-glass-active');
-                previewButton.innerHTML = '<span>👁️</span>' + getTranslation('expand_btn');
-                previewButton.setAttribute('title', getTranslation('expand_btn'));
-                
-                // 强制重绘以确保遮盖效果立即生效
-                valueElement.offsetHeight;
-            }
+            initializeItemPreview(item);
         });
     });
 }
 
+/**
+ * 初始化单个字符串项目的折叠预览与磨砂效果
+ * @param {HTMLElement} item
+ */
+function initializeItemPreview(item) {
+    const valueElement = item.querySelector('.string-value');
+    const previewButton = item.querySelector('.preview-btn');
+    if (valueElement && previewButton) {
+        // 立即应用类，不使用延迟
+        valueElement.classList.add('truncate', 'frosted-glass', 'frosted-glass-active');
+        previewButton.innerHTML = '<span>👁️</span>' + getTranslation('expand_btn');
+        previewButton.setAttribute('title', getTranslation('expand_btn'));
+        
+        // 强制重绘以确保遮盖效果立即生效
+        valueElement.offsetHeight;
+    }
+}
+
 // --- 事件处理器 ---
 
 function toggleAddForm() {
@@ -200,7 +216,10 @@ function handleAddTag(form) {
         .then(data => {
             if (data.success) {
                 showNotification(getTranslation('tag_add_success'), 'success');
-                location.reload();
+                // 已连接变更推送时，条目会随推送的事件原地更新
+                if (!isChangeFeedOpen()) {
+                    location.reload();
+                }
             } else {
                 showNotification(data.error || getTranslation('operation_failed'), 'error');
             }
@@ -226,7 +245,9 @@ function handleDeleteTag(button) {
         .then(data => {
             if (data.success) {
                 showNotification(getTranslation('tag_delete_success'), 'success');
-                location.reload();
+                if (!isChangeFeedOpen()) {
+                    location.reload();
+                }
             } else {
                 showNotification(data.error || getTranslation('operation_failed'), 'error');
             }
@@ -238,16 +259,78 @@ function handleDeleteTag(button) {
     }
 }
 
+/**
+ * 按输入框当前内容从服务端获取前缀补全并填入对应的 datalist
+ * 逗号分隔的标签输入框只补全最后一个标签
+ */
+function handleCompletion(e) {
+    const input = e.target;
+    if (!input.dataset || !input.dataset.complete) {
+        return;
+    }
+    const list = document.getElementById(input.getAttribute('list'));
+    if (!list) {
+        return;
+    }
+    const kind = input.dataset.complete;
+    const comma = kind === 'tag' ? input.value.lastIndexOf(',') : -1;
+    const head = comma >= 0 ? input.value.slice(0, comma + 1) + ' ' : '';
+    const prefix = input.value.slice(comma + 1).trim();
+
+    fetch(`/api/complete?kind=${kind}&limit=10&prefix=${encodeURIComponent(prefix)}`, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            return;
+        }
+        list.innerHTML = '';
+        data.completions.forEach(value => {
+            const option = document.createElement('option');
+            option.value = head + value;
+            list.appendChild(option);
+        });
+    })
+    .catch(err => console.error('获取补全失败:', err));
+}
+
 function handleCopy(button) {
     const valueElement = button.closest('.string-item').querySelector('.string-value');
-    const text = valueElement.textContent;
-    copyToClipboard(text, button);
+    loadFullValue(valueElement)
+        .then(() => copyToClipboard(valueElement.textContent, button))
+        .catch(() => showNotification(getTranslation('copy_failed'), 'error'));
+}
+
+// 列表中只有值的预览（data-partial），展开或复制时再获取完整的值
+function loadFullValue(valueElement) {
+    if (valueElement.dataset.partial !== 'true') {
+        return Promise.resolve();
+    }
+    const key = valueElement.closest('.string-item').dataset.key;
+    return fetch(`/api/string/${encodeURIComponent(key)}`, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        valueElement.textContent = data.data.value;
+        delete valueElement.dataset.partial;
+    });
 }
 
 function handleSearch(e) {
-    const query = e.target.value;
+    const query = document.querySelector('#search-input').value;
+    const fuzzyToggle = document.querySelector('#fuzzy-toggle');
     const url = new URL(window.location.href);
     url.searchParams.set('search', query);
+    if (fuzzyToggle && fuzzyToggle.checked) {
+        url.searchParams.set('fuzzy', '1');
+    } else {
+        url.searchParams.delete('fuzzy');
+    }
     url.searchParams.set('page', '1');
 
     // 显示加载状态
@@ -297,9 +380,9 @@ function handleTagFilter(e) {
     allTagItems.forEach(item => item.classList.remove('active'));
     tagLink.classList.add('active');
     
-    // 获取标签参数
-    const tag = tagLink.textContent.trim();
-    const isAllTag = tag === getTranslation('all_tags');
+    // 获取标签参数（标签名后附有条目数，从 data-tag 读取）
+    const tag = tagLink.dataset.tag !== undefined ? tagLink.dataset.tag : tagLink.textContent.trim();
+    const isAllTag = tag === '' || tag === getTranslation('all_tags');
     
     // 构建URL
     const url = new URL(window.location.href);
@@ -448,10 +531,91 @@ function handlePasswordVerification(e) {
 }
 
 
+// --- 变更推送 ---
+
+let changeFeed = null;
+
+/**
+ * 订阅 /api/events（服务端开启变更推送时列表容器带有 data-events-url）：
+ * 条目被修改或删除时原地替换列表中的对应项目，无法增量更新（reset）或出现了新条目时重新加载当前列表
+ * 断线或连接到期后浏览器带 Last-Event-ID 自动重连，服务端补发期间错过的事件
+ * @param {HTMLElement} container
+ */
+function initializeChangeFeed(container) {
+    if (!window.EventSource || !container.dataset.eventsUrl) {
+        return;
+    }
+    const refresh = debounce(() => refreshList(container), 300);
+    changeFeed = new EventSource(container.dataset.eventsUrl);
+    changeFeed.addEventListener('put', e => {
+        const data = JSON.parse(e.data);
+        const item = findStringItem(container, data.key);
+        if (item) {
+            const template = document.createElement('template');
+            template.innerHTML = data.html.trim();
+            const updated = template.content.firstElementChild;
+            item.replaceWith(updated);
+            initializeItemPreview(updated);
+        } else if (showsLatestFirst()) {
+            // 新条目会出现在当前页的最前面
+            refresh();
+        }
+    });
+    changeFeed.addEventListener('delete', e => {
+        const item = findStringItem(container, JSON.parse(e.data).key);
+        if (item) {
+            item.remove();
+        }
+    });
+    changeFeed.addEventListener('reset', refresh);
+}
+
+function isChangeFeedOpen() {
+    return changeFeed !== null && changeFeed.readyState === EventSource.OPEN;
+}
+
+function findStringItem(container, key) {
+    return container.querySelector(`.string-item[data-key="${CSS.escape(key)}"]`);
+}
+
+/**
+ * 当前列表是否为按修改时间倒序的第一页（没有搜索与标签筛选）
+ */
+function showsLatestFirst() {
+    const params = new URL(window.location.href).searchParams;
+    return !params.get('search') && !params.get('tag') && (params.get('page') || '1') === '1'
+        && (params.get('sort_by') || 'updated_at') === 'updated_at'
+        && (params.get('sort_order') || 'desc') === 'desc';
+}
+
+/**
+ * 按当前地址重新加载列表片段
+ * @param {HTMLElement} container
+ */
+function refreshList(container) {
+    fetch(window.location.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+    .then(response => response.text())
+    .then(html => {
+        container.innerHTML = html;
+        reinitializeDynamicContent();
+    })
+    .catch(err => console.error('刷新列表失败:', err));
+}
+
+
 // --- 辅助函数 ---
 
 function togglePreview(button) {
     const valueElement = button.closest('.string-item').querySelector('.string-value');
+    if (valueElement.classList.contains('truncate') && valueElement.dataset.partial === 'true') {
+        loadFullValue(valueElement)
+            .then(() => togglePreview(button))
+            .catch(err => {
+                console.error('获取完整的值失败:', err);
+                showNotification(getTranslation('operation_failed'), 'error');
+            });
+        return;
+    }
     const isTruncated = valueElement.classList.toggle('truncate');
     valueElement.classList.toggle('frosted-glass-active', isTruncated);
     
@@ -0,0 +1,124 @@
+# 静态资源指纹：构建时按内容哈希重命名并预先 gzip 压缩，模板中的 url_for('static', ...) 自动指向构建后的文件
+#     flask --app run build-assets
+# 构建后的文件名随内容变化，可以长期缓存；修改源文件后需要重新构建并重启，未构建或已过期的文件按原路径提供
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from typing import Dict
+
+import click
+from flask import Flask, request, send_from_directory
+
+MANIFEST = 'manifest.json'
+# 构建后资源的 URL 前缀（位于 static 路由之下）
+URL_PREFIX = 'dist/'
+# 本身已经压缩、不再 gzip 的格式
+PRECOMPRESSED = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2')
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def build_assets(static_dir: str, asset_dir: str) -> Dict[str, dict]:
+    """
+    把 static_dir 下的文件复制为 名称.哈希.扩展名，压缩后更小的同时写出 .gz，
+    返回并写出清单 {原路径: {'file': 构建后路径, 'digest': 内容哈希, 'gzip': 是否有 .gz}}
+    旧版本的文件不删除，已经打开的页面仍能加载它们引用的资源
+    """
+    asset_dir = os.path.abspath(asset_dir)
+    manifest: Dict[str, dict] = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != asset_dir]
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = _digest(data)
+            stem, ext = os.path.splitext(source)
+            target = f"{stem}.{digest}{ext}"
+            _write(os.path.join(asset_dir, target), data)
+            compressed = None
+            if ext.lower() not in PRECOMPRESSED:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    _write(os.path.join(asset_dir, target + '.gz'), compressed)
+                else:
+                    compressed = None
+            manifest[source] = {'file': target, 'digest': digest, 'gzip': compressed is not None}
+    _write(os.path.join(asset_dir, MANIFEST),
+           json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def _write(path: str, data: bytes) -> None:
+    """原子地写出文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def load_manifest(static_dir: str, asset_dir: str) -> Dict[str, dict]:
+    """读取构建清单，源文件内容已变化（构建后又修改过）的条目不使用"""
+    try:
+        with open(os.path.join(asset_dir, MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"静态资源清单无法读取，使用未构建的文件: {str(e)}")
+        return {}
+    current = {}
+    for source, entry in manifest.items():
+        try:
+            with open(os.path.join(static_dir, source), 'rb') as f:
+                fresh = _digest(f.read()) == entry['digest']
+        except OSError:
+            fresh = False
+        if fresh and os.path.exists(os.path.join(asset_dir, entry['file'])):
+            current[source] = entry
+        else:
+            logging.warning(f"静态资源 {source} 在构建后已修改，请重新运行 build-assets")
+    return current
+
+
+def init_assets(app: Flask, asset_dir: str, max_age: int) -> None:
+    """注册 url_for('static') 的文件名改写、构建后资源的响应方式与 build-assets 命令"""
+    manifest = load_manifest(app.static_folder, asset_dir)
+    built = {entry['file']: entry for entry in manifest.values()}
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        entry = manifest.get(values.get('filename')) if endpoint == 'static' else None
+        if entry is not None:
+            values['filename'] = URL_PREFIX + entry['file']
+
+    def static(filename):
+        entry = built.get(filename[len(URL_PREFIX):]) if filename.startswith(URL_PREFIX) else None
+        if entry is None:
+            # 未构建的文件：由 Flask 按修改时间与 ETag 提供，浏览器每次重新验证
+            return app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(entry['file'])[0] or 'application/octet-stream'
+        if entry['gzip'] and request.accept_encodings['gzip']:
+            response = send_from_directory(asset_dir, entry['file'] + '.gz', mimetype=mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = send_from_directory(asset_dir, entry['file'], mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        # 文件名随内容变化，内容永远不会改变
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+        return response
+
+    app.view_functions['static'] = static
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """构建带内容哈希的静态资源与 gzip 版本"""
+        result = build_assets(app.static_folder, asset_dir)
+        click.echo(f"已构建 {len(result)} 个静态资源到 {asset_dir}，重启应用后生效")
@@ -0,0 +1,70 @@
+# 批量修改：操作列表的校验，以及单个操作对条目的作用
+# [{"op": "set", "key": "a", "value": "1", "tags": ["x"]}, {"op": "add_tag", "key": "a", "tag": "y"},
+#  {"op": "remove_tag", "key": "a", "tag": "x"}, {"op": "delete", "key": "b"}]
+# - set 与单条添加相同：键不存在时创建（可带标签），已存在时只更新值
+# - add_tag / remove_tag / delete 与对应的单条接口相同
+from typing import Callable, List, Optional, Tuple
+
+OPERATIONS = ('set', 'delete', 'add_tag', 'remove_tag')
+
+
+class BatchError(ValueError):
+    """批量操作格式错误，index 为出错操作的位置（从 0 开始）"""
+
+    def __init__(self, message: str, index: Optional[int] = None):
+        super().__init__(message if index is None else f"第 {index + 1} 个操作: {message}")
+        self.index = index
+
+
+def parse_operations(operations: list, max_operations: int, valid_key: Callable[[str], bool],
+                     valid_value: Callable[[str], bool]) -> List[dict]:
+    """校验整个操作列表并返回规范化后的操作，任何一个不合法时抛出 BatchError"""
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("操作列表不能为空")
+    if len(operations) > max_operations:
+        raise BatchError(f"单次最多 {max_operations} 个操作")
+    parsed = []
+    for i, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise BatchError(f"操作类型必须是 {', '.join(OPERATIONS)} 之一", i)
+        op, key = operation['op'], operation.get('key')
+        if not isinstance(key, str) or not valid_key(key.strip()):
+            raise BatchError("键名不合法", i)
+        item = {'op': op, 'key': key.strip()}
+        if op == 'set':
+            value, tags = operation.get('value'), operation.get('tags', [])
+            if not isinstance(value, str) or not valid_value(value.strip()):
+                raise BatchError("值不合法", i)
+            if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                raise BatchError("标签必须是字符串列表", i)
+            item['value'] = value.strip()
+            item['tags'] = sorted({tag.strip() for tag in tags if tag.strip()})
+        elif op in ('add_tag', 'remove_tag'):
+            tag = operation.get('tag')
+            if not isinstance(tag, str) or not tag.strip():
+                raise BatchError("标签不能为空", i)
+            item['tag'] = tag.strip()
+        parsed.append(item)
+    return parsed
+
+
+def apply_operation(current: Optional[dict], operation: dict, now: str) -> Tuple[dict, Optional[dict]]:
+    """对条目当前状态（不存在时为 None）执行一个操作，返回 (操作结果, 新状态)"""
+    op = operation['op']
+    if op == 'set':
+        if current is not None:
+            return {'success': True, 'created': False}, dict(current, value=operation['value'], updated_at=now)
+        entry = {'value': operation['value'], 'created_at': now, 'updated_at': now, 'tags': operation['tags']}
+        return {'success': True, 'created': True}, entry
+    if current is None:
+        return {'success': False, 'error': '字符串不存在'}, None
+    if op == 'delete':
+        return {'success': True}, None
+    tags = current.get('tags', [])
+    if op == 'add_tag':
+        if operation['tag'] in tags:
+            return {'success': False, 'error': '标签已存在'}, current
+        return {'success': True}, dict(current, tags=sorted(tags + [operation['tag']]), updated_at=now)
+    if operation['tag'] not in tags:
+        return {'success': False, 'error': '标签不存在'}, current
+    return {'success': True}, dict(current, tags=[t for t in tags if t != operation['tag']], updated_at=now)
@@ -0,0 +1,111 @@
+# 进程内的变更日志：每次修改按递增序号记录变化的键，供 /api/events 推送给订阅者
+# - 最近的若干条保存在环形缓冲区中，断线重连时按 Last-Event-ID 补发
+# - 每个订阅者有有限长度的待发队列，跟不上的订阅者被断开，由客户端带 Last-Event-ID 重连
+# - 序号只在进程内有效，事件 ID 带上进程标识，进程重启或缺失的事件已被覆盖时发送 reset，由客户端整体刷新
+import os
+import threading
+from collections import deque
+from typing import Iterable, List, Optional, Set, Tuple
+
+# 事件类型：条目被写入、条目被删除、无法给出增量（需要整体刷新）
+PUT, DELETE, RESET = 'put', 'delete', 'reset'
+
+
+class Subscription:
+    """一个订阅者的待发事件队列"""
+
+    def __init__(self, feed: 'ChangeFeed', size: int):
+        self._feed = feed
+        self._size = size
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        # 队列溢出后不再接收事件，已在队列中的事件发完后结束
+        self.dropped = False
+
+    def _offer(self, events: List[dict]) -> bool:
+        """加入事件，队列放不下时标记为已断开并返回 False"""
+        with self._cond:
+            if len(self._queue) + len(events) > self._size:
+                self.dropped = True
+                self._cond.notify_all()
+                return False
+            self._queue.extend(events)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout: float) -> List[dict]:
+        """取出所有待发事件，没有事件时最多等待 timeout 秒，超时返回空列表"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self.dropped, timeout)
+            events = list(self._queue)
+            self._queue.clear()
+            return events
+
+    def close(self) -> None:
+        """取消订阅"""
+        self._feed._unsubscribe(self)
+
+
+class ChangeFeed:
+    """变更日志：capacity 为保留的事件数，buffer_size 为每个订阅者待发队列的长度"""
+
+    def __init__(self, capacity: int, buffer_size: int):
+        # 进程标识：区分不同进程（或重启前后）的序号
+        self.epoch = os.urandom(4).hex()
+        self._events: deque = deque(maxlen=capacity)
+        self._buffer_size = buffer_size
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._dropped = 0
+
+    def publish(self, changes: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """记录一批 (事件类型, 键) 并推送给所有订阅者"""
+        with self._lock:
+            events = []
+            for op, key in changes:
+                self._seq += 1
+                events.append({'seq': self._seq, 'op': op, 'key': key})
+            if not events:
+                return
+            self._events.extend(events)
+            for subscriber in list(self._subscribers):
+                if not subscriber._offer(events):
+                    self._subscribers.discard(subscriber)
+                    self._dropped += 1
+
+    def reset(self) -> None:
+        """数据整体变化（如加载了其他进程的快照），订阅者需要整体刷新"""
+        self.publish([(RESET, None)])
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[Subscription, List[dict]]:
+        """
+        订阅此后的事件，返回 (订阅, 需要先补发的事件)
+        last_event_id 为客户端收到的最后一个事件 ID；无法补发缺失的事件时补发一个 reset
+        """
+        subscription = Subscription(self, self._buffer_size)
+        with self._lock:
+            backlog = [] if last_event_id is None else self._backlog(last_event_id)
+            self._subscribers.add(subscription)
+        return subscription, backlog
+
+    def _backlog(self, last_event_id: str) -> List[dict]:
+        """last_event_id 之后的事件，调用方需持有锁"""
+        epoch, _, seq = last_event_id.partition('-')
+        oldest = self._events[0]['seq'] if self._events else self._seq + 1
+        if epoch != self.epoch or not seq.isdigit() or not oldest - 1 <= int(seq) <= self._seq:
+            return [{'seq': self._seq, 'op': RESET, 'key': None}]
+        return [event for event in self._events if event['seq'] > int(seq)]
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        """当前序号、保留的事件数、订阅者数与因跟不上而断开的订阅者数"""
+        with self._lock:
+            return {'seq': self._seq, 'buffered': len(self._events), 'subscribers': len(self._subscribers),
+                    'dropped': self._dropped}
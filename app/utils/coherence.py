@@ -0,0 +1,120 @@
+# 多进程部署时的进程间协调：文件锁与共享代数计数器
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 flock，只保证单进程内的一致性
+    fcntl = None
+
+
+def file_inode(path: str) -> Optional[int]:
+    """文件的 inode，用于判断文件是否已被其他进程替换，不存在时为 None"""
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class ProcessLock:
+    """基于 flock 的进程间读写锁，同一进程内的线程由可重入锁互斥"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._depth = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        """共享锁：读取磁盘文件期间防止其他进程替换它们"""
+        self._acquire(exclusive=False)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def exclusive(self):
+        """排他锁：写入磁盘文件"""
+        self._acquire(exclusive=True)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, exclusive: bool) -> None:
+        self._thread_lock.acquire()
+        if self._depth == 0 or (exclusive and not self._exclusive):
+            # 嵌套在共享锁中申请排他锁时就地升级，直到最外层释放
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._exclusive = exclusive
+        self._depth += 1
+
+    def _release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._exclusive = False
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+class FileMutex:
+    """非阻塞的进程间互斥标记，可以在获取它的线程之外释放"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._guard = threading.Lock()
+        self._held = False
+
+    def acquire_nowait(self) -> bool:
+        """尝试获取，已被本进程或其他进程持有时返回 False"""
+        with self._guard:
+            if self._held:
+                return False
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            self._held = True
+            return True
+
+    def release(self) -> None:
+        """释放"""
+        with self._guard:
+            if self._held and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._held = False
+
+
+class GenerationCounter:
+    """映射到内存的共享计数器：每次落盘加一，读取不需要系统调用"""
+
+    def __init__(self, path: str):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.write(fd, b'\0' * 8)
+            self._map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def read(self) -> int:
+        """当前代数"""
+        return struct.unpack_from('<Q', self._map, 0)[0]
+
+    def advance(self, count: int = 1) -> int:
+        """代数加 count 并返回新值，调用方需持有排他锁"""
+        value = self.read() + count
+        struct.pack_into('<Q', self._map, 0, value)
+        return value
@@ -0,0 +1,45 @@
+# 值的透明压缩（标准库 zlib / lzma）
+import lzma
+import zlib
+from typing import Optional, Tuple
+
+RAW = 0
+ZLIB = 1
+LZMA = 2
+CODECS = {'zlib': ZLIB, 'lzma': LZMA}
+
+
+def decompress(codec: int, data: bytes) -> bytes:
+    """按编码解压"""
+    if codec == ZLIB:
+        return zlib.decompress(data)
+    if codec == LZMA:
+        return lzma.decompress(data)
+    return bytes(data)
+
+
+class Compressor:
+    """超过阈值的值才压缩，压缩后没有变小时保留原文"""
+
+    def __init__(self, codec: Optional[str], threshold: int, level: int):
+        if codec and codec not in CODECS:
+            raise ValueError(f"不支持的压缩算法: {codec}")
+        self.codec = CODECS[codec] if codec else RAW
+        self.threshold = threshold
+        self.level = level
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != RAW
+
+    def pack(self, raw: bytes) -> Tuple[int, bytes]:
+        """返回 (编码, 数据)"""
+        if self.codec == RAW or len(raw) < self.threshold:
+            return RAW, raw
+        if self.codec == ZLIB:
+            packed = zlib.compress(raw, self.level)
+        else:
+            packed = lzma.compress(raw, preset=self.level)
+        if len(packed) >= len(raw):
+            return RAW, raw
+        return self.codec, packed
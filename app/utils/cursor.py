@@ -0,0 +1,34 @@
+# 键集分页的不透明游标
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+
+# 游标中保存的字段：排序字段、排序方向、标签筛选、上一页最后一条的排序时间与键
+FIELDS = ('sort_by', 'sort_order', 'tag', 'value', 'key')
+
+
+def encode_cursor(sort_by: str, sort_order: str, tag: Optional[str], value: str, key: str) -> str:
+    """把分页位置编码为 URL 安全的字符串"""
+    raw = json.dumps([sort_by, sort_order, tag, value, key], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    """解码游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"游标格式错误: {cursor}") from e
+    if not isinstance(values, list) or len(values) != len(FIELDS):
+        raise ValueError(f"游标格式错误: {cursor}")
+    position = dict(zip(FIELDS, values))
+    if (position['sort_by'] not in ('updated_at', 'created_at') or position['sort_order'] not in ('asc', 'desc')
+            or not isinstance(position['value'], str) or not isinstance(position['key'], str)
+            or not (position['tag'] is None or isinstance(position['tag'], str))):
+        raise ValueError(f"游标格式错误: {cursor}")
+    # 排序时间必须是 ISO 格式（不是时抛出 ValueError）
+    datetime.fromisoformat(position['value'])
+    return position
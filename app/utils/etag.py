@@ -0,0 +1,38 @@
+# 条件请求：条目的 ETag 取自修改时间，集合的 ETag 取自存储的数据版本与请求参数
+import hashlib
+from typing import Callable, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+
+from app.utils.records import to_micros
+
+# 由调用方提供的 If-Match 判断：参数为条目当前的 ETag（不存在时为 None）
+Precondition = Callable[[Optional[str]], bool]
+
+
+class PreconditionFailed(Exception):
+    """If-Match 条件不满足，修改没有执行"""
+
+
+def entry_etag(entry: Optional[dict]) -> Optional[str]:
+    """条目的 ETag（每次修改都会更新 updated_at），条目不存在时为 None"""
+    if entry is None:
+        return None
+    return f"e{to_micros(entry['updated_at']):x}"
+
+
+def collection_etag(version: str, params: Iterable[Tuple[str, str]] = ()) -> str:
+    """
+    列表类响应的 ETag：同一数据版本下，不同的查询、分页与投影参数得到不同的响应，
+    因此附加按参数名排序后的请求参数的哈希（参数顺序不同的同一请求共享 ETag）
+    """
+    params = sorted(params)
+    if not params:
+        return f"v{version}"
+    digest = hashlib.sha256(urlencode(params).encode('utf-8')).hexdigest()[:16]
+    return f"v{version}-{digest}"
+
+
+def check_precondition(entry: Optional[dict], if_match: Optional[Precondition]) -> None:
+    """在写锁内检查 If-Match，不满足时抛出 PreconditionFailed"""
+    if if_match is not None and not if_match(entry_etag(entry)):
+        raise PreconditionFailed()
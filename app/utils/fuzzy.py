@@ -0,0 +1,106 @@
+# 键的近似匹配：编辑距离与两字组合计数过滤
+from typing import Dict, Iterable, List, Set, Tuple
+
+# 首尾填充字符，使首尾字符也出现在两字组合中
+PAD = '\x00'
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    最优字符串对齐距离（受限的 Damerau-Levenshtein）：相邻两字互换算一次编辑，这是键名最常见的输错方式
+    超过 limit 时提前结束并返回 limit + 1
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) - len(b) > limit:
+        return limit + 1
+    before: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            distance = min(previous[j - 1] + (char_a != char_b), current[j - 1] + 1, previous[j] + 1)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        # 互换只引用上一行的对角位置，每行的最小值不会减小，可以提前结束
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def key_grams(word: str) -> Set[str]:
+    """填充后的两字组合"""
+    padded = PAD + word + PAD
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class FuzzyKeyIndex:
+    """
+    找出编辑距离不超过 d 的键（不区分大小写）
+    每次编辑最多破坏三个两字组合（相邻互换时），因此距离不超过 d 的键至少与查询共有 len(组合) - 3d 个组合：
+    只从最少见的几个组合的倒排集合中取候选，按共有组合数与长度过滤后再计算有上限的编辑距离；
+    阈值不为正时（很短的查询）只检查长度相近的键
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self._words: Dict[str, Set[str]] = {}     # 小写键 -> 原始键
+        self._grams: Dict[str, Set[str]] = {}     # 两字组合 -> 小写键
+        self._lengths: Dict[int, Set[str]] = {}   # 长度 -> 小写键
+        for key in keys:
+            self.add(key)
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._words.values())
+
+    def add(self, key: str) -> None:
+        word = key.lower()
+        keys = self._words.get(word)
+        if keys is not None:
+            keys.add(key)
+            return
+        self._words[word] = {key}
+        for gram in key_grams(word):
+            self._grams.setdefault(gram, set()).add(word)
+        self._lengths.setdefault(len(word), set()).add(word)
+
+    def remove(self, key: str) -> None:
+        word = key.lower()
+        keys = self._words.get(word)
+        if keys is None:
+            return
+        keys.discard(key)
+        if keys:
+            return
+        del self._words[word]
+        for gram in key_grams(word):
+            words = self._grams[gram]
+            words.discard(word)
+            if not words:
+                del self._grams[gram]
+        words = self._lengths[len(word)]
+        words.discard(word)
+        if not words:
+            del self._lengths[len(word)]
+
+    def search(self, query: str, max_distance: int) -> List[Tuple[int, str]]:
+        """距离不超过 max_distance 的 (距离, 原始键)，按距离与键排序"""
+        word = query.lower()
+        grams = key_grams(word)
+        threshold = len(grams) - 3 * max_distance
+        if threshold > 0:
+            # 共有至少 threshold 个组合的键必然包含最少见的 len(组合) - threshold + 1 个组合之一
+            rarest = sorted(grams, key=lambda gram: len(self._grams.get(gram, ())))[:len(grams) - threshold + 1]
+            candidates = [w for w in set().union(*(self._grams.get(gram, ()) for gram in rarest))
+                          if abs(len(w) - len(word)) <= max_distance and len(grams & key_grams(w)) >= threshold]
+        else:
+            candidates = [w for length in range(len(word) - max_distance, len(word) + max_distance + 1)
+                          for w in self._lengths.get(length, ())]
+        results = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                results.extend((distance, key) for key in self._words[candidate])
+        results.sort()
+        return results
@@ -0,0 +1,139 @@
+# 追加写日志（write-ahead log）
+import json
+import logging
+import os
+import shutil
+from typing import Iterator, List, Optional, Tuple
+
+
+class Journal:
+    """追加写日志：每条修改以一行紧凑 JSON 记录追加到文件末尾"""
+
+    def __init__(self, path: str, max_bytes: int, max_records: int, fsync: bool = True):
+        self.path = path
+        self.rotated_path = path + '.compacting'
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.fsync = fsync
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.records = 0
+        self._file = None
+
+    @staticmethod
+    def encode(record: dict) -> bytes:
+        """把记录编码为一行紧凑 JSON"""
+        return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+    @staticmethod
+    def replay(path: str) -> Iterator[dict]:
+        """按顺序读取日志记录，跳过崩溃时写了一半的行"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logging.warning(f"跳过损坏的日志记录: {path}")
+
+    @staticmethod
+    def read_from(path: str, offset: int) -> Tuple[List[dict], int]:
+        """读取 offset 之后的完整记录，返回 (记录列表, 新的偏移量)"""
+        if not os.path.exists(path):
+            return [], offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        records = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                logging.warning(f"跳过损坏的日志记录: {path}")
+        return records, offset + end
+
+    def inode(self) -> Optional[int]:
+        """当前日志文件的 inode，文件不存在时为 None"""
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def append(self, records: List[dict]) -> None:
+        """追加一批记录，一次写入"""
+        if not records:
+            return
+        payload = b''.join(self.encode(r) for r in records)
+        if self._file is not None and self.inode() != os.fstat(self._file.fileno()).st_ino:
+            # 其他进程压缩时已替换日志文件
+            self.close()
+        if self._file is None:
+            self._file = open(self.path, 'a+b')
+        # 调用方持有排他锁，此时末尾不完整的行只可能是崩溃时写了一半的记录，
+        # 必须先截掉，否则新记录会接在它后面，回放时被整行当作损坏记录跳过
+        self.drop_torn_tail(self._file)
+        self._file.write(payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        # 追加模式下缓冲文件对象的 tell() 不感知其他进程的写入，以实际文件大小为准
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.records += len(records)
+
+    @staticmethod
+    def drop_torn_tail(f) -> None:
+        """把以读写追加模式打开的文件截断到最后一个换行符之后，丢弃没有写完的最后一行"""
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        end = size
+        while end > 0:
+            start = max(0, end - 64 * 1024)
+            f.seek(start)
+            chunk = f.read(end - start)
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            logging.warning(f"截掉日志末尾写了一半的记录（{size - end} 字节）")
+            f.truncate(end)
+
+    def needs_compaction(self) -> bool:
+        """日志是否超过压缩阈值"""
+        return self.size >= self.max_bytes or self.records >= self.max_records
+
+    def rotate(self) -> None:
+        """把当前日志移交给压缩流程，之后的写入进入新日志"""
+        self.close()
+        if os.path.exists(self.rotated_path):
+            # 上一次压缩未完成：把当前日志接在其后，避免覆盖尚未并入快照的记录
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as src, open(self.rotated_path, 'a+b') as dst:
+                    self.drop_torn_tail(dst)
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.path)
+        elif os.path.exists(self.path):
+            os.replace(self.path, self.rotated_path)
+        self.size = 0
+        self.records = 0
+
+    def discard_rotated(self) -> None:
+        """快照写入完成后删除已并入的旧日志"""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self) -> None:
+        """关闭日志文件句柄"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,40 @@
+# 导出与导入使用的 NDJSON 格式：每行一个条目 {"key", "value", "created_at", "updated_at", "tags"}
+import json
+from datetime import datetime
+from typing import Union
+
+from app.utils.records import from_micros, to_micros
+
+# 导入时键已存在的处理方式：保留现有条目、用导入的条目覆盖、保留 updated_at 较新的一方
+POLICIES = ('skip', 'overwrite', 'newest')
+
+
+def dump_entry(item: dict) -> str:
+    """条目序列化为一行"""
+    return json.dumps({'key': item['key'], 'value': item['value'], 'created_at': item['created_at'],
+                       'updated_at': item['updated_at'], 'tags': item.get('tags', [])},
+                      ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def parse_entry(line: Union[str, bytes]) -> dict:
+    """解析一行为规范化的条目，格式不正确时抛出 ValueError；时间统一为本地时间，缺少时取当前时间"""
+    try:
+        item = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("不是有效的 JSON")
+    if not isinstance(item, dict):
+        raise ValueError("每行必须是一个 JSON 对象")
+    key, value, tags = item.get('key'), item.get('value'), item.get('tags', [])
+    if not isinstance(key, str) or not isinstance(value, str):
+        raise ValueError("缺少键名或值")
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("标签必须是字符串列表")
+    now = datetime.now().isoformat()
+    moments = []
+    for moment in (item.get('created_at', now), item.get('updated_at', now)):
+        try:
+            moments.append(from_micros(to_micros(moment)))
+        except (TypeError, ValueError):
+            raise ValueError(f"时间格式错误: {moment}")
+    return {'key': key, 'value': value, 'created_at': moments[0], 'updated_at': moments[1],
+            'tags': sorted({tag.strip() for tag in tags if tag.strip()})}
@@ -0,0 +1,155 @@
+# 子串搜索的 n-gram 倒排索引：按字符切分，中文等不以空格分词的文本同样适用
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 倒排表中文档号的类型：无符号 32 位整数
+DOC_ID = 'I'
+
+
+def text_grams(texts: Iterable[str]) -> Set[str]:
+    """各段文本小写后的单字与相邻两字（不跨越文本边界）"""
+    grams: Set[str] = set()
+    for text in texts:
+        text = text.lower()
+        grams.update(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def query_grams(query: str) -> Set[str]:
+    """查询串（已小写）需要同时命中的 n-gram"""
+    if len(query) == 1:
+        return {query}
+    return {query[i:i + 2] for i in range(len(query) - 1)}
+
+
+def _contains(ids: array, doc: int) -> bool:
+    """有序数组中是否有该文档号"""
+    i = bisect_left(ids, doc)
+    return i < len(ids) and ids[i] == doc
+
+
+class NgramIndex:
+    """
+    n-gram -> 文档号的有序数组
+    包含查询串的文本必然包含查询串的全部单字/两字组合，因此各 n-gram 倒排表的交集
+    是结果的超集（候选），调用方仍需逐条验证子串是否真的出现
+    - 键映射为整数文档号，倒排表是紧凑的整数数组（每个文档 4 字节），删除后空出的文档号由新键复用
+    - 调用方可以不收录某些条目的值（如过长的值），这些条目不完整，总是作为候选返回
+    """
+
+    def __init__(self, value_limit: int = 0):
+        # 构建时采用的值大小上限，配置变化后暖启动快照中的索引不再适用
+        self.value_limit = value_limit
+        self._postings: Dict[str, array] = {}
+        self._ids: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = []
+        self._free: List[int] = []
+        # 值没有收录进索引的键
+        self._incomplete: Set[str] = set()
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, List[str], bool]], value_limit: int = 0) -> 'NgramIndex':
+        """由 (键, 收录的文本列表, 是否完整) 构建；文档号按顺序分配，直接追加即保持有序"""
+        index = cls(value_limit)
+        postings = index._postings
+        for key, texts, complete in items:
+            doc = len(index._keys)
+            index._keys.append(key)
+            index._ids[key] = doc
+            if not complete:
+                index._incomplete.add(key)
+            for gram in text_grams(texts):
+                ids = postings.get(gram)
+                if ids is None:
+                    postings[gram] = array(DOC_ID, (doc,))
+                else:
+                    ids.append(doc)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def copy(self) -> 'NgramIndex':
+        """独立的副本（压缩时随快照写出，之后的修改不影响副本）"""
+        index = NgramIndex(self.value_limit)
+        index._postings = {gram: ids[:] for gram, ids in self._postings.items()}
+        index._ids = dict(self._ids)
+        index._keys = list(self._keys)
+        index._free = list(self._free)
+        index._incomplete = set(self._incomplete)
+        return index
+
+    def update(self, key: str, old_texts: Optional[List[str]], new_texts: Optional[List[str]],
+               complete: bool = True) -> None:
+        """条目文本变化时只调整增减的 n-gram；old_texts 为 None 表示新增，new_texts 为 None 表示删除"""
+        old_grams = text_grams(old_texts) if old_texts is not None else set()
+        new_grams = text_grams(new_texts) if new_texts is not None else set()
+        doc = self._ids.get(key)
+        if doc is None:
+            if new_texts is None:
+                return
+            doc = self._free.pop() if self._free else len(self._keys)
+            if doc == len(self._keys):
+                self._keys.append(key)
+            else:
+                self._keys[doc] = key
+            self._ids[key] = doc
+        for gram in old_grams - new_grams:
+            ids = self._postings.get(gram)
+            if ids is None:
+                continue
+            i = bisect_left(ids, doc)
+            if i < len(ids) and ids[i] == doc:
+                del ids[i]
+                if not ids:
+                    del self._postings[gram]
+        for gram in new_grams - old_grams:
+            ids = self._postings.get(gram)
+            if ids is None:
+                self._postings[gram] = array(DOC_ID, (doc,))
+                continue
+            i = bisect_left(ids, doc)
+            if i == len(ids) or ids[i] != doc:
+                ids.insert(i, doc)
+        if new_texts is None:
+            del self._ids[key]
+            self._keys[doc] = None
+            self._free.append(doc)
+            self._incomplete.discard(key)
+        elif complete:
+            self._incomplete.discard(key)
+        else:
+            self._incomplete.add(key)
+
+    def estimate(self, query: str) -> Optional[int]:
+        """候选数的上限（最小的倒排表长度加上不完整的条目数），空查询返回 None"""
+        if not query:
+            return None
+        return min(len(self._postings.get(gram, ())) for gram in query_grams(query)) + len(self._incomplete)
+
+    def candidates(self, query: str) -> Optional[Set[str]]:
+        """可能包含查询串（已小写）的键；空查询返回 None 表示全部条目"""
+        if not query:
+            return None
+        result = set(self._incomplete)
+        postings = []
+        for gram in query_grams(query):
+            ids = self._postings.get(gram)
+            if not ids:
+                return result
+            postings.append(ids)
+        # 从最短的倒排表开始求交，候选远少于倒排表长度时改为二分查找，交集为空时提前结束
+        postings.sort(key=len)
+        docs = set(postings[0])
+        for ids in postings[1:]:
+            if len(docs) * 16 < len(ids):
+                docs = {doc for doc in docs if _contains(ids, doc)}
+            else:
+                docs.intersection_update(ids)
+            if not docs:
+                break
+        keys = self._keys
+        result.update(keys[doc] for doc in docs)
+        return result
@@ -0,0 +1,46 @@
+# 列表响应的字段投影：只返回请求的字段，值可以换成截断的预览，完整的值由 /api/string/<key> 按需获取
+# fields=key,preview,value_length,value_hash,tags&preview_len=80
+import hashlib
+from typing import Optional, Tuple
+
+# 条目本身的字段
+ENTRY_FIELDS = ('key', 'value', 'created_at', 'updated_at', 'tags')
+# 由值计算出的字段：截断的预览、值的字符数、值的 SHA-256（前 16 位十六进制）
+DERIVED_FIELDS = ('preview', 'value_length', 'value_hash')
+FIELDS = ENTRY_FIELDS + DERIVED_FIELDS
+# 只指定 preview_len 时返回的字段：除值以外的全部字段
+PREVIEW_FIELDS = ('key', 'preview', 'value_length', 'value_hash', 'created_at', 'updated_at', 'tags')
+
+
+def parse_fields(text: str, preview_len: Optional[int]) -> Optional[Tuple[str, ...]]:
+    """
+    解析逗号分隔的字段列表，包含未知字段时抛出 ValueError
+    没有指定字段时：指定了 preview_len 返回 PREVIEW_FIELDS，否则返回 None（不投影，保持完整条目）
+    """
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    if not names:
+        return PREVIEW_FIELDS if preview_len is not None else None
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}，可选 {', '.join(FIELDS)}")
+    return tuple(dict.fromkeys(names))
+
+
+def value_hash(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+
+def project(item: dict, fields: Tuple[str, ...], preview_len: int) -> dict:
+    """返回只含 fields 的新字典（条目可能来自结果缓存，不能原地修改）"""
+    value = item['value']
+    projected = {}
+    for field in fields:
+        if field == 'preview':
+            projected['preview'] = value[:preview_len]
+        elif field == 'value_length':
+            projected['value_length'] = len(value)
+        elif field == 'value_hash':
+            projected['value_hash'] = value_hash(value)
+        elif field in item:
+            projected[field] = item[field]
+    return projected
@@ -0,0 +1,199 @@
+# 组合查询的语法解析：自由文本、标签布尔表达式与时间范围
+#     hello tag:a AND (tag:b OR NOT tag:c) created:>=2024-01-01 updated:2024-05-01..2024-05-31
+# - 相邻的条件默认为 AND，关键字 AND / OR / NOT 需大写，括号用于分组
+# - tag:名称 精确匹配标签，名称含空格时用引号：tag:"two words"
+# - created: / updated: 后接 >=、>、<=、< 加时间，或 起..止（两端都包含），或单个时间；只写日期时按整天计算
+# - 其他词语或引号中的短语在键、值和标签中做不区分大小写的子串匹配
+# 不含任何上述语法的输入整体作为一个子串匹配，与普通搜索一致
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from app.utils.records import to_micros
+
+DAY = timedelta(days=1)
+MICROSECOND = timedelta(microseconds=1)
+TOKEN = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<field>\w+):"(?P<fvalue>[^"]*)"|"(?P<phrase>[^"]*)"|(?P<word>[^\s()"]+))')
+SYNTAX = re.compile(r'[()"]|(?:^|\s)(?:AND|OR|NOT)(?:\s|$)|(?:^|[\s(])(?:tag|created|updated):')
+FIELDS = {'tag', 'created', 'updated'}
+
+
+class QueryError(ValueError):
+    """查询语法错误"""
+
+
+class Text:
+    """在键、值和标签中做子串匹配（已小写）"""
+
+    def __init__(self, text: str):
+        self.text = text.lower()
+
+
+class Tag:
+    """带有指定标签"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class TimeRange:
+    """创建或修改时间（微秒）位于 [start, end) 内，None 表示不限"""
+
+    def __init__(self, field: str, start: Optional[int], end: Optional[int]):
+        self.field = field
+        self.start = start
+        self.end = end
+
+
+class And:
+    """全部子条件都成立"""
+
+    def __init__(self, items: list):
+        self.items = items
+
+
+class Or:
+    """任一子条件成立"""
+
+    def __init__(self, items: list):
+        self.items = items
+
+
+class Not:
+    """子条件不成立"""
+
+    def __init__(self, item):
+        self.item = item
+
+
+def parse_query(query: str):
+    """解析查询串，返回语法树；空查询返回 None"""
+    query = query.strip()
+    if not query:
+        return None
+    if not SYNTAX.search(query):
+        return Text(query)
+    parser = _Parser(_tokenize(query))
+    node = parser.parse_or()
+    if parser.peek() is not None:
+        raise QueryError(f"查询语法错误: 多余的 {parser.peek()[1]}")
+    return node
+
+
+def text_terms(node) -> List[str]:
+    """不在 NOT 之下的文本条件，用于相关度排序"""
+    if isinstance(node, Text):
+        return [node.text]
+    if isinstance(node, (And, Or)):
+        return [text for item in node.items for text in text_terms(item)]
+    return []
+
+
+def _tokenize(query: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            if query[position:].strip():
+                raise QueryError(f"查询语法错误: 位置 {position} 处的引号未闭合")
+            break
+        position = match.end()
+        if match.group('open'):
+            tokens.append(('(', '('))
+        elif match.group('close'):
+            tokens.append((')', ')'))
+        elif match.group('field') is not None:
+            tokens.append(('field', f"{match.group('field')}:{match.group('fvalue')}"))
+        elif match.group('phrase') is not None:
+            tokens.append(('text', match.group('phrase')))
+        else:
+            word = match.group('word')
+            if word in ('AND', 'OR', 'NOT'):
+                tokens.append((word, word))
+            elif ':' in word and word.split(':', 1)[0] in FIELDS:
+                tokens.append(('field', word))
+            else:
+                tokens.append(('text', word))
+    return tokens
+
+
+class _Parser:
+    """递归下降：or := and (OR and)*；and := unary ([AND] unary)*；unary := NOT unary | ( or ) | 条件"""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise QueryError("查询语法错误: 表达式不完整")
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        items = [self.parse_and()]
+        while self.peek() is not None and self.peek()[0] == 'OR':
+            self.take()
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else Or(items)
+
+    def parse_and(self):
+        items = [self.parse_unary()]
+        while self.peek() is not None and self.peek()[0] not in ('OR', ')'):
+            if self.peek()[0] == 'AND':
+                self.take()
+            items.append(self.parse_unary())
+        return items[0] if len(items) == 1 else And(items)
+
+    def parse_unary(self):
+        kind, value = self.take()
+        if kind == 'NOT':
+            return Not(self.parse_unary())
+        if kind == '(':
+            node = self.parse_or()
+            if self.take()[0] != ')':
+                raise QueryError("查询语法错误: 缺少右括号")
+            return node
+        if kind == 'field':
+            return _parse_field(value)
+        if kind == 'text':
+            return Text(value)
+        raise QueryError(f"查询语法错误: 意外的 {value}")
+
+
+def _parse_field(token: str):
+    field, value = token.split(':', 1)
+    if not value:
+        raise QueryError(f"查询语法错误: {field}: 后缺少内容")
+    if field == 'tag':
+        return Tag(value)
+    if '..' in value:
+        low, high = value.split('..', 1)
+        return TimeRange(field, _bound(low, False) if low else None, _bound(high, True) if high else None)
+    for operator in ('>=', '<=', '>', '<'):
+        if value.startswith(operator):
+            moment = value[len(operator):]
+            if operator == '>=':
+                return TimeRange(field, _bound(moment, False), None)
+            if operator == '>':
+                return TimeRange(field, _bound(moment, True), None)
+            if operator == '<=':
+                return TimeRange(field, None, _bound(moment, True))
+            return TimeRange(field, None, _bound(moment, False))
+    return TimeRange(field, _bound(value, False), _bound(value, True))
+
+
+def _bound(value: str, after: bool) -> int:
+    """时间的下界（after 为 False）或紧随其后的位置；只有日期时以整天为单位"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"查询语法错误: 无法识别的时间 {value}")
+    if after:
+        moment += DAY if len(value) <= 10 else MICROSECOND
+    return to_micros(moment.isoformat())
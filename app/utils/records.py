@@ -0,0 +1,306 @@
+# 条目的紧凑内存表示与记录文件：元数据常驻内存，值存放在内存映射的数据区中按需读取
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Tuple, Union
+
+from app.utils.compression import RAW, Compressor, decompress
+
+MAGIC = b'SVREC2\n'
+MAGIC_V1 = b'SVREC1\n'
+FOOTER = struct.Struct('<Q')
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# 旧版本或手工编辑的数据文件中可能出现的非 ISO 时间格式
+LEGACY_TIME_FORMATS = ('%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y/%m/%d', '%Y%m%d_%H%M%S', '%Y%m%d')
+
+# 相同的标签组合在所有条目间共享同一个元组
+_tag_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+class RecordFileError(Exception):
+    """记录文件格式错误"""
+
+
+def to_micros(timestamp: str) -> int:
+    """ISO 时间字符串转为微秒整数（本地时间，与 datetime.now() 一致）"""
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return (moment - EPOCH) // MICROSECOND
+
+
+def parse_micros(timestamp) -> int:
+    """
+    宽松地解析数据文件中的时间：ISO 字符串、LEGACY_TIME_FORMATS 中的格式或 Unix 时间戳（秒）
+    都无法解析时（如模板中的占位文字）取当前时间并记录警告，不让单个条目导致整个数据文件无法加载
+    """
+    if isinstance(timestamp, str):
+        try:
+            return to_micros(timestamp)
+        except ValueError:
+            pass
+        for fmt in LEGACY_TIME_FORMATS:
+            try:
+                return (datetime.strptime(timestamp.strip(), fmt) - EPOCH) // MICROSECOND
+            except ValueError:
+                continue
+    elif isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        try:
+            return to_micros(datetime.fromtimestamp(timestamp).isoformat())
+        except (OverflowError, OSError, ValueError):
+            pass
+    logging.warning(f"无法解析的时间 {timestamp!r}，以当前时间代替")
+    return to_micros(datetime.now().isoformat())
+
+
+def from_micros(micros: int) -> str:
+    """微秒整数转回 ISO 时间字符串"""
+    return (EPOCH + micros * MICROSECOND).isoformat()
+
+
+def intern_tags(tags: Iterable[str]) -> Tuple[str, ...]:
+    """返回驻留的标签元组"""
+    key = tuple(tags)
+    shared = _tag_tuples.get(key)
+    if shared is not None:
+        return shared
+    key = tuple(sys.intern(tag) for tag in key)
+    return _tag_tuples.setdefault(key, key)
+
+
+class ValueRef:
+    """指向数据区中某个值的引用，读取时才解压和解码"""
+
+    __slots__ = ('_map', 'offset', 'length', 'codec', 'size')
+
+    def __init__(self, data_map: mmap.mmap, offset: int, length: int, codec: int = RAW, size: int = None):
+        self._map = data_map
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+        self.size = length if size is None else size
+
+    def stored(self) -> Tuple[int, bytes]:
+        """存储的 (编码, 数据)"""
+        return self.codec, self._map[self.offset:self.offset + self.length]
+
+    def raw(self) -> bytes:
+        """值的 UTF-8 字节"""
+        return decompress(*self.stored())
+
+    def read(self) -> str:
+        """值的字符串"""
+        return self.raw().decode('utf-8')
+
+
+class PackedValue:
+    """在内存中压缩保存的值"""
+
+    __slots__ = ('codec', 'data', 'size')
+
+    def __init__(self, codec: int, data: bytes, size: int):
+        self.codec = codec
+        self.data = data
+        self.size = size
+
+    def stored(self) -> Tuple[int, bytes]:
+        """存储的 (编码, 数据)"""
+        return self.codec, self.data
+
+    def raw(self) -> bytes:
+        """值的 UTF-8 字节"""
+        return decompress(self.codec, self.data)
+
+    def read(self) -> str:
+        """值的字符串"""
+        return self.raw().decode('utf-8')
+
+
+def pack_value(value: str, compressor: Compressor) -> Union[str, PackedValue]:
+    """按压缩配置把常驻内存的值压缩保存，不值得压缩时原样返回"""
+    raw = value.encode('utf-8')
+    codec, data = compressor.pack(raw)
+    return value if codec == RAW else PackedValue(codec, data, len(raw))
+
+
+class Record:
+    """内存中的条目：时间为微秒整数，标签为驻留元组，值可以是字符串、压缩值或数据区引用"""
+
+    __slots__ = ('value', 'created', 'updated', 'tags')
+
+    def __init__(self, value: Union[str, PackedValue, ValueRef], created: int, updated: int, tags: Tuple[str, ...]):
+        self.value = value
+        self.created = created
+        self.updated = updated
+        self.tags = tags
+
+    @classmethod
+    def from_entry(cls, entry: dict) -> 'Record':
+        """由条目字典构造，时间按 parse_micros 宽松解析"""
+        return cls(entry['value'], parse_micros(entry.get('created_at')), parse_micros(entry.get('updated_at')),
+                   intern_tags(entry.get('tags', [])))
+
+    @property
+    def created_at(self) -> str:
+        return from_micros(self.created)
+
+    @property
+    def updated_at(self) -> str:
+        return from_micros(self.updated)
+
+    def read_value(self) -> str:
+        """读取值，必要时从数据区加载或解压"""
+        return self.value if isinstance(self.value, str) else self.value.read()
+
+    def value_size(self) -> int:
+        """值的 UTF-8 字节数，不从数据区加载"""
+        return len(self.value.encode('utf-8')) if isinstance(self.value, str) else self.value.size
+
+    def stored_value(self, compressor: Compressor) -> Tuple[int, bytes, int]:
+        """写入记录文件的 (编码, 数据, 原始字节数)，已压缩的值直接沿用"""
+        if isinstance(self.value, str):
+            raw = self.value.encode('utf-8')
+            return compressor.pack(raw) + (len(raw),)
+        return self.value.stored() + (self.value.size,)
+
+    def to_entry(self) -> dict:
+        """构造供接口和模板使用的条目字典"""
+        return {
+            'value': self.read_value(),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'tags': list(self.tags)
+        }
+
+
+class RecordFile:
+    """
+    文件布局：MAGIC | 各条目值的 UTF-8 字节（可能经过压缩） | 索引 JSON | 索引起始偏移（8 字节）
+    索引为 {key: [created, updated, tags, offset, length(, codec, size)]}（时间为微秒整数，
+    压缩的值附带编码与原始字节数），加载时只读取索引，
+    值所在的数据区通过 mmap 映射，只有被访问的页面才会读入内存
+    """
+
+    @staticmethod
+    def write(path: str, data: Dict[str, Record], compressor: Compressor) -> Dict[str, list]:
+        """流式写出全部条目并 fsync，数据区中的值直接复制存储的字节，返回写入的索引"""
+        index = {}
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            offset = len(MAGIC)
+            for key, record in data.items():
+                codec, stored, size = record.stored_value(compressor)
+                f.write(stored)
+                item = [record.created, record.updated, record.tags, offset, len(stored)]
+                if codec != RAW:
+                    item += [codec, size]
+                index[key] = item
+                offset += len(stored)
+            f.write(json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            f.write(FOOTER.pack(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        return index
+
+    @staticmethod
+    def load(path: str) -> Dict[str, Record]:
+        """加载索引，条目的值为指向数据区的 ValueRef"""
+        data_map, magic, index_start = RecordFile._open(path)
+        try:
+            index = json.loads(data_map[index_start:len(data_map) - FOOTER.size])
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise RecordFileError(f"记录文件索引损坏: {path}") from e
+        # 第一版索引中的时间为 ISO 字符串
+        return RecordFile._build(data_map, index, parse_micros if magic == MAGIC_V1 else int)
+
+    @staticmethod
+    def load_with_index(path: str, index: Dict[str, list]) -> Dict[str, Record]:
+        """使用已解析的索引（如暖启动快照中保存的）映射数据区"""
+        data_map, magic, index_start = RecordFile._open(path)
+        return RecordFile._build(data_map, index, int)
+
+    @staticmethod
+    def index_offset(path: str) -> int:
+        """索引在文件中的起始偏移"""
+        with open(path, 'rb') as f:
+            f.seek(-FOOTER.size, os.SEEK_END)
+            return FOOTER.unpack(f.read(FOOTER.size))[0]
+
+    @staticmethod
+    def _open(path: str) -> Tuple[mmap.mmap, bytes, int]:
+        """映射文件并校验格式，返回 (映射, MAGIC, 索引起始偏移)"""
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(MAGIC) + FOOTER.size:
+                raise RecordFileError(f"记录文件过短: {path}")
+            data_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = data_map[:len(MAGIC)]
+        if magic not in (MAGIC, MAGIC_V1):
+            raise RecordFileError(f"记录文件标识错误: {path}")
+        index_start = FOOTER.unpack(data_map[size - FOOTER.size:])[0]
+        if not len(MAGIC) <= index_start <= size - FOOTER.size:
+            raise RecordFileError(f"记录文件索引偏移错误: {path}")
+        return data_map, magic, index_start
+
+    @staticmethod
+    def _build(data_map: mmap.mmap, index: Dict[str, list], convert) -> Dict[str, Record]:
+        return {
+            key: Record(ValueRef(data_map, *item[3:]), convert(item[0]), convert(item[1]),
+                        intern_tags(item[2]))
+            for key, item in index.items()
+        }
+
+
+def memory_usage(data: Dict[str, Record]) -> dict:
+    """估算当前条目占用的内存，并与每个条目一个字典（ISO 时间字符串、标签列表）的布局比较"""
+    entry_dict_size = sys.getsizeof({'value': '', 'created_at': '', 'updated_at': '', 'tags': []})
+    iso_size = sys.getsizeof(datetime.now().isoformat())
+    empty_str_size = sys.getsizeof('')
+    compact = dict_layout = sys.getsizeof(data)
+    shared = set()
+    for record in data.values():
+        compact += sys.getsizeof(record) + sys.getsizeof(record.value)
+        if id(record.tags) not in shared:
+            shared.add(id(record.tags))
+            compact += sys.getsizeof(record.tags)
+            for tag in record.tags:
+                if id(tag) not in shared:
+                    shared.add(id(tag))
+                    compact += sys.getsizeof(tag)
+        # 字典布局中值总是以字符串常驻内存；未常驻的值按原始 UTF-8 字节数估算
+        if isinstance(record.value, str):
+            value_size = sys.getsizeof(record.value)
+        else:
+            value_size = empty_str_size + record.value.size
+            if isinstance(record.value, PackedValue):
+                compact += sys.getsizeof(record.value.data)
+        dict_layout += (entry_dict_size + 2 * iso_size + value_size
+                        + sys.getsizeof(list(record.tags)) + sum(sys.getsizeof(tag) for tag in record.tags))
+    return {
+        'entries': len(data),
+        'compact_bytes': compact,
+        'dict_layout_bytes': dict_layout,
+        'saved_ratio': round(1 - compact / dict_layout, 3) if dict_layout else 0.0
+    }
+
+
+def compression_usage(data: Dict[str, Record]) -> dict:
+    """统计已压缩的值（内存中或记录文件中）的压缩率"""
+    count = raw_bytes = stored_bytes = 0
+    for record in data.values():
+        value = record.value
+        if not isinstance(value, str) and value.codec != RAW:
+            count += 1
+            raw_bytes += value.size
+            stored_bytes += len(value.data) if isinstance(value, PackedValue) else value.length
+    return {
+        'compressed_values': count,
+        'raw_bytes': raw_bytes,
+        'stored_bytes': stored_bytes,
+        'ratio': round(raw_bytes / stored_bytes, 2) if stored_bytes else None
+    }
@@ -0,0 +1,128 @@
+# 查询结果缓存：按方法与规范化后的参数缓存返回值，存储的修改代数变化后旧结果自动失效
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """结果占用内存的粗略估算（字节），递归计算容器内的字符串与数字"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class ResultCache:
+    """
+    有界的 LRU 缓存：条目数或估算内存超过上限时淘汰最久未使用的结果
+    每个结果记录计算时的存储代数，读取时代数不同即视为未命中并丢弃
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, Tuple[int, Any, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable, generation: int) -> Any:
+        """命中时返回结果，否则返回 MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return MISSING
+
+    def put(self, key: Hashable, generation: int, value: Any) -> None:
+        """保存结果，超过上限时从最久未使用的开始淘汰；单个结果超过内存上限时不缓存"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (generation, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """命中率与占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def _discard(self, key: Hashable) -> None:
+        self._bytes -= self._entries.pop(key)[2]
+
+
+def _freeze(value: Any) -> Hashable:
+    """把参数转换为可哈希的形式"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def lower_query(arguments: dict) -> None:
+    """普通搜索不区分大小写，查询串按小写作为缓存键"""
+    arguments['query'] = arguments['query'].lower()
+
+
+def strip_query(arguments: dict) -> None:
+    """组合查询中的关键字与标签区分大小写，只去掉首尾空白"""
+    if arguments.get('query') is not None:
+        arguments['query'] = arguments['query'].strip()
+
+
+def cached(normalize: Optional[Callable[[dict], None]] = None):
+    """
+    缓存存储方法的返回值，被装饰的对象需提供 _result_cache（为 None 时不缓存）与 _cache_generation()
+    参数按签名补齐默认值后作为键，normalize 可以就地改写参数字典（如把不区分大小写的查询转为小写）
+    缓存的结果由所有调用方共享，调用方不得修改
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        name = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = self._result_cache
+            if cache is None:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments['self']
+            if normalize is not None:
+                normalize(arguments)
+            key = (name,) + tuple(_freeze(v) for v in arguments.values())
+            # 先读代数再计算：计算期间发生的修改会使这次的结果在下次读取时失效
+            generation = self._cache_generation()
+            result = cache.get(key, generation)
+            if result is MISSING:
+                result = method(self, *args, **kwargs)
+                cache.put(key, generation, result)
+            return result
+        return wrapper
+    return decorator
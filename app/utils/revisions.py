@@ -0,0 +1,369 @@
+# 按键记录的修订历史（增量存储）
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.utils.coherence import FileMutex, ProcessLock, file_inode
+
+
+def merge_deltas(earlier: Optional[dict], later: Optional[dict]) -> Optional[dict]:
+    """合并两个相邻的增量，None 表示删除"""
+    if later is None or earlier is None:
+        return later
+    return {**earlier, **later}
+
+
+def apply_delta(state: Optional[dict], delta: Optional[dict]) -> Optional[dict]:
+    """把增量应用到条目状态上"""
+    if delta is None:
+        return None
+    return {**(state or {}), **delta}
+
+
+class RevisionLog:
+    """
+    每次修改只追加一条 {rev, ts, key, delta} 记录：
+    - delta 只包含相对上一版本变化的字段，新建时为完整条目，删除时为 None
+    - 超过保留窗口的修订按小时/天/周稀疏化，更早的并入基线快照
+    - 修订号在所有进程间递增，稀疏化时合并后的修订沿用其中最后一个修订号，可作为增量同步的序号
+    """
+
+    def __init__(self, directory: str, keep_all: int, keep_hourly: int, keep_daily: int,
+                 keep_weekly: int, prune_interval: int, file_lock: ProcessLock, prune_mutex: FileMutex):
+        self.log_file = os.path.join(directory, 'revisions.log')
+        self.base_file = os.path.join(directory, 'revisions_base.json')
+        self.keep_all = keep_all
+        self.keep_hourly = keep_hourly
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.prune_interval = prune_interval
+        # 多个进程共用同一份修订日志：修订号在持有文件锁写入时分配
+        self._file_lock = file_lock
+        # 同一时间只允许一个进程清理：清理在锁外读取日志，并发清理会互相覆盖
+        self._prune_mutex = prune_mutex
+        self._lock = threading.Lock()
+        self._buffer: List[dict] = []
+        self._next_rev = self.last_rev() + 1
+        self._known_size = self._log_size()
+        self._last_prune = time.time()
+        self._pruning = False
+
+    def ensure_base(self, load_data: Callable[[], Dict[str, dict]]) -> None:
+        """首次启用时把现有数据作为基线；多个进程同时启动时只有一个写出，其余在锁内看到已存在的基线"""
+        if os.path.exists(self.base_file):
+            return
+        with self._file_lock.exclusive(), self._lock:
+            if os.path.exists(self.base_file):
+                return
+            rev = self.last_rev()
+            self._next_rev = rev + 1
+            self._write_base({'horizon': time.time(), 'rev': rev, 'folded': rev, 'data': load_data()})
+
+    def record(self, key: str, old: Optional[dict], new: Optional[dict]) -> None:
+        """记录一次修改，写入缓冲区"""
+        if new is None:
+            if old is None:
+                return
+            delta = None
+        elif old is None:
+            delta = dict(new)
+        else:
+            delta = {f: v for f, v in new.items() if old.get(f) != v}
+            if not delta:
+                return
+        with self._lock:
+            self._buffer.append({'ts': time.time(), 'key': key, 'delta': delta})
+
+    def flush(self) -> None:
+        """把缓冲区中的修订一次性追加到日志，并按需触发清理"""
+        with self._file_lock.exclusive(), self._lock:
+            records, self._buffer = self._buffer, []
+            if records:
+                if self._log_size() != self._known_size:
+                    # 其他进程写入或清理过日志
+                    self._next_rev = self.last_rev() + 1
+                for record in records:
+                    record['rev'] = self._next_rev
+                    self._next_rev += 1
+                payload = ''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n'
+                                  for r in records)
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(payload)
+                self._known_size = self._log_size()
+            due = not self._pruning and time.time() - self._last_prune >= self.prune_interval
+            if due:
+                self._pruning = True
+        if due:
+            threading.Thread(target=self.prune, daemon=True).start()
+
+    def history(self, key: str) -> List[dict]:
+        """列出某个键的所有修订，最新的在前"""
+        base = self._read_base()
+        state = base['data'].get(key)
+        result = []
+        for record in self._read_log():
+            if record['key'] != key:
+                continue
+            state = apply_delta(state, record['delta'])
+            result.append({
+                'revision': record['rev'],
+                'timestamp': _isoformat(record['ts']),
+                'deleted': state is None,
+                'entry': state
+            })
+        result.reverse()
+        return result
+
+    def state_at(self, key: str, revision: int) -> Tuple[bool, Optional[dict]]:
+        """返回 (修订是否存在, 该修订之后的条目状态)"""
+        base = self._read_base()
+        state = base['data'].get(key)
+        for record in self._read_log():
+            if record['rev'] > revision:
+                break
+            if record['key'] != key:
+                continue
+            state = apply_delta(state, record['delta'])
+            if record['rev'] == revision:
+                return True, state
+        return False, None
+
+    def changes_since(self, rev: int, limit: int) -> Optional[Tuple[List[dict], bool]]:
+        """
+        修订号大于 rev 的修订（最多 limit 条）以及之后是否还有更多
+        rev 之后的修订已有并入基线的（或 rev 超出已分配的修订号）时返回 None，需要完整同步
+        日志按修订号顺序写入，先二分查找起始位置，读取量只与返回的修订数有关
+        """
+        if not os.path.exists(self.log_file):
+            return None if rev < self._read_base_header()['folded'] or rev > self.last_rev() else ([], False)
+        # 先打开日志再读取基线：清理先写基线再替换日志，读到的基线不会比日志旧
+        with open(self.log_file, 'rb') as f:
+            if rev < self._read_base_header()['folded']:
+                return None
+            f.seek(self._offset_after(f, os.fstat(f.fileno()).st_size, rev))
+            records = []
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 其他进程正在写入的行
+                    break
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if len(records) == limit:
+                    return records, True
+                records.append(record)
+        if not records and rev > self.last_rev():
+            return None
+        return records, False
+
+    @staticmethod
+    def _offset_after(f, size: int, rev: int) -> int:
+        """日志中第一条修订号大于 rev 的记录的偏移量，没有时为文件末尾"""
+        def line_at(pos: int) -> Tuple[int, bytes]:
+            # pos 处或之后的第一个完整行
+            f.seek(max(0, pos - 1))
+            if pos > 0:
+                f.readline()
+            return f.tell(), f.readline()
+
+        def after(pos: int) -> bool:
+            start, line = line_at(pos)
+            if start >= size or not line.endswith(b'\n'):
+                return True
+            try:
+                return json.loads(line)['rev'] > rev
+            except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+                return False
+
+        lo, hi = 0, size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if after(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return line_at(lo)[0]
+
+    def snapshot_at(self, timestamp: float) -> Optional[Dict[str, dict]]:
+        """重建指定时间点的完整数据，早于保留范围时返回 None"""
+        base = self._read_base()
+        if timestamp < base['horizon']:
+            return None
+        data = dict(base['data'])
+        for record in self._read_log():
+            if record['ts'] > timestamp:
+                break
+            state = apply_delta(data.get(record['key']), record['delta'])
+            if state is None:
+                data.pop(record['key'], None)
+            else:
+                data[record['key']] = state
+        return data
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """按保留策略稀疏化修订历史，其他进程正在清理时跳过"""
+        now = time.time() if now is None else now
+        if not self._prune_mutex.acquire_nowait():
+            self._last_prune = now
+            self._pruning = False
+            return
+        try:
+            with self._lock:
+                offset = self._log_size()
+                inode = file_inode(self.log_file)
+            base = self._read_base()
+            records = list(self._read_log(limit=offset))
+            kept, horizon, folded = self._thin(records, base['data'], now)
+
+            with self._file_lock.exclusive(), self._lock:
+                if file_inode(self.log_file) != inode or self._log_size() < offset:
+                    # 读取之后日志已被替换（没有 flock 的平台上其他进程也可能同时清理），
+                    # 基于旧内容写回会丢失修订，放弃本次清理
+                    logging.warning("修订日志在清理期间已被替换，放弃本次清理")
+                    return
+                # 清理期间追加的记录原样接在后面
+                tail = ''
+                if os.path.exists(self.log_file):
+                    with open(self.log_file, 'r', encoding='utf-8') as f:
+                        f.seek(offset)
+                        tail = f.read()
+                tmp_file = self.log_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    for record in kept:
+                        f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    f.write(tail)
+                base['horizon'] = max(base['horizon'], horizon)
+                base['folded'] = max(base.get('folded', base['rev']), folded)
+                if records:
+                    base['rev'] = max(base['rev'], records[-1]['rev'])
+                self._write_base(base)
+                os.replace(tmp_file, self.log_file)
+                self._known_size = self._log_size()
+        except Exception as e:
+            logging.error(f"修订历史清理失败: {str(e)}")
+        finally:
+            self._prune_mutex.release()
+            self._last_prune = now
+            self._pruning = False
+
+    def _thin(self, records: List[dict], base_data: Dict[str, dict], now: float) -> Tuple[List[dict], float, int]:
+        """计算保留的修订与并入基线的最大修订号；被丢弃的增量向后并入同一时间段内保留的修订"""
+        by_key: Dict[str, List[dict]] = {}
+        for record in records:
+            by_key.setdefault(record['key'], []).append(record)
+
+        kept = []
+        folded = 0
+        for key, revisions in by_key.items():
+            group: List[dict] = []
+            for i, record in enumerate(revisions):
+                group.append(record)
+                bucket = self._bucket(record, now)
+                next_bucket = self._bucket(revisions[i + 1], now) if i + 1 < len(revisions) else None
+                if bucket == next_bucket:
+                    continue
+                delta = group[0]['delta']
+                for later in group[1:]:
+                    delta = merge_deltas(delta, later['delta'])
+                if bucket == 'base':
+                    folded = max(folded, record['rev'])
+                    state = apply_delta(base_data.get(key), delta)
+                    if state is None:
+                        base_data.pop(key, None)
+                    else:
+                        base_data[key] = state
+                else:
+                    kept.append(dict(record, delta=delta))
+                group = []
+        kept.sort(key=lambda r: r['rev'])
+        return kept, now - self.keep_weekly * 7 * 86400, folded
+
+    def _bucket(self, record: dict, now: float):
+        """修订所属的保留时间段"""
+        ts = record['ts']
+        age = now - ts
+        if age < self.keep_all:
+            return ('rev', record['rev'])
+        if age < self.keep_hourly * 3600:
+            return ('hour', int(ts // 3600))
+        if age < self.keep_daily * 86400:
+            return ('day', int(ts // 86400))
+        if age < self.keep_weekly * 7 * 86400:
+            return ('week', int(ts // (7 * 86400)))
+        return 'base'
+
+    def _read_log(self, limit: Optional[int] = None):
+        """按顺序读取已写入的修订日志"""
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'rb') as f:
+                data = f.read(limit) if limit is not None else f.read()
+            for line in data.splitlines():
+                try:
+                    yield json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+
+    def _log_size(self) -> int:
+        """修订日志当前大小"""
+        return os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+
+    def _read_base(self) -> dict:
+        """读取基线快照"""
+        if os.path.exists(self.base_file):
+            with open(self.base_file, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if 'data' in header:
+                    # 旧格式：整个基线是一个 JSON 对象
+                    return header
+                return dict(header, data=json.loads(f.readline()))
+        return {'horizon': 0, 'rev': 0, 'data': {}}
+
+    def _read_base_header(self) -> dict:
+        """只读取基线的 horizon、rev 与 folded（并入基线的最大修订号），不解析数据部分"""
+        if os.path.exists(self.base_file):
+            with open(self.base_file, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+            # 旧的基线没有 folded，以 rev 作为保守的上限
+            return {'horizon': header['horizon'], 'rev': header['rev'], 'folded': header.get('folded', header['rev'])}
+        return {'horizon': 0, 'rev': 0, 'folded': 0}
+
+    def _write_base(self, base: dict) -> None:
+        """原子地写出基线快照：第一行为 {horizon, rev}，第二行为数据"""
+        # 临时文件名由本进程独占，不会与其他进程的写入互相覆盖或提前被改名
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.base_file), prefix='revisions_base.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'horizon': base['horizon'], 'rev': base['rev'],
+                                    'folded': base.get('folded', base['rev'])}) + '\n')
+                f.write(json.dumps(base['data'], ensure_ascii=False, separators=(',', ':')) + '\n')
+            os.replace(tmp_file, self.base_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def last_rev(self) -> int:
+        """读取日志末尾的修订号"""
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - 256 * 1024))
+                tail = f.read()
+            for line in reversed(tail.splitlines()):
+                try:
+                    return json.loads(line)['rev']
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+                    continue
+        return self._read_base_header()['rev']
+
+
+def _isoformat(ts: float) -> str:
+    """时间戳转为本地时间 ISO 字符串，与条目时间格式一致"""
+    return datetime.fromtimestamp(ts).isoformat()
@@ -0,0 +1,116 @@
+# 增量维护的有序索引
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Iterable, Iterator, List
+
+
+class SortedIndex:
+    """
+    分桶有序列表：元素为 (排序值, 键) 元组
+    - 插入、删除：在桶的最大值上二分定位，再在桶内二分，O(log n + 桶大小)
+    - 按位置切片：跳过前面的整桶后顺序读取，O(桶数 + 页大小)，不需要整体排序
+    """
+
+    LOAD = 1000
+
+    def __init__(self, items: Iterable[tuple] = ()):
+        items = sorted(items)
+        self._buckets: List[list] = [items[i:i + self.LOAD] for i in range(0, len(items), self.LOAD)]
+        self._maxes: List[Any] = [bucket[-1] for bucket in self._buckets]
+        self._len = len(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, item: tuple) -> None:
+        """插入元素"""
+        if not self._buckets:
+            self._buckets.append([item])
+            self._maxes.append(item)
+            self._len = 1
+            return
+        i = min(bisect_left(self._maxes, item), len(self._maxes) - 1)
+        bucket = self._buckets[i]
+        insort(bucket, item)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            # 桶过大时对半拆分
+            half = len(bucket) // 2
+            self._buckets[i:i + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[i:i + 1] = [bucket[half - 1], bucket[-1]]
+        self._len += 1
+
+    def remove(self, item: tuple) -> bool:
+        """删除元素，不存在时返回 False"""
+        i = bisect_left(self._maxes, item)
+        if i == len(self._maxes):
+            return False
+        bucket = self._buckets[i]
+        j = bisect_left(bucket, item)
+        if j == len(bucket) or bucket[j] != item:
+            return False
+        del bucket[j]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+        self._len -= 1
+        return True
+
+    def slice(self, start: int, stop: int, reverse: bool = False) -> List[tuple]:
+        """按位置取出 [start, stop) 的元素，reverse 时按降序计算位置"""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        if reverse:
+            items = self._forward_slice(self._len - stop, self._len - start)
+            items.reverse()
+            return items
+        return self._forward_slice(start, stop)
+
+    def position(self, item: tuple) -> int:
+        """小于 item 的元素个数"""
+        i = bisect_left(self._maxes, item)
+        if i == len(self._maxes):
+            return self._len
+        return sum(len(bucket) for bucket in self._buckets[:i]) + bisect_left(self._buckets[i], item)
+
+    def iter_from(self, item: tuple, reverse: bool = False) -> Iterator[tuple]:
+        """升序遍历不小于 item 的元素；reverse 时降序遍历不大于 item 的元素"""
+        if reverse:
+            i = bisect_left(self._maxes, item)
+            if i == len(self._maxes):
+                i -= 1
+            for n in range(i, -1, -1):
+                bucket = self._buckets[n]
+                end = bisect_right(bucket, item) if n == i else len(bucket)
+                for j in range(end - 1, -1, -1):
+                    yield bucket[j]
+            return
+        i = bisect_left(self._maxes, item)
+        for n in range(i, len(self._buckets)):
+            bucket = self._buckets[n]
+            begin = bisect_left(bucket, item) if n == i else 0
+            yield from bucket[begin:]
+
+    def __iter__(self) -> Iterator[tuple]:
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __reversed__(self) -> Iterator[tuple]:
+        for bucket in reversed(self._buckets):
+            yield from reversed(bucket)
+
+    def _forward_slice(self, start: int, stop: int) -> List[tuple]:
+        result: List[tuple] = []
+        offset = 0
+        for bucket in self._buckets:
+            size = len(bucket)
+            if offset + size <= start:
+                offset += size
+                continue
+            result.extend(bucket[max(start - offset, 0):stop - offset])
+            offset += size
+            if offset >= stop:
+                break
+        return result
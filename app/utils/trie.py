@@ -0,0 +1,182 @@
+# 前缀补全用的压缩前缀树：每个节点缓存子树中权重最高的若干个词，补全时只需沿前缀下行
+from bisect import insort
+from heapq import nsmallest
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class _Node:
+    __slots__ = ('label', 'children', 'words', 'top')
+
+    def __init__(self, label: str):
+        # 从父节点到本节点的边上的字符（已小写）
+        self.label = label
+        self.children: Dict[str, '_Node'] = {}
+        # 在本节点结束的原始词 -> 排序项 (-权重, 词)；大小写不同的词共用一个节点
+        self.words: Optional[Dict[str, Tuple[int, str]]] = None
+        # 子树中排序最靠前的至多 size 个排序项，升序
+        self.top: List[Tuple[int, str]] = []
+
+
+class PrefixTrie:
+    """
+    按小写前缀补全，结果按权重从高到低、权重相同时按词排序
+    - 补全：沿前缀下行后直接读取节点缓存的前几项，O(前缀长度 + 结果数)
+    - 修改：只调整路径上各节点的缓存；权重降低或删除的词恰好在已满的缓存中时，才由子节点的缓存重新合并
+    size 是缓存的长度，也是单次补全能返回的最大条数
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._root = _Node('')
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, int]], size: int) -> 'PrefixTrie':
+        """由 (词, 权重) 构建，最后自底向上一次性计算各节点的缓存"""
+        trie = cls(size)
+        for word, weight in items:
+            node = trie._insert_path(word.lower())[-1]
+            if node.words is None:
+                node.words = {}
+            node.words[word] = (-weight, word)
+        stack = [(trie._root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                node.top = trie._merge(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+        return trie
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """以 prefix 开头（不区分大小写）的词，最多 min(limit, size) 个"""
+        node = self._root
+        rest = prefix.lower()
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return []
+            if rest.startswith(child.label):
+                rest = rest[len(child.label):]
+            elif child.label.startswith(rest):
+                rest = ''
+            else:
+                return []
+            node = child
+        return [word for _, word in node.top[:limit]]
+
+    def set(self, word: str, weight: int) -> None:
+        """添加词或修改它的权重"""
+        path = self._insert_path(word.lower())
+        node = path[-1]
+        if node.words is None:
+            node.words = {}
+        old = node.words.get(word)
+        item = (-weight, word)
+        node.words[word] = item
+        for n in reversed(path):
+            self._replace(n, old, item)
+
+    def remove(self, word: str) -> None:
+        """删除词，不存在时忽略"""
+        path = self._find_path(word.lower())
+        if path is None or not path[-1].words or word not in path[-1].words:
+            return
+        node = path[-1]
+        old = node.words.pop(word)
+        if not node.words:
+            node.words = None
+        for n in reversed(path):
+            self._replace(n, old, None)
+        self._prune(path)
+
+    def __len__(self) -> int:
+        return sum(len(n.words) for n in self._iter_nodes() if n.words)
+
+    def _replace(self, node: _Node, old: Optional[tuple], new: Optional[tuple]) -> None:
+        """在节点缓存中用 new 替换 old（任一可为 None）"""
+        top = node.top
+        full = len(top) >= self.size
+        if old is not None and old in top:
+            top.remove(old)
+            if new is None or new > old:
+                # 排序后移或删除：缓存已满时，缓存之外的词可能应当补进来
+                if full:
+                    node.top = self._merge(node)
+                    return
+        if new is not None and new not in top:
+            if len(top) < self.size or new < top[-1]:
+                insort(top, new)
+                del top[self.size:]
+
+    def _merge(self, node: _Node) -> List[Tuple[int, str]]:
+        """由本节点的词与子节点的缓存合并出本节点的缓存"""
+        items = list(node.words.values()) if node.words else []
+        for child in node.children.values():
+            items.extend(child.top)
+        return nsmallest(self.size, items)
+
+    def _insert_path(self, word: str) -> List[_Node]:
+        """返回从根到 word 对应节点的路径，必要时创建或拆分节点"""
+        node = self._root
+        path = [node]
+        rest = word
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = _Node(rest)
+                node.children[rest[0]] = child
+                path.append(child)
+                return path
+            common = 0
+            limit = min(len(rest), len(child.label))
+            while common < limit and rest[common] == child.label[common]:
+                common += 1
+            if common < len(child.label):
+                # 在公共前缀处拆分边，中间节点的缓存与原子节点相同
+                middle = _Node(child.label[:common])
+                middle.top = list(child.top)
+                child.label = child.label[common:]
+                middle.children[child.label[0]] = child
+                node.children[rest[0]] = middle
+                child = middle
+            rest = rest[common:]
+            node = child
+            path.append(node)
+        return path
+
+    def _find_path(self, word: str) -> Optional[List[_Node]]:
+        """返回从根到 word 对应节点的路径，不存在时返回 None"""
+        node = self._root
+        path = [node]
+        rest = word
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None or not rest.startswith(child.label):
+                return None
+            rest = rest[len(child.label):]
+            node = child
+            path.append(node)
+        return path
+
+    def _prune(self, path: List[_Node]) -> None:
+        """删除词后移除空叶子，并把只剩一个子节点的中间节点与子节点合并"""
+        for i in range(len(path) - 1, 0, -1):
+            node, parent = path[i], path[i - 1]
+            if node.words:
+                return
+            if not node.children:
+                del parent.children[node.label[0]]
+                continue
+            if len(node.children) == 1:
+                child = next(iter(node.children.values()))
+                child.label = node.label + child.label
+                parent.children[node.label[0]] = child
+            return
+
+    def _iter_nodes(self):
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
@@ -0,0 +1,70 @@
+# 暖启动快照：保存规范化后的条目与派生索引，重启时跳过数据文件解析与索引重建
+import logging
+import os
+import pickle
+import zlib
+from typing import Any, Optional, Tuple
+
+VERSION = 1
+
+
+def file_checksum(path: str, start: int = 0) -> Tuple[int, int]:
+    """文件大小与 start 之后内容的 CRC32"""
+    crc = 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(start)
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return size, crc
+
+
+class WarmStart:
+    """
+    文件中依次是两个 pickle：头部 {version, schema, layout, checksum} 与数据 {data, indexes}
+    头部中的校验和与当前数据文件不一致时整个快照视为过期，调用方回退到冷启动
+    """
+
+    def __init__(self, path: str, schema: int = 0):
+        self.path = path
+        # 派生索引的结构版本，不同时快照视为过期
+        self.schema = schema
+
+    def matches(self, layout: str, checksum: Tuple[int, int]) -> bool:
+        """快照是否与当前数据文件对应（只读取头部）"""
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f) == self._header(layout, checksum)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning(f"暖启动快照头部无法读取: {str(e)}")
+            return False
+
+    def load(self, layout: str, checksum: Tuple[int, int]) -> Optional[Tuple[Any, dict]]:
+        """返回 (条目数据, 派生索引)，快照不存在、过期或损坏时返回 None"""
+        try:
+            with open(self.path, 'rb') as f:
+                if pickle.load(f) != self._header(layout, checksum):
+                    return None
+                payload = pickle.load(f)
+            return payload['data'], payload['indexes']
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"暖启动快照损坏，回退到冷启动: {str(e)}")
+            return None
+
+    def write(self, layout: str, checksum: Tuple[int, int], data: Any, indexes: dict) -> None:
+        """原子地写出快照"""
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(self._header(layout, checksum), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump({'data': data, 'indexes': indexes}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.path)
+
+    def _header(self, layout: str, checksum: Tuple[int, int]) -> dict:
+        return {'version': VERSION, 'schema': self.schema, 'layout': layout, 'checksum': checksum}
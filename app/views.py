@@ -1,30 +1,54 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
-from app.models import StringStore
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, session, stream_with_context
+from app.models import create_store
 from app.auth import auth_manager
+from app.config.config import Config
 from app.utils.i18n import i18n
+from app.utils.batch import BatchError
+from app.utils.changefeed import DELETE, PUT
+from app.utils.cursor import decode_cursor, encode_cursor
+from app.utils.etag import PreconditionFailed, collection_etag, entry_etag
+from app.utils.ndjson import POLICIES, dump_entry
+from app.utils.projection import parse_fields, project
+from app.utils.query import QueryError
+from datetime import datetime
 import json
 import math
+import time
 
 main = Blueprint('main', __name__)
-store = StringStore()
+store = create_store()
+
+# 页面列表渲染用到的字段
+LIST_FIELDS = ('key', 'preview', 'value_length', 'created_at', 'updated_at', 'tags')
 
 @main.route('/', methods=['GET'])
 def index():
     page = request.args.get('page', 1, type=int)
     search_query = request.args.get('search', '').strip()
     current_tag = request.args.get('tag', '').strip()
-    sort_by = request.args.get('sort_by', 'updated_at').strip()
+    fuzzy = request.args.get('fuzzy') == '1'
+    # 搜索时默认按相关度排序
+    sort_by = request.args.get('sort_by', 'relevance' if search_query else 'updated_at').strip()
     sort_order = request.args.get('sort_order', 'desc').strip()
 
-    if search_query:
-        items = store.search_strings(search_query)
-        total = len(items)
-        items = items[(page - 1) * store.ITEMS_PER_PAGE:page * store.ITEMS_PER_PAGE]
+    if search_query and fuzzy:
+        # 容错搜索：按键的编辑距离近似匹配
+        items, total = store.fuzzy_page(search_query, page)
+        tag_facets = None
+    elif search_query:
+        # 组合查询与当前标签筛选、排序一起执行；输入到一半的不完整表达式按普通文本搜索
+        items, total = store.query_page(search_query, page, tag=current_tag or None, sort_by=sort_by,
+                                        sort_order=sort_order, strict=False)
+        # 当前搜索结果中各标签的条目数
+        tag_facets = store.tag_facets(query=search_query, tag=current_tag or None, strict=False)
     else:
         items, total = store.get_all_strings(page, tag=current_tag if current_tag else None, sort_by=sort_by, sort_order=sort_order)
+        tag_facets = store.tag_facets(tag=current_tag) if current_tag else None
 
     total_pages = math.ceil(total / store.ITEMS_PER_PAGE)
-    all_tags = store.get_all_tags()
+    tag_counts = store.get_tag_counts()
+    # 列表只渲染值的预览，展开或复制时由前端获取完整的值
+    items = [project(item, LIST_FIELDS, Config.PREVIEW_LENGTH) for item in items]
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return render_template('_string_list.html',
@@ -32,10 +56,12 @@ def index():
                              page=page,
                              total_pages=total_pages,
                              search_query=search_query,
+                             fuzzy=fuzzy,
                              current_tag=current_tag,
                              sort_by=sort_by,
                              sort_order=sort_order,
-                             all_tags=all_tags)
+                             tag_counts=tag_counts,
+                             tag_facets=tag_facets)
 
     # 加载翻译数据
     translations = i18n.translations
@@ -45,11 +71,14 @@ def index():
                          page=page,
                          total_pages=total_pages,
                          search_query=search_query,
+                         fuzzy=fuzzy,
                          is_admin=auth_manager.is_admin_authenticated(),
                          current_tag=current_tag,
                          sort_by=sort_by,
                          sort_order=sort_order,
-                         all_tags=all_tags,
+                         tag_counts=tag_counts,
+                         tag_facets=tag_facets,
+                         events_enabled=Config.EVENTS_ENABLED,
                          translations=translations)
 
 @main.route('/api/verify_password', methods=['POST'])
@@ -90,51 +119,316 @@ def delete_string(key):
 
 # 移除 admin_login, admin_logout, admin_auto_logout 路由，因为不再维持登录状态
 
+def _next_cursor(items: list, has_more: bool, sort_by: str, sort_order: str, tag: str) -> str:
+    """由当前页的最后一条生成下一页的游标，没有下一页时返回 None"""
+    if not has_more or not items:
+        return None
+    field = 'created_at' if sort_by == 'created_at' else 'updated_at'
+    order = 'asc' if sort_order == 'asc' else 'desc'
+    return encode_cursor(field, order, tag or None, items[-1][field], items[-1]['key'])
+
+def _not_modified(etag: str):
+    """请求的 If-None-Match 与当前 ETag 相同时返回不带内容的 304 响应，否则返回 None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+def _with_etag(response, etag: str):
+    """为响应设置 ETag"""
+    response.set_etag(etag)
+    return response
+
+def _if_match():
+    """请求带有 If-Match 时，返回在写锁内判断条目当前 ETag 的函数"""
+    conditions = request.if_match
+    if not conditions:
+        return None
+    return lambda etag: etag is not None and conditions.contains(etag)
+
+def _projection():
+    """解析 fields 与 preview_len 参数，返回 (字段, 预览长度)，字段为 None 时不投影；参数错误时抛出 ValueError"""
+    preview_len = request.args.get('preview_len', '').strip()
+    if preview_len:
+        try:
+            preview_len = int(preview_len)
+        except ValueError:
+            raise ValueError('预览长度必须是整数')
+        if preview_len < 0:
+            raise ValueError('预览长度不能为负数')
+    else:
+        preview_len = None
+    fields = parse_fields(request.args.get('fields', ''), preview_len)
+    return fields, Config.PREVIEW_LENGTH if preview_len is None else preview_len
+
+def _project_items(items: list, fields, preview_len: int) -> list:
+    if fields is None:
+        return items
+    return [project(item, fields, preview_len) for item in items]
+
 @main.route('/api/strings', methods=['GET'])
 def api_get_strings():
+    # 数据版本没有变化时不再查询和序列化（版本在查询前读取，查询期间的修改会使下次请求重新获取）
+    etag = collection_etag(store.version(), request.args.items(multi=True))
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '').strip()
+    changed_since = request.args.get('changed_since', '').strip()
+    cursor = request.args.get('cursor', '').strip()
+    tag = request.args.get('tag', '').strip()
+    fuzzy = request.args.get('fuzzy') == '1'
+    sort_by = request.args.get('sort_by', 'relevance' if search else 'updated_at').strip()
+    sort_order = request.args.get('sort_order', 'desc').strip()
+    # count=estimate 时搜索总数可能是上限估计，换取更快的响应
+    exact_total = request.args.get('count', 'exact').strip() != 'estimate'
+    # fields 只返回指定字段，preview_len 把值换成截断的预览（另附长度与哈希）
+    try:
+        fields, preview_len = _projection()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    if search:
-        items = store.search_strings(search)
-        total = len(items)
-        items = items[(page-1)*store.ITEMS_PER_PAGE:page*store.ITEMS_PER_PAGE]
+    if cursor:
+        # 游标中已包含排序方式与标签筛选，从上一页最后一条之后继续
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'success': False, 'error': '游标格式错误'}), 400
+        items, has_more = store.get_strings_after((position['value'], position['key']), tag=position['tag'],
+                                                  sort_by=position['sort_by'], sort_order=position['sort_order'])
+        return _with_etag(jsonify({
+            'items': _project_items(items, fields, preview_len),
+            'next_cursor': _next_cursor(items, has_more, position['sort_by'], position['sort_order'],
+                                        position['tag'])
+        }), etag)
+    
+    next_cursor = None
+    if changed_since:
+        try:
+            moment = datetime.fromisoformat(changed_since)
+        except ValueError:
+            return jsonify({'success': False, 'error': '时间格式错误'}), 400
+        items, total = store.changed_since(moment, page)
+        facets = None
+    elif search and fuzzy:
+        items, total = store.fuzzy_page(search, page)
+        facets = None
+    elif search:
+        try:
+            items, total = store.query_page(search, page, tag=tag or None, sort_by=sort_by,
+                                            sort_order=sort_order, exact_total=exact_total)
+        except QueryError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        facets = store.tag_facets(query=search, tag=tag or None) if exact_total else None
     else:
-        items, total = store.get_all_strings(page)
+        items, total = store.get_all_strings(page, tag=tag or None, sort_by=sort_by, sort_order=sort_order)
+        facets = store.tag_facets(tag=tag or None)
+        next_cursor = _next_cursor(items, page * store.ITEMS_PER_PAGE < total, sort_by, sort_order, tag)
     
-    return jsonify({
-        'items': items,
+    return _with_etag(jsonify({
+        'items': _project_items(items, fields, preview_len),
         'total': total,
         'page': page,
-        'total_pages': math.ceil(total / store.ITEMS_PER_PAGE)
-    })
+        'total_pages': math.ceil(total / store.ITEMS_PER_PAGE),
+        'facets': facets,
+        'next_cursor': next_cursor
+    }), etag)
+
+@main.route('/api/tags', methods=['GET'])
+def api_get_tags():
+    etag = collection_etag(store.version())
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    return _with_etag(jsonify({'success': True, 'tags': store.get_tag_counts()}), etag)
+
+@main.route('/api/complete', methods=['GET'])
+def api_complete():
+    prefix = request.args.get('prefix', '')
+    kind = request.args.get('kind', 'key').strip()
+    limit = request.args.get('limit', 10, type=int)
+    if kind not in ('key', 'tag'):
+        return jsonify({'success': False, 'error': '补全类型错误'}), 400
+    limit = max(1, min(limit, Config.COMPLETE_MAX_LIMIT))
+    return jsonify({'success': True, 'completions': store.complete(prefix, kind, limit)})
 
 @main.route('/api/string/<key>', methods=['GET'])
 def api_get_string(key):
     item = store.get_string(key)
     if item:
-        return jsonify({'success': True, 'data': item})
-    return jsonify({'success': False, 'error': '字符串不存在'}), 404
+        etag = entry_etag(item)
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        return _with_etag(jsonify({'success': True, 'data': item}), etag)
+    return jsonify({'success': False, 'error': '字符串不存在', 'suggestions': store.suggest_keys(key)}), 404
 
 @main.route('/api/string', methods=['POST'])
 def api_add_string():
     data = request.get_json()
     if not data or 'key' not in data or 'value' not in data:
         return jsonify({'success': False, 'error': '缺少必要参数'}), 400
-    
-    key = data['key'].strip()
-    value = data['value'].strip()
-    
-    if store.add_string(key, value):
-        return jsonify({'success': True})
+    return _save_string(data['key'].strip(), data['value'].strip(), data.get('durable'))
+
+@main.route('/api/string/<key>', methods=['PUT'])
+def api_put_string(key):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('value'), str):
+        return jsonify({'success': False, 'error': '缺少必要参数'}), 400
+    return _save_string(key.strip(), data['value'].strip(), data.get('durable'))
+
+def _save_string(key: str, value: str, durable: bool):
+    """添加或更新字符串，If-Match 不满足时返回 412，成功时返回新的 ETag"""
+    try:
+        saved = store.add_string(key, value, if_match=_if_match())
+    except PreconditionFailed:
+        return jsonify({'success': False, 'error': '字符串已被修改'}), 412
+    if saved:
+        # 调用方要求写入落盘后再返回
+        if durable and not store.flush(timeout=5):
+            return jsonify({'success': False, 'error': '写盘超时'}), 503
+        response = jsonify({'success': True})
+        etag = entry_etag(store.get_string(key))
+        return _with_etag(response, etag) if etag else response
     return jsonify({'success': False, 'error': '添加失败'}), 400
 
+@main.route('/api/batch', methods=['POST'])
+def api_batch():
+    data = request.get_json(silent=True)
+    if not data or 'operations' not in data:
+        return jsonify({'success': False, 'error': '缺少必要参数'}), 400
+    try:
+        results = store.apply_batch(data['operations'])
+    except BatchError as e:
+        return jsonify({'success': False, 'error': str(e), 'index': e.index}), 400
+    # 调用方要求写入落盘后再返回
+    if data.get('durable') and not store.flush(timeout=5):
+        return jsonify({'success': False, 'error': '写盘超时'}), 503
+    return jsonify({'success': True, 'results': results})
+
+@main.route('/api/export', methods=['GET'])
+def api_export():
+    tag = request.args.get('tag', '').strip()
+    since = request.args.get('since', '').strip()
+    until = request.args.get('until', '').strip()
+    try:
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify({'success': False, 'error': '时间格式错误'}), 400
+    # 逐批读取、逐行输出，不在内存中构造完整的导出内容
+    lines = (dump_entry(item) for item in store.export_entries(tag or None, since, until))
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=stringvault.ndjson'})
+
+@main.route('/api/import', methods=['POST'])
+def api_import():
+    policy = request.args.get('policy', 'skip').strip()
+    if policy not in POLICIES:
+        return jsonify({'success': False, 'error': '导入策略错误'}), 400
+    # 直接逐行读取请求体，不把整个上传内容读入内存
+    result = store.import_entries(request.stream, policy)
+    return jsonify({'success': True, **result})
+
+def _change_event(event: dict) -> str:
+    """变更事件格式化为一条 SSE 消息，写入的条目附带按当前状态渲染的列表项，供页面原地替换"""
+    op, data = event['op'], {'key': event['key']}
+    if op == PUT:
+        item = store.get_string(event['key'])
+        if item is None:
+            # 推送之前条目又被删除了
+            op = DELETE
+        else:
+            item = project(dict(item, key=event['key']), LIST_FIELDS, Config.PREVIEW_LENGTH)
+            data['html'] = render_template('_string_item.html', item=item)
+    return f"id: {store.change_event_id(event['seq'])}\nevent: {op}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@main.route('/api/events', methods=['GET'])
+def api_events():
+    if not Config.EVENTS_ENABLED:
+        return jsonify({'success': False, 'error': '变更推送未启用'}), 404
+    # 断线重连时浏览器带上收到的最后一个事件 ID，先补发此后的事件
+    subscription, backlog = store.subscribe_changes(request.headers.get('Last-Event-ID'))
+
+    def generate():
+        try:
+            yield f"retry: {Config.EVENTS_RETRY}\n\n"
+            events, idle = backlog, 0.0
+            # 连接到期后结束，让出 worker；客户端按 retry 重连并带 Last-Event-ID 补发
+            deadline = time.monotonic() + Config.EVENTS_MAX_DURATION
+            while True:
+                for event in events:
+                    yield _change_event(event)
+                if events:
+                    idle = 0.0
+                elif subscription.dropped or time.monotonic() >= deadline:
+                    # 跟不上推送速度或连接到期：结束连接，由客户端带 Last-Event-ID 重连补发
+                    return
+                elif idle >= Config.EVENTS_HEARTBEAT:
+                    # 心跳（SSE 注释行），让代理不因空闲断开连接，也能及时发现客户端已断开
+                    yield ': heartbeat\n\n'
+                    idle = 0.0
+                events = subscription.get(Config.EVENTS_POLL_INTERVAL)
+                if not events:
+                    idle += Config.EVENTS_POLL_INTERVAL
+                    store.poll_changes()
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no'})
+
 @main.route('/api/string/<key>', methods=['DELETE'])
 def api_delete_string(key):
-    if store.delete_string(key):
+    try:
+        deleted = store.delete_string(key, if_match=_if_match())
+    except PreconditionFailed:
+        return jsonify({'success': False, 'error': '字符串已被修改'}), 412
+    if deleted:
         return jsonify({'success': True})
     return jsonify({'success': False, 'error': '删除失败'}), 404
 
+@main.route('/api/changes', methods=['GET'])
+def api_changes():
+    # 不带 since 表示客户端还没有副本：返回 resync 与当前序号
+    since = request.args.get('since', '').strip()
+    limit = request.args.get('limit', Config.CHANGES_MAX_LIMIT, type=int)
+    if since and not since.isdigit():
+        return jsonify({'success': False, 'error': '序号格式错误'}), 400
+    limit = max(1, min(limit, Config.CHANGES_MAX_LIMIT))
+    return jsonify({'success': True, **store.changes_since(int(since) if since else None, limit)})
+
+@main.route('/api/string/<key>/history', methods=['GET'])
+def api_get_history(key):
+    return jsonify({'success': True, 'history': store.get_history(key)})
+
+@main.route('/api/string/<key>/restore', methods=['POST'])
+def api_restore_revision(key):
+    data = request.get_json(silent=True) or {}
+    revision = data.get('revision')
+    if not isinstance(revision, int):
+        return jsonify({'success': False, 'error': '缺少必要参数'}), 400
+    if store.restore_revision(key, revision):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': '修订不存在'}), 404
+
+@main.route('/api/snapshot', methods=['GET'])
+def api_get_snapshot():
+    try:
+        moment = datetime.fromisoformat(request.args.get('at', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': '时间格式错误'}), 400
+    data = store.snapshot_at(moment)
+    if data is None:
+        return jsonify({'success': False, 'error': '超出修订历史保留范围'}), 404
+    return jsonify({'success': True, 'data': data})
+
+@main.route('/api/stats', methods=['GET'])
+def api_get_stats():
+    return jsonify({'success': True, 'stats': store.stats()})
+
 @main.route('/api/strings/<string:key>/tags', methods=['POST'])
 def add_tag(key):
     data = request.get_json()
@@ -0,0 +1,56 @@
+# 单元测试共用的夹具：每个测试使用独立的临时数据目录，不读写项目根目录下的数据文件
+import pytest
+
+from app.config.config import Config
+
+# 存储相关的文件路径配置 -> 临时目录中的文件名
+DATA_PATHS = {
+    'DATA_FILE': 'data.json',
+    'SQLITE_FILE': 'data.db',
+    'JOURNAL_FILE': 'data.journal',
+    'RECORD_FILE': 'data.rec',
+    'WARM_START_FILE': 'data.warm',
+    'LOCK_FILE': 'data.lock',
+    'GENERATION_FILE': 'data.gen',
+    'BACKUP_DIR': 'backups',
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """把所有数据文件指向临时目录，返回该目录"""
+    for name, filename in DATA_PATHS.items():
+        monkeypatch.setattr(Config, name, str(tmp_path / filename))
+    return tmp_path
+
+
+@pytest.fixture
+def make_store(data_dir, monkeypatch):
+    """按给定配置创建存储，测试结束时全部关闭；make_store(STORAGE_BACKEND='sqlite', ...)"""
+    from app.models import create_store
+    stores = []
+
+    def factory(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(Config, name, value)
+        store = create_store()
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
+
+
+@pytest.fixture
+def client(data_dir, make_store, monkeypatch):
+    """使用临时数据目录的测试客户端，接口读写的存储为 client.store"""
+    # 管理员密码文件是相对于工作目录的路径，导入时不存在会创建
+    monkeypatch.chdir(data_dir)
+    from app import create_app
+    import app.views as views
+    store = make_store()
+    monkeypatch.setattr(views, 'store', store)
+    test_client = create_app().test_client()
+    test_client.store = store
+    return test_client
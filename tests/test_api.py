@@ -0,0 +1,166 @@
+# JSON API：条件请求、游标分页、批量修改、导入导出与增量同步
+import json
+
+
+def add(client, key, value, tags=None):
+    assert client.store.add_string(key, value, tags=tags)
+
+
+# 条件请求
+
+def test_collection_etag_revalidates_until_data_changes(client):
+    add(client, 'a', 'v')
+    first = client.get('/api/strings')
+    etag = first.headers['ETag']
+    assert client.get('/api/strings', headers={'If-None-Match': etag}).status_code == 304
+    add(client, 'b', 'w')
+    assert client.get('/api/strings', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_collection_etag_depends_on_query(client):
+    add(client, 'a', 'v' * 500)
+    etag = client.get('/api/strings?fields=key').headers['ETag']
+    # 同一数据版本下的其他查询不能用前一个查询的缓存应答
+    for url in ('/api/strings', '/api/strings?fields=key,value', '/api/strings?page=2',
+                '/api/strings?search=a', '/api/strings?fields=key&preview_len=10'):
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200, url
+        assert response.headers['ETag'] != etag
+    # 参数顺序不影响 ETag
+    assert client.get('/api/strings?fields=key&sort_order=asc').headers['ETag'] == \
+        client.get('/api/strings?sort_order=asc&fields=key').headers['ETag']
+
+
+def test_if_match_guards_updates(client):
+    add(client, 'a', 'v1')
+    etag = client.get('/api/string/a').headers['ETag']
+    response = client.delete('/api/string/a', headers={'If-Match': '"stale"'})
+    assert response.status_code == 412
+    assert client.delete('/api/string/a', headers={'If-Match': etag}).status_code == 200
+    assert client.get('/api/string/a').status_code == 404
+
+
+# 游标分页
+
+def test_cursor_walks_all_pages_without_duplicates(client):
+    for i in range(30):
+        add(client, f'k{i:02d}', f'v{i}', tags=['even'] if i % 2 == 0 else None)
+    first = client.get('/api/strings?tag=even&sort_order=asc').get_json()
+    seen = [item['key'] for item in first['items']]
+    cursor = first['next_cursor']
+    # 翻页期间的新写入不影响后续页的位置
+    add(client, 'new', 'late', tags=['even'])
+    while cursor:
+        page = client.get(f'/api/strings?cursor={cursor}&fields=key').get_json()
+        assert all(set(item) == {'key'} for item in page['items'])
+        seen += [item['key'] for item in page['items']]
+        cursor = page['next_cursor']
+    assert seen == [f'k{i:02d}' for i in range(0, 30, 2)] + ['new']
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get('/api/strings?cursor=not-a-cursor').status_code == 400
+    from app.utils.cursor import encode_cursor
+    bad_time = encode_cursor('updated_at', 'desc', None, 'yesterday', 'a')
+    assert client.get(f'/api/strings?cursor={bad_time}').status_code == 400
+
+
+# 批量修改
+
+def test_batch_applies_operations_in_order(client):
+    add(client, 'a', 'old', tags=['t'])
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'set', 'key': 'b', 'value': 'new', 'tags': ['x', ' y ']},
+        {'op': 'set', 'key': 'a', 'value': 'updated'},
+        {'op': 'add_tag', 'key': 'a', 'tag': 'u'},
+        {'op': 'remove_tag', 'key': 'a', 'tag': 'missing'},
+        {'op': 'delete', 'key': 'nothing'},
+        {'op': 'set', 'key': 'c', 'value': 'temporary'},
+        {'op': 'delete', 'key': 'c'},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['success'] for r in results] == [True, True, True, False, False, True, True]
+    assert results[0]['created'] and not results[1]['created']
+    store = client.store
+    assert store.get_string('a')['value'] == 'updated' and store.get_string('a')['tags'] == ['t', 'u']
+    assert store.get_string('b')['tags'] == ['x', 'y']
+    assert store.get_string('c') is None
+
+
+def test_invalid_batch_changes_nothing(client):
+    add(client, 'a', 'old')
+    version = client.store.version()
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'set', 'key': 'a', 'value': 'new'},
+        {'op': 'rename', 'key': 'a'},
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 1
+    assert client.store.get_string('a')['value'] == 'old'
+    assert client.store.version() == version
+    assert client.post('/api/batch', json={'operations': []}).status_code == 400
+
+
+# 导入导出
+
+def test_export_then_import_round_trips(client):
+    add(client, 'a', '第一个', tags=['x'])
+    add(client, 'b', 'second\nline')
+    exported = client.get('/api/export').data.decode('utf-8')
+    lines = [json.loads(line) for line in exported.splitlines()]
+    assert [line['key'] for line in lines] == ['a', 'b']
+    assert client.get('/api/export?tag=x').data.decode('utf-8').count('\n') == 1
+
+    client.store.delete_string('a')
+    add(client, 'b', 'changed')
+    body = exported + 'not json\n{"key": "c"}\n'
+    result = client.post('/api/import?policy=skip', data=body).get_json()
+    assert (result['created'], result['skipped'], result['failed']) == (1, 1, 2)
+    assert [error['line'] for error in result['errors']] == [3, 4]
+    assert client.store.get_string('a') == {k: lines[0][k] for k in ('value', 'created_at', 'updated_at', 'tags')}
+    assert client.store.get_string('b')['value'] == 'changed'
+
+    result = client.post('/api/import?policy=overwrite', data=exported).get_json()
+    assert result['updated'] == 2
+    assert client.store.get_string('b')['value'] == 'second\nline'
+    assert client.post('/api/import?policy=merge', data=exported).status_code == 400
+
+
+def test_import_newest_keeps_later_updates(client):
+    add(client, 'a', 'current')
+    older = json.dumps({'key': 'a', 'value': 'older', 'updated_at': '2000-01-01T00:00:00'})
+    newer = json.dumps({'key': 'a', 'value': 'newer', 'updated_at': '2999-01-01T00:00:00+00:00'})
+    result = client.post('/api/import?policy=newest', data=f'{older}\n{newer}\n').get_json()
+    assert (result['skipped'], result['updated']) == (1, 1)
+    assert client.store.get_string('a')['value'] == 'newer'
+
+
+# 增量同步
+
+def test_changes_resync_then_follow(client):
+    add(client, 'a', 'v1')
+    start = client.get('/api/changes').get_json()
+    assert start['resync'] and start['seq'] >= 1
+    add(client, 'a', 'v2')
+    add(client, 'b', 'v1')
+    assert client.store.delete_string('b')
+    add(client, 'c', 'v1')
+
+    page = client.get(f"/api/changes?since={start['seq']}&limit=2").get_json()
+    assert not page['resync'] and page['has_more']
+    assert [change['key'] for change in page['changes']] == ['a', 'b']
+    assert page['changes'][0]['entry']['value'] == 'v2'
+    # 条目按当前状态返回：b 在这一页之后被删除，返回墓碑
+    assert page['changes'][1]['deleted']
+
+    rest = client.get(f"/api/changes?since={page['seq']}").get_json()
+    assert [(change['key'], change['deleted']) for change in rest['changes']] == [('b', True), ('c', False)]
+    assert not rest['has_more']
+    idle = client.get(f"/api/changes?since={rest['seq']}").get_json()
+    assert idle['changes'] == [] and idle['seq'] == rest['seq']
+
+
+def test_changes_rejects_bad_sequence(client):
+    assert client.get('/api/changes?since=abc').status_code == 400
+    assert client.get('/api/changes?since=-1').status_code == 400
@@ -0,0 +1,49 @@
+# 变更推送（/api/events）：配置开关、连接时长上限与断线补发
+from app.config.config import Config
+
+
+def read_events(body):
+    """解析 SSE 响应为 [(事件类型, 数据行)]"""
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], fields['data']))
+    return events
+
+
+def test_events_disabled_by_default(client):
+    assert Config.EVENTS_ENABLED is False
+    response = client.get('/api/events')
+    assert response.status_code == 404
+    assert b'data-events-url' not in client.get('/').data
+
+
+def test_connection_ends_after_max_duration(client, monkeypatch):
+    monkeypatch.setattr(Config, 'EVENTS_ENABLED', True)
+    monkeypatch.setattr(Config, 'EVENTS_MAX_DURATION', 0.2)
+    monkeypatch.setattr(Config, 'EVENTS_POLL_INTERVAL', 0.05)
+    assert b'data-events-url="/api/events"' in client.get('/').data
+    response = client.get('/api/events')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.get_data(as_text=True).startswith(f'retry: {Config.EVENTS_RETRY}')
+
+
+def test_reconnect_replays_missed_events(client, monkeypatch):
+    monkeypatch.setattr(Config, 'EVENTS_ENABLED', True)
+    monkeypatch.setattr(Config, 'EVENTS_MAX_DURATION', 0.1)
+    monkeypatch.setattr(Config, 'EVENTS_POLL_INTERVAL', 0.05)
+    store = client.store
+    last_event_id = store.change_event_id(store._changes.stats()['seq'])
+    assert store.add_string('a', 'first')
+    assert store.add_string('b', 'second')
+    assert store.delete_string('a')
+    response = client.get('/api/events', headers={'Last-Event-ID': last_event_id})
+    # 事件按条目的当前状态渲染：已被删除的条目的写入事件也作为删除发送
+    events = read_events(response.get_data(as_text=True))
+    assert [op for op, _ in events] == ['delete', 'put', 'delete']
+    assert '"key": "b"' in events[1][1]
+    # 来自其他进程（或重启前）的事件 ID 无法补发，要求整体刷新
+    response = client.get('/api/events', headers={'Last-Event-ID': 'other-1'})
+    assert [op for op, _ in read_events(response.get_data(as_text=True))] == ['reset']
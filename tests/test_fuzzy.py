@@ -0,0 +1,63 @@
+# 键的近似匹配：编辑距离（相邻互换算一次）、候选过滤与拼写建议
+import random
+
+import pytest
+
+from app.utils.fuzzy import FuzzyKeyIndex, edit_distance
+
+
+def reference_distance(a: str, b: str) -> int:
+    """不提前结束的最优字符串对齐距离"""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j - 1] + (a[i - 1] != b[j - 1]), d[i - 1][j] + 1, d[i][j - 1] + 1)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('key1', 'key1', 0), ('kye1', 'key1', 1), ('ke1y', 'key1', 1), ('ekyl', 'key1', 2),
+    ('key', 'key1', 1), ('kay1', 'key1', 1), ('ca', 'abc', 3), ('', 'abc', 3),
+])
+def test_edit_distance_counts_transposition_once(a, b, expected):
+    assert edit_distance(a, b, 5) == expected
+    assert edit_distance(b, a, 5) == expected
+
+
+def test_edit_distance_matches_reference_within_limit():
+    rng = random.Random(3)
+    for _ in range(3000):
+        a = ''.join(rng.choice('abc') for _ in range(rng.randrange(7)))
+        b = ''.join(rng.choice('abc') for _ in range(rng.randrange(7)))
+        limit = rng.randrange(4)
+        assert edit_distance(a, b, limit) == min(reference_distance(a, b), limit + 1), (a, b, limit)
+
+
+def test_index_finds_every_key_within_distance():
+    rng = random.Random(5)
+    keys = {''.join(rng.choice('abcd') for _ in range(rng.randrange(3, 10))) for _ in range(400)}
+    index = FuzzyKeyIndex(keys)
+    for query in ('abcdab', 'dcbadcba', 'bacd', 'aabbccdd', 'cab'):
+        for limit in (1, 2):
+            expected = sorted((reference_distance(query, key), key) for key in keys
+                              if reference_distance(query, key) <= limit)
+            assert index.search(query, limit) == expected, (query, limit)
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_transposed_key_is_suggested(make_store, backend):
+    store = make_store(STORAGE_BACKEND=backend)
+    assert store.add_string('key1', 'value')
+    assert store.add_string('other', 'value')
+    assert store.suggest_keys('kye1') == ['key1']
+    items, total = store.fuzzy_page('kye1')
+    assert total == 1 and items[0]['key'] == 'key1'
+
+
+def test_missing_key_response_suggests_transposed_key(client):
+    assert client.store.add_string('key1', 'value')
+    response = client.get('/api/string/kye1')
+    assert response.status_code == 404
+    assert response.get_json()['suggestions'] == ['key1']
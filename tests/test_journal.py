@@ -0,0 +1,82 @@
+# 追加写日志：回放、压缩与崩溃后末尾不完整记录的恢复
+import os
+
+from app.config.config import Config
+from app.utils.journal import Journal
+
+
+def test_append_and_read_from(tmp_path):
+    journal = Journal(str(tmp_path / 'j'), max_bytes=1 << 20, max_records=100, fsync=False)
+    journal.append([{'op': 'put', 'key': 'a', 'seq': 1}, {'op': 'del', 'key': 'b', 'seq': 2}])
+    records, offset = Journal.read_from(journal.path, 0)
+    assert [r['key'] for r in records] == ['a', 'b']
+    assert offset == os.path.getsize(journal.path)
+    journal.append([{'op': 'put', 'key': 'c', 'seq': 3}])
+    records, _ = Journal.read_from(journal.path, offset)
+    assert [r['key'] for r in records] == ['c']
+    journal.close()
+
+
+def test_read_from_stops_before_partial_line(tmp_path):
+    path = tmp_path / 'j'
+    path.write_bytes(Journal.encode({'op': 'put', 'key': 'a'}) + b'{"op":"put","ke')
+    records, offset = Journal.read_from(str(path), 0)
+    assert [r['key'] for r in records] == ['a']
+    assert offset == len(Journal.encode({'op': 'put', 'key': 'a'}))
+
+
+def test_append_drops_torn_tail(tmp_path):
+    path = tmp_path / 'j'
+    path.write_bytes(Journal.encode({'op': 'put', 'key': 'a'}) + b'{"op":"put","key":"torn"')
+    journal = Journal(str(path), max_bytes=1 << 20, max_records=100, fsync=False)
+    journal.append([{'op': 'put', 'key': 'b'}])
+    journal.close()
+    assert [r['key'] for r in Journal.replay(str(path))] == ['a', 'b']
+    assert path.read_bytes().endswith(b'\n')
+
+
+def test_append_drops_tail_without_any_newline(tmp_path):
+    path = tmp_path / 'j'
+    path.write_bytes(b'{"op":"pu')
+    journal = Journal(str(path), max_bytes=1 << 20, max_records=100, fsync=False)
+    journal.append([{'op': 'put', 'key': 'b'}])
+    journal.close()
+    assert [r['key'] for r in Journal.replay(str(path))] == ['b']
+
+
+def test_rotate_appends_onto_unfinished_compaction(tmp_path):
+    journal = Journal(str(tmp_path / 'j'), max_bytes=1 << 20, max_records=100, fsync=False)
+    journal.append([{'op': 'put', 'key': 'a'}])
+    journal.rotate()
+    # 上一次压缩被中断，且被中断的日志末尾有写了一半的行
+    with open(journal.rotated_path, 'ab') as f:
+        f.write(b'{"op":"put","k')
+    journal.append([{'op': 'put', 'key': 'b'}])
+    journal.rotate()
+    assert [r['key'] for r in Journal.replay(journal.rotated_path)] == ['a', 'b']
+
+
+def test_store_recovers_write_after_crash_mid_append(make_store):
+    store = make_store(STORAGE_MODE='journal', DURABILITY_MODE='sync', WARM_START=False)
+    for key in ('a', 'b', 'c'):
+        assert store.add_string(key, f'value-{key}')
+    # 模拟进程在追加下一条记录时崩溃：日志末尾留下写了一半的行
+    with open(Config.JOURNAL_FILE, 'ab') as f:
+        f.write(b'{"op":"put","key":"x","entry":{"val')
+    restarted = make_store(STORAGE_MODE='journal', DURABILITY_MODE='sync', WARM_START=False)
+    assert sorted(restarted._data) == ['a', 'b', 'c']
+    assert restarted.add_string('d', 'value-d')
+    reopened = make_store(STORAGE_MODE='journal', DURABILITY_MODE='sync', WARM_START=False)
+    assert sorted(reopened._data) == ['a', 'b', 'c', 'd']
+    assert reopened.get_string('d')['value'] == 'value-d'
+
+
+def test_replay_after_compaction(make_store):
+    store = make_store(STORAGE_MODE='journal', JOURNAL_COMPACT_RECORDS=5, WARM_START=False)
+    for i in range(12):
+        assert store.add_string(f'k{i}', f'v{i}')
+    assert store.delete_string('k3')
+    store.compact(background=False)
+    reopened = make_store(STORAGE_MODE='journal', WARM_START=False)
+    assert sorted(reopened._data) == sorted(f'k{i}' for i in range(12) if i != 3)
+    assert reopened.get_string('k11')['value'] == 'v11'
@@ -0,0 +1,82 @@
+# 组合查询：语法解析与在存储上的执行
+from datetime import datetime
+
+import pytest
+
+from app.utils.query import And, Not, Or, Tag, Text, TimeRange, QueryError, parse_query, text_terms
+from app.utils.records import to_micros
+
+
+def micros(moment: str) -> int:
+    return to_micros(datetime.fromisoformat(moment).isoformat())
+
+
+def test_plain_input_is_one_substring():
+    assert parse_query('   ') is None
+    node = parse_query('Hello World: x')
+    assert isinstance(node, Text) and node.text == 'hello world: x'
+
+
+def test_adjacent_terms_are_and_and_or_binds_looser():
+    node = parse_query('hello tag:a OR tag:b NOT tag:c')
+    assert isinstance(node, Or) and len(node.items) == 2
+    first, second = node.items
+    assert isinstance(first, And) and [type(item) for item in first.items] == [Text, Tag]
+    assert isinstance(second, And) and isinstance(second.items[1], Not)
+    assert second.items[1].item.name == 'c'
+
+
+def test_parentheses_quotes_and_text_terms():
+    node = parse_query('"two words" AND (tag:"my tag" OR other) NOT hidden')
+    assert isinstance(node, And)
+    phrase, group, negated = node.items
+    assert phrase.text == 'two words'
+    assert isinstance(group, Or) and group.items[0].name == 'my tag'
+    # NOT 之下的文本不参与相关度排序
+    assert text_terms(node) == ['two words', 'other']
+
+
+@pytest.mark.parametrize('query, start, end', [
+    ('created:>=2024-01-01', '2024-01-01', None),
+    ('created:>2024-01-01', '2024-01-02', None),
+    ('created:<2024-01-01', None, '2024-01-01'),
+    ('created:<=2024-01-01', None, '2024-01-02'),
+    ('updated:2024-05-01..2024-05-31', '2024-05-01', '2024-06-01'),
+    ('updated:2024-05-01', '2024-05-01', '2024-05-02'),
+    ('updated:..2024-05-01T10:00:00', None, '2024-05-01T10:00:00.000001'),
+])
+def test_time_ranges(query, start, end):
+    node = parse_query(query)
+    assert isinstance(node, TimeRange) and node.field == query.split(':')[0]
+    assert node.start == (micros(start) if start else None)
+    assert node.end == (micros(end) if end else None)
+
+
+@pytest.mark.parametrize('query', ['(tag:a', 'tag:a)', 'tag:a AND', 'NOT', 'tag:', 'created:>=yesterday',
+                                   '"unclosed tag:a', 'tag:a OR OR tag:b'])
+def test_syntax_errors(query):
+    with pytest.raises(QueryError):
+        parse_query(query)
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_query_page_on_store(make_store, backend):
+    store = make_store(STORAGE_BACKEND=backend)
+    assert store.add_string('apple', 'red fruit', tags=['fruit', 'red'])
+    assert store.add_string('cherry', 'small red fruit', tags=['fruit'])
+    assert store.add_string('brick', 'red block', tags=['red'])
+    assert store.add_string('grass', 'green', tags=['plant'])
+
+    def keys(query):
+        items, total = store.query_page(query, per_page=10)
+        assert total == len(items)
+        return sorted(item['key'] for item in items)
+
+    assert keys('red') == ['apple', 'brick', 'cherry']
+    assert keys('red tag:fruit') == ['apple', 'cherry']
+    assert keys('tag:fruit AND NOT tag:red') == ['cherry']
+    assert keys('tag:plant OR (fruit NOT small)') == ['apple', 'grass']
+    assert keys(f'updated:{datetime.now().date().isoformat()} green') == ['grass']
+    assert keys('created:<2000-01-01') == []
+    with pytest.raises(QueryError):
+        keys('(red')
@@ -0,0 +1,121 @@
+# 条目的内存表示、时间解析与记录文件快照
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from app.config.config import Config
+from app.utils.compression import Compressor
+from app.utils.records import Record, RecordFile, from_micros, parse_micros, to_micros
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data.json.template')
+
+
+def test_micros_round_trip():
+    assert from_micros(to_micros('2024-03-01T12:30:45.123456')) == '2024-03-01T12:30:45.123456'
+
+
+@pytest.mark.parametrize('timestamp, expected', [
+    ('2024-03-01T12:30:45', '2024-03-01T12:30:45'),
+    ('2024-03-01 12:30:45', '2024-03-01T12:30:45'),
+    ('2024/03/01 12:30:45', '2024-03-01T12:30:45'),
+    ('2024/03/01', '2024-03-01T00:00:00'),
+    ('20240301_123045', '2024-03-01T12:30:45'),
+    (datetime(2024, 3, 1, 12, 30, 45).timestamp(), '2024-03-01T12:30:45'),
+])
+def test_parse_micros_accepts_legacy_formats(timestamp, expected):
+    assert from_micros(parse_micros(timestamp)) == expected
+
+
+@pytest.mark.parametrize('timestamp', ['创建时间戳', '', None, True, 1e30])
+def test_parse_micros_falls_back_to_now(timestamp):
+    before = to_micros(datetime.now().isoformat())
+    assert before <= parse_micros(timestamp) <= to_micros(datetime.now().isoformat())
+
+
+def test_record_from_entry_without_timestamps():
+    record = Record.from_entry({'value': 'v'})
+    assert record.created_at and record.updated_at and record.tags == ()
+
+
+def test_record_file_round_trip(tmp_path):
+    data = {
+        'short': Record.from_entry({'value': 'v', 'created_at': '2024-01-01T00:00:00',
+                                    'updated_at': '2024-01-02T00:00:00', 'tags': ['a']}),
+        'long': Record.from_entry({'value': '重复的内容' * 500, 'created_at': '2024-01-01T00:00:00',
+                                   'updated_at': '2024-01-01T00:00:00', 'tags': []}),
+    }
+    path = str(tmp_path / 'data.rec')
+    RecordFile.write(path, data, Compressor('zlib', threshold=1024, level=6))
+    loaded = RecordFile.load(path)
+    assert {k: v.to_entry() for k, v in loaded.items()} == {k: v.to_entry() for k, v in data.items()}
+
+
+@pytest.mark.parametrize('settings', [
+    {'SNAPSHOT_FORMAT': 'json'},
+    {'SNAPSHOT_FORMAT': 'record'},
+    {'STORAGE_BACKEND': 'sqlite'},
+])
+def test_store_loads_data_file_template(make_store, data_dir, settings):
+    shutil.copy(TEMPLATE, Config.DATA_FILE)
+    store = make_store(**settings)
+    item = store.get_string('条目名称')
+    assert item['value'] == '在这里输入实际的值'
+    datetime.fromisoformat(item['created_at'])
+    datetime.fromisoformat(item['updated_at'])
+
+
+def test_sqlite_migration_runs_once_when_processes_start_together(make_store, data_dir):
+    with open(Config.DATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump({f'k{i}': f'v{i}' for i in range(2000)}, f)
+    # 各线程的存储使用独立的连接与锁文件描述符，相当于同时启动的多个 worker
+    with ThreadPoolExecutor(6) as pool:
+        stores = list(pool.map(lambda _: make_store(STORAGE_BACKEND='sqlite'), range(6)))
+    assert all(store.get_string('k1999')['value'] == 'v1999' for store in stores)
+    assert stores[0].get_all_strings()[1] == 2000
+
+
+def test_record_snapshot_survives_restart(make_store):
+    store = make_store(SNAPSHOT_FORMAT='record', STORAGE_MODE='journal')
+    for i in range(20):
+        assert store.add_string(f'k{i}', f'value {i}' * (i + 1), tags=['even' if i % 2 == 0 else 'odd'])
+    assert store.delete_string('k5')
+    store.compact(background=False)
+    assert os.path.exists(Config.RECORD_FILE)
+    reopened = make_store(SNAPSHOT_FORMAT='record', STORAGE_MODE='journal', WARM_START=False)
+    assert len(reopened._data) == 19
+    assert reopened.get_string('k7')['value'] == 'value 7' * 8
+    assert reopened.get_string('k8')['tags'] == ['even']
+
+
+def test_json_snapshot_keeps_legacy_string_format_readable(make_store):
+    with open(Config.DATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'a': 'plain value'}, f)
+    store = make_store(SNAPSHOT_FORMAT='json')
+    assert store.get_string('a')['value'] == 'plain value'
+
+
+def test_default_snapshot_format_keeps_data_json(make_store):
+    store = make_store()
+    assert store.add_string('a', 'v')
+    store.compact(background=False)
+    with open(Config.DATA_FILE, encoding='utf-8') as f:
+        assert json.load(f)['a']['value'] == 'v'
+    assert not os.path.exists(Config.RECORD_FILE)
+
+
+def test_switching_format_moves_old_data_file_to_backups(make_store, data_dir):
+    with open(Config.DATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'a': {'value': 'v', 'created_at': '2024-01-01T00:00:00', 'updated_at': '2024-01-01T00:00:00'}}, f)
+    store = make_store(SNAPSHOT_FORMAT='record')
+    assert store.add_string('b', 'w')
+    store.compact(background=False)
+    assert os.path.exists(Config.RECORD_FILE) and not os.path.exists(Config.DATA_FILE)
+    migrated = [name for name in os.listdir(Config.BACKUP_DIR) if name.startswith('data_migrated_')]
+    assert len(migrated) == 1 and migrated[0].endswith('.json')
+    with open(os.path.join(Config.BACKUP_DIR, migrated[0]), encoding='utf-8') as f:
+        assert json.load(f)['a']['value'] == 'v'
+    assert sorted(make_store(SNAPSHOT_FORMAT='record', WARM_START=False)._data) == ['a', 'b']
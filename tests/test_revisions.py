@@ -0,0 +1,155 @@
+# 修订历史：增量记录、稀疏化清理与多进程下的修订号
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.utils.coherence import FileMutex, ProcessLock
+from app.utils.revisions import RevisionLog
+
+DAY = 86400
+
+
+def open_log(directory, **settings):
+    """打开一份修订日志；每次调用使用独立的锁文件描述符，相当于另一个进程"""
+    options = dict(keep_all=3600, keep_hourly=24, keep_daily=7, keep_weekly=4, prune_interval=1 << 30)
+    options.update(settings)
+    log = RevisionLog(str(directory), file_lock=ProcessLock(str(directory / 'data.lock')),
+                      prune_mutex=FileMutex(str(directory / 'data.lock.prune')), **options)
+    log.ensure_base(dict)
+    return log
+
+
+def entry(value):
+    return {'value': value, 'created_at': '2024-01-01T00:00:00', 'updated_at': '2024-01-01T00:00:00', 'tags': []}
+
+
+def test_history_and_state_at(tmp_path):
+    log = open_log(tmp_path)
+    log.record('a', None, entry('v1'))
+    log.record('a', entry('v1'), entry('v2'))
+    log.record('a', entry('v2'), None)
+    log.flush()
+    history = log.history('a')
+    assert [h['revision'] for h in history] == [3, 2, 1]
+    assert history[0]['deleted'] and history[1]['entry']['value'] == 'v2'
+    assert log.state_at('a', 1) == (True, entry('v1'))
+    assert log.state_at('a', 99) == (False, None)
+
+
+def test_unchanged_entry_is_not_recorded(tmp_path):
+    log = open_log(tmp_path)
+    log.record('a', entry('v1'), entry('v1'))
+    log.flush()
+    assert log.last_rev() == 0
+
+
+def test_revision_numbers_are_unique_across_processes(tmp_path):
+    first, second = open_log(tmp_path), open_log(tmp_path)
+    first.record('a', None, entry('1'))
+    first.flush()
+    second.record('b', None, entry('2'))
+    second.flush()
+    first.record('c', None, entry('3'))
+    first.flush()
+    assert [r['rev'] for r in first._read_log()] == [1, 2, 3]
+
+
+def test_base_is_created_once_when_processes_start_together(tmp_path):
+    # 各线程使用独立的锁文件描述符，相当于同时启动的多个进程
+    logs = [RevisionLog(str(tmp_path), keep_all=3600, keep_hourly=24, keep_daily=7, keep_weekly=4,
+                        prune_interval=1 << 30, file_lock=ProcessLock(str(tmp_path / 'data.lock')),
+                        prune_mutex=FileMutex(str(tmp_path / 'data.lock.prune'))) for _ in range(8)]
+    calls = []
+
+    def load_data():
+        calls.append(1)
+        time.sleep(0.01)
+        return {'a': entry('v1')}
+
+    with ThreadPoolExecutor(len(logs)) as pool:
+        list(pool.map(lambda log: log.ensure_base(load_data), logs))
+    assert len(calls) == 1
+    assert logs[0]._read_base()['data'] == {'a': entry('v1')}
+    assert sorted(os.listdir(tmp_path)) == ['data.lock', 'data.lock.prune', 'revisions_base.json']
+
+
+def test_prune_folds_old_revisions_into_base(tmp_path):
+    log = open_log(tmp_path)
+    for i in range(5):
+        log.record('a', entry(str(i - 1)) if i else None, entry(str(i)))
+    log.record('b', None, entry('b'))
+    log.flush()
+    log.prune(now=time.time() + 60 * DAY)
+    assert list(log._read_log()) == []
+    assert log._read_base()['data'] == {'a': entry('4'), 'b': entry('b')}
+    assert log.changes_since(0, 10) is None
+    assert log.changes_since(6, 10) == ([], False)
+    log.record('c', None, entry('c'))
+    log.flush()
+    assert [r['rev'] for r in log.changes_since(6, 10)[0]] == [7]
+
+
+def test_prune_merges_revisions_within_a_bucket(tmp_path):
+    log = open_log(tmp_path)
+    log.record('a', None, entry('v1'))
+    log.record('a', entry('v1'), dict(entry('v1'), tags=['x']))
+    log.flush()
+    log.prune(now=time.time() + 2 * 3600)
+    records = list(log._read_log())
+    assert len(records) == 1
+    assert records[0]['rev'] == 2 and records[0]['delta']['tags'] == ['x']
+
+
+def test_prune_skips_while_another_process_prunes(tmp_path):
+    log = open_log(tmp_path)
+    log.record('a', None, entry('v1'))
+    log.flush()
+    other = FileMutex(str(tmp_path / 'data.lock.prune'))
+    assert other.acquire_nowait()
+    try:
+        log.prune(now=time.time() + 60 * DAY)
+    finally:
+        other.release()
+    assert [r['rev'] for r in log._read_log()] == [1]
+    log.prune(now=time.time() + 60 * DAY)
+    assert list(log._read_log()) == []
+
+
+def test_prune_aborts_when_log_is_replaced_meanwhile(tmp_path, monkeypatch):
+    log = open_log(tmp_path)
+    for key in 'abc':
+        log.record(key, None, entry(key))
+    log.flush()
+    thin = log._thin
+
+    def replaced_during_thin(*args):
+        # 读取日志之后，另一个进程替换了日志并追加了修订
+        copy = log.log_file + '.copy'
+        shutil.copy(log.log_file, copy)
+        os.replace(copy, log.log_file)
+        other = open_log(tmp_path)
+        other.record('d', None, entry('d'))
+        other.flush()
+        return thin(*args)
+
+    monkeypatch.setattr(log, '_thin', replaced_during_thin)
+    log.prune(now=time.time() + 60 * DAY)
+    assert [r['rev'] for r in log._read_log()] == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('limit', [1, 2, 10])
+def test_changes_since_pages(tmp_path, limit):
+    log = open_log(tmp_path)
+    for i in range(5):
+        log.record(f'k{i}', None, entry(str(i)))
+    log.flush()
+    seen, rev, more = [], 0, True
+    while more:
+        records, more = log.changes_since(rev, limit)
+        seen += [r['rev'] for r in records]
+        rev = seen[-1] if seen else rev
+    assert seen == [1, 2, 3, 4, 5]
+    assert log.changes_since(6, 10) is None
@@ -0,0 +1,117 @@
+# 全文索引：候选集合的正确性、增量维护与随暖启动快照保存
+import random
+
+import pytest
+
+from app.config.config import Config
+from app.utils.ngram import NgramIndex
+
+
+def brute_force(docs, query):
+    return {key for key, texts in docs.items() if any(query in text.lower() for text in texts)}
+
+
+def test_candidates_cover_all_matches_under_random_updates():
+    rng = random.Random(7)
+    alphabet = 'abc中文'
+    docs = {}
+    index = NgramIndex.build([])
+    for _ in range(2000):
+        key = f'k{rng.randrange(60)}'
+        if key in docs and rng.random() < 0.3:
+            index.update(key, docs.pop(key), None)
+            continue
+        texts = [key, ''.join(rng.choice(alphabet) for _ in range(rng.randrange(8)))]
+        index.update(key, docs.get(key), texts)
+        docs[key] = texts
+    assert len(index._ids) == len(docs)
+    for query in ('a', 'ab', 'abc', '中文', 'k1', 'zz'):
+        assert brute_force(docs, query) <= index.candidates(query)
+        assert index.candidates(query) <= set(docs)
+
+
+def test_build_matches_incremental_updates():
+    items = [('alpha', ['alpha', 'first value'], True), ('beta', ['beta', 'second value'], True)]
+    built = NgramIndex.build(items)
+    updated = NgramIndex()
+    for key, texts, complete in items:
+        updated.update(key, None, texts, complete)
+    for query in ('value', 'first', 'se', 'x'):
+        assert built.candidates(query) == updated.candidates(query)
+
+
+def test_deleted_doc_ids_are_reused():
+    index = NgramIndex()
+    index.update('a', None, ['a', 'hello'])
+    index.update('b', None, ['b', 'world'])
+    index.update('a', ['a', 'hello'], None)
+    index.update('c', None, ['c', 'hello'])
+    assert len(index._keys) == 2
+    assert index.candidates('hello') == {'c'}
+    assert index.candidates('wor') == {'b'}
+
+
+def test_incomplete_entries_are_always_candidates():
+    index = NgramIndex()
+    index.update('long', None, ['long'], complete=False)
+    index.update('short', None, ['short', 'needle'])
+    assert index.candidates('needle') == {'long', 'short'}
+    assert index.candidates('nothing') == {'long'}
+    assert index.estimate('needle') == 2
+    index.update('long', ['long'], ['long', 'now short'])
+    assert index.candidates('nothing') == set()
+
+
+def test_copy_is_independent():
+    index = NgramIndex()
+    index.update('a', None, ['a', 'hello'])
+    copy = index.copy()
+    index.update('b', None, ['b', 'hello'])
+    assert copy.candidates('hello') == {'a'}
+    assert index.candidates('hello') == {'a', 'b'}
+
+
+@pytest.mark.parametrize('limit', [0, 16, 1024])
+def test_search_finds_values_beyond_index_limit(make_store, limit):
+    store = make_store(SEARCH_INDEX_VALUE_BYTES=limit)
+    assert store.add_string('short', 'a needle here')
+    assert store.add_string('long', 'x' * 100 + ' needle')
+    assert store.add_string('other', 'nothing to see')
+    assert {item['key'] for item in store.search_strings('needle')} == {'long', 'short'}
+    assert store.add_string('long', 'y' * 100 + ' no match any more')
+    assert {item['key'] for item in store.search_strings('needle')} == {'short'}
+
+
+def test_compaction_saves_index_without_rebuilding_it(make_store, monkeypatch):
+    store = make_store(SNAPSHOT_FORMAT='record', WARM_START=True)
+    for i in range(50):
+        assert store.add_string(f'k{i}', f'value number {i};')
+    assert len(store.search_strings('number 4;')) == 1
+    build = store._build_lazy_index
+    rebuilt = []
+
+    def recording_build(name, data):
+        rebuilt.append(name)
+        return build(name, data)
+
+    monkeypatch.setattr(store, '_build_lazy_index', recording_build)
+    assert store.add_string('late', 'number 4; again')
+    store.compact(background=False)
+    assert 'ngrams' not in rebuilt
+    assert {item['key'] for item in store.search_strings('number 4;')} == {'k4', 'late'}
+    monkeypatch.setattr(store, '_build_lazy_index', build)
+
+    reopened = make_store(SNAPSHOT_FORMAT='record', WARM_START=True)
+    assert 'ngrams' in reopened._indexes
+    assert {item['key'] for item in reopened.search_strings('number 4;')} == {'k4', 'late'}
+
+
+def test_warm_index_is_dropped_when_limit_changes(make_store):
+    store = make_store(WARM_START=True, SEARCH_INDEX_VALUE_BYTES=1024)
+    assert store.add_string('a', 'value')
+    store.search_strings('val')
+    store.close()
+    reopened = make_store(WARM_START=True, SEARCH_INDEX_VALUE_BYTES=0)
+    assert 'ngrams' not in reopened._indexes
+    assert [item['key'] for item in reopened.search_strings('val')] == ['a']
+    assert Config.SEARCH_INDEX_VALUE_BYTES == reopened._indexes['ngrams'].value_limit
@@ -0,0 +1,125 @@
+# 两种存储后端共同的行为：时间范围与游标分页、多进程间的数据一致性
+import json
+import multiprocessing
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config.config import Config
+
+BACKENDS = [{'STORAGE_BACKEND': 'json'}, {'STORAGE_BACKEND': 'sqlite'}]
+
+
+def import_at(store, entries):
+    """以指定的修改时间导入条目 {键: 本地时间}"""
+    lines = [json.dumps({'key': key, 'value': key, 'created_at': moment.isoformat(), 'updated_at': moment.isoformat()})
+             for key, moment in entries.items()]
+    assert store.import_entries(lines, 'overwrite')['errors'] == []
+
+
+def shifted_offset(moment: datetime) -> datetime:
+    """同一时刻，换成与本地时区不同的 UTC 偏移表示（墙上时间与本地时间相差 5 小时）"""
+    local = moment.astimezone()
+    return local.astimezone(timezone(local.utcoffset() + timedelta(hours=5)))
+
+
+@pytest.mark.parametrize('settings', BACKENDS)
+def test_changed_since_compares_instants(make_store, settings):
+    store = make_store(**settings)
+    base = datetime(2024, 6, 1, 12, 0, 0)
+    import_at(store, {'before': base - timedelta(hours=1), 'at': base, 'after': base + timedelta(hours=1),
+                      'micro': base + timedelta(microseconds=1)})
+    for moment in (base, shifted_offset(base)):
+        items, total = store.changed_since(moment, per_page=10)
+        assert [item['key'] for item in items] == ['micro', 'after'], moment
+        assert total == 2
+
+
+@pytest.mark.parametrize('settings', BACKENDS)
+def test_cursor_position_compares_instants(make_store, settings):
+    store = make_store(**settings)
+    base = datetime(2024, 6, 1, 12, 0, 0)
+    import_at(store, {f'k{i}': base + timedelta(minutes=i) for i in range(5)})
+    position = shifted_offset(base + timedelta(minutes=2)).isoformat()
+    items, has_more = store.get_strings_after((position, 'k2'), per_page=10, sort_order='asc')
+    assert [item['key'] for item in items] == ['k3', 'k4'] and not has_more
+    items, _ = store.get_strings_after((position, 'k2'), per_page=10, sort_order='desc')
+    assert [item['key'] for item in items] == ['k1', 'k0']
+
+
+@pytest.mark.parametrize('settings', BACKENDS)
+def test_cursor_pages_cover_every_entry_once(make_store, settings):
+    store = make_store(**settings)
+    base = datetime(2024, 6, 1, 12, 0, 0)
+    # 相同的修改时间由键区分先后
+    import_at(store, {f'k{i:02d}': base + timedelta(seconds=i // 3) for i in range(20)})
+    seen, after, has_more = [], None, True
+    while has_more:
+        items, has_more = store.get_strings_after(after, per_page=6, sort_order='desc')
+        seen += [item['key'] for item in items]
+        after = (items[-1]['updated_at'], items[-1]['key'])
+    assert sorted(seen) == [f'k{i:02d}' for i in range(20)] and len(seen) == 20
+
+
+COHERENCE = [{'STORAGE_BACKEND': 'json', 'STORAGE_MODE': 'journal'},
+             {'STORAGE_BACKEND': 'json', 'STORAGE_MODE': 'snapshot'},
+             {'STORAGE_BACKEND': 'json', 'STORAGE_MODE': 'journal', 'SNAPSHOT_FORMAT': 'record'},
+             {'STORAGE_BACKEND': 'sqlite'}]
+
+
+@pytest.mark.parametrize('settings', COHERENCE)
+def test_writes_are_visible_to_other_processes(make_store, settings):
+    # 同一数据目录上的两个存储实例各自持有文件锁描述符，相当于两个 worker 进程
+    first, second = make_store(**settings), make_store(**settings)
+    assert first.add_string('a', 'from first', tags=['x'])
+    assert second.get_string('a')['value'] == 'from first'
+    assert second.add_string('b', 'from second')
+    assert second.delete_string('a')
+    assert first.get_string('a') is None
+    assert [item['key'] for item in first.get_all_strings()[0]] == ['b']
+    assert first.get_tag_counts() == second.get_tag_counts()
+
+
+def test_other_processes_reload_after_compaction(make_store):
+    first, second = make_store(), make_store()
+    for i in range(10):
+        assert first.add_string(f'k{i}', f'v{i}')
+    assert second.get_string('k9')['value'] == 'v9'
+    first.compact(background=False)
+    assert first.add_string('after', 'compaction')
+    assert first.delete_string('k0')
+    assert second.get_string('after')['value'] == 'compaction'
+    assert second.get_string('k0') is None
+    assert len(second.get_all_strings(per_page=100)[0]) == 10
+
+
+def start_worker(barrier, settings):
+    """子进程：与其他子进程同时打开存储并读取一条数据（fork 继承测试中修改过的配置）"""
+    from app.models import create_store
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    barrier.wait()
+    store = create_store()
+    assert store.get_string('k999')['value'] == 'v999'
+    assert store.add_string(f'worker{os.getpid()}', 'started')
+    store.close()
+
+
+@pytest.mark.parametrize('settings', [{'STORAGE_BACKEND': 'json', 'STORAGE_MODE': 'journal'},
+                                      {'STORAGE_BACKEND': 'json', 'SNAPSHOT_FORMAT': 'record'},
+                                      {'STORAGE_BACKEND': 'sqlite'}])
+def test_processes_starting_together_on_existing_data(make_store, data_dir, settings):
+    with open(Config.DATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump({f'k{i}': f'v{i}' for i in range(1000)}, f)
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(6)
+    workers = [context.Process(target=start_worker, args=(barrier, settings)) for _ in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0] * 6
+    store = make_store(**settings)
+    assert store.get_all_strings()[1] == 1006
+    assert len(store._revisions.changes_since(0, 100)[0]) == 6
@@ -0,0 +1,33 @@
+# 页面视图：列表的分页链接保留当前的搜索条件
+import re
+
+import pytest
+
+
+def page_links(html: str) -> list:
+    pagination = html.split('class="pagination"', 1)[1]
+    return [link.replace('&amp;', '&') for link in re.findall(r'href="([^"]+)"', pagination)]
+
+
+@pytest.fixture
+def many_keys(client):
+    # 与查询 "item" 编辑距离为 1 的键，足够分成多页
+    for letter in 'abcdefghijklmnopqrst':
+        assert client.store.add_string(f'item{letter}', 'value')
+    return client
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Requested-With': 'XMLHttpRequest'}])
+def test_fuzzy_search_pagination_keeps_fuzzy(many_keys, headers):
+    html = many_keys.get('/?search=itemm&fuzzy=1', headers=headers).data.decode('utf-8')
+    links = page_links(html)
+    assert len(links) == 2
+    assert all('fuzzy=1' in link and 'search=itemm' in link for link in links)
+    second = many_keys.get(links[1], headers=headers).data.decode('utf-8')
+    assert 'fuzzy=1' in page_links(second)[0]
+
+
+def test_plain_search_pagination_has_no_fuzzy(many_keys):
+    html = many_keys.get('/?search=item').data.decode('utf-8')
+    links = page_links(html)
+    assert len(links) == 2 and not any('fuzzy' in link for link in links)